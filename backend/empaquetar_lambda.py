@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+empaquetar_lambda.py
+====================
+Arma el directorio del paquete de la Lambda sólo con lo que el código puede
+llegar a importar, en lugar de todo `lambda_build/` (boto3/botocore,
+psycopg2, uvicorn, un zip y una copia anidada de lambda_build que la API no
+usa). Menos bytes que descargar y descomprimir en cada arranque en frío.
+
+1. Copia los módulos de la API (MODULOS_APP) a la raíz del paquete.
+2. Recorre sus imports con `modulefinder` (también los que están dentro de
+   funciones, como jwt y passlib) y copia de `lambda_build/` sólo los
+   paquetes de primer nivel alcanzados, con sus `.dist-info` y `.libs`
+   (SIEMPRE agrega los que se cargan por nombre en tiempo de ejecución).
+   Mangum no está en lambda_build/: se toma de lambda-package-complete/.
+3. Instala desde PyPI las ruedas manylinux de BINARIAS (orjson, Brotli) para el
+   runtime de la Lambda, con la versión fijada en backend/requirements.txt:
+   no están en lambda_build/ y el Python que empaqueta puede no ser Linux.
+   Si la rueda no se puede instalar el build falla; no hay paquete sin ellas.
+4. Precompila todo a `.pyc` con hash sin verificar: la Lambda no puede
+   escribir su `__pycache__` y sin esto compila api_postgresql.py en cada
+   arranque. Sólo si el Python que empaqueta es el mismo que el de la Lambda.
+
+Estructura resultante (raíz del zip): lambda_function.py, api_postgresql.py,
+… y lambda_build/ con las dependencias, como espera lambda_function.py.
+
+Uso (lo llama `make build`):
+$ python backend/empaquetar_lambda.py --salida backend/build_lambda
+"""
+import argparse
+import compileall
+import modulefinder
+import os
+import py_compile
+import shutil
+import subprocess
+import sys
+from typing import Dict, Set
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORIO_LAMBDA = os.path.join(RAIZ, "lambda-package-complete")
+DEPENDENCIAS = os.path.join(DIRECTORIO_LAMBDA, "lambda_build")
+
+MODULOS_APP = ["lambda_function", "api_postgresql", "compresion", "facetas", "migraciones", "orden",
+               "tarjetas", "ubicaciones"]
+
+# passlib carga su backend de bcrypt por nombre; modulefinder no lo ve
+SIEMPRE = ["bcrypt"]
+
+# `lambda_build` es el respaldo de lambda_function para encontrar Mangum (no es un
+# paquete) y uvicorn sólo se usa al correr api_postgresql.py localmente
+EXCLUIDOS = ["lambda_build", "uvicorn"]
+
+# Extensiones compiladas que la Lambda necesita (distribución → entradas que deja en el
+# paquete). Se instalan como ruedas manylinux del runtime; RespuestaJSON sin orjson
+# serializa con json de la biblioteca estándar, varias veces más lento, y compresion.py
+# sin brotli sólo ofrece gzip.
+BINARIAS = {"orjson": ["orjson"], "Brotli": ["brotli", "_brotli"]}
+REQUIREMENTS = os.path.join(RAIZ, "backend", "requirements.txt")
+
+# Paquetes puros que viven en lambda-package-complete/ y no en lambda_build/ (las
+# demás copias de esa carpeta son binarios de macOS y no sirven en la Lambda)
+DESDE_RAIZ = ["mangum"]
+
+_IGNORAR = shutil.ignore_patterns("__pycache__", "*.pyc")
+
+class _Buscador(modulefinder.ModuleFinder):
+    """modulefinder falla con carpetas sin __init__.py (namespace): tratarlas como no encontradas."""
+
+    def find_module(self, name, path, parent=None):
+        try:
+            return super().find_module(name, path, parent)
+        except AttributeError:
+            raise ImportError(name)
+
+def alcanzables(salida: str) -> Set[str]:
+    """Nombres de primer nivel de lambda_build/ que importan los módulos de la API."""
+    # Sin la biblioteca estándar en el path: no hace falta recorrerla
+    buscador = _Buscador(path=[salida, DEPENDENCIAS], excludes=EXCLUIDOS + DESDE_RAIZ)
+    for modulo in MODULOS_APP:
+        buscador.run_script(os.path.join(salida, f"{modulo}.py"))
+    nombres = {nombre.split(".")[0] for nombre, modulo in buscador.modules.items()
+               if modulo.__file__ and os.path.abspath(modulo.__file__).startswith(DEPENDENCIAS + os.sep)}
+    return nombres | set(SIEMPRE)
+
+def distribuciones(origen: str) -> Dict[str, Set[str]]:
+    """.dist-info → entradas de primer nivel que instala (según su RECORD)."""
+    entradas = {}
+    for nombre in os.listdir(origen):
+        record = os.path.join(origen, nombre, "RECORD")
+        if not nombre.endswith(".dist-info") or not os.path.isfile(record):
+            continue
+        with open(record, encoding="utf-8") as f:
+            rutas = [linea.split(",")[0] for linea in f if linea.strip()]
+        entradas[nombre] = {ruta.split("/")[0] for ruta in rutas if not ruta.startswith(("..", "bin/"))}
+    return entradas
+
+def entradas_a_copiar(nombres: Set[str], origen: str) -> Set[str]:
+    """Archivos y carpetas de `origen` para los paquetes alcanzados (con metadatos y .libs)."""
+    disponibles = set(os.listdir(origen))
+    copiar = set()
+    for nombre in nombres:
+        # Paquete (carpeta), módulo suelto (six.py) o extensión (_cffi_backend.cpython-39-….so)
+        copiar |= {e for e in disponibles if e == nombre or e.startswith(f"{nombre}.") and not e.endswith(".dist-info")}
+    for dist_info, instaladas in distribuciones(origen).items():
+        if instaladas & copiar:
+            copiar |= {e for e in instaladas if e in disponibles} | {dist_info}
+    return copiar
+
+def versiones_fijadas() -> Dict[str, str]:
+    """Distribución (en minúsculas) → versión fijada con == en requirements.txt."""
+    fijadas = {}
+    with open(REQUIREMENTS, encoding="utf-8") as f:
+        for linea in f:
+            nombre, _, version = linea.split("#")[0].strip().partition("==")
+            if version:
+                fijadas[nombre.strip().lower()] = version.strip()
+    return fijadas
+
+def instalar_binarias(destino: str, python_lambda: str, plataforma: str):
+    """Instala las ruedas de BINARIAS para la Lambda; sale con error si falta alguna."""
+    fijadas = versiones_fijadas()
+    sin_version = [nombre for nombre in BINARIAS if nombre.lower() not in fijadas]
+    if sin_version:
+        sys.exit(f"❌ Sin versión fijada en {REQUIREMENTS}: {', '.join(sin_version)}")
+    paquetes = [f"{nombre}=={fijadas[nombre.lower()]}" for nombre in BINARIAS]
+    comando = [sys.executable, "-m", "pip", "install", "--quiet", "--no-deps", "--only-binary=:all:",
+               "--platform", plataforma, "--implementation", "cp", "--python-version", python_lambda,
+               "--target", destino] + paquetes
+    if subprocess.run(comando).returncode != 0:
+        sys.exit(f"❌ No se pudieron instalar las ruedas {plataforma} de: {', '.join(paquetes)}")
+    faltantes = [e for entradas in BINARIAS.values() for e in entradas
+                 if not any(n == e or n.startswith(f"{e}.") for n in os.listdir(destino))]
+    if faltantes:
+        sys.exit(f"❌ Faltan en el paquete tras instalar las ruedas: {', '.join(faltantes)}")
+    print(f"   ruedas {plataforma}: {', '.join(paquetes)}")
+
+def tamano(ruta: str) -> int:
+    if os.path.isfile(ruta):
+        return os.path.getsize(ruta)
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, archivos in os.walk(ruta) for f in archivos)
+
+def main():
+    parser = argparse.ArgumentParser(description="Arma el paquete podado de la Lambda")
+    parser.add_argument("--salida", required=True, help="Directorio a crear (se borra si existe)")
+    parser.add_argument("--python-lambda", default=os.environ.get("PYTHON_LAMBDA", "3.9"),
+                        help="Versión de Python del runtime de la Lambda (para los .pyc y las ruedas)")
+    parser.add_argument("--plataforma", default=os.environ.get("PLATAFORMA_LAMBDA", "manylinux2014_x86_64"),
+                        help="Plataforma de las ruedas binarias (manylinux2014_aarch64 si la Lambda es arm64)")
+    args = parser.parse_args()
+
+    shutil.rmtree(args.salida, ignore_errors=True)
+    os.makedirs(os.path.join(args.salida, "lambda_build"))
+    for modulo in MODULOS_APP:
+        shutil.copy2(os.path.join(DIRECTORIO_LAMBDA, f"{modulo}.py"), args.salida)
+
+    nombres = alcanzables(args.salida)
+    copiadas = entradas_a_copiar(nombres, DEPENDENCIAS)
+    raiz = {e for e in os.listdir(DIRECTORIO_LAMBDA)
+            if e in DESDE_RAIZ or e.endswith(".dist-info") and e.split("-")[0] in DESDE_RAIZ}
+    for origen, entradas in ((DEPENDENCIAS, copiadas), (DIRECTORIO_LAMBDA, raiz)):
+        for entrada in sorted(entradas):
+            destino = os.path.join(args.salida, "lambda_build", entrada)
+            if os.path.isdir(os.path.join(origen, entrada)):
+                shutil.copytree(os.path.join(origen, entrada), destino, ignore=_IGNORAR)
+            else:
+                shutil.copy2(os.path.join(origen, entrada), destino)
+
+    omitidas = sorted(set(os.listdir(DEPENDENCIAS)) - copiadas - {"__pycache__"})
+    print(f"📦 lambda_build: {len(copiadas)} entradas copiadas, {len(omitidas)} omitidas")
+    print("   omitidas: " + ", ".join(e for e in omitidas if not e.endswith(".dist-info")))
+    instalar_binarias(os.path.join(args.salida, "lambda_build"), args.python_lambda, args.plataforma)
+
+    version = f"{sys.version_info.major}.{sys.version_info.minor}"
+    if version == args.python_lambda:
+        compileall.compile_dir(args.salida, quiet=1,
+                               invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+        print("   .pyc precompilados")
+    else:
+        print(f"⚠️  Python {version} ≠ runtime {args.python_lambda}: sin .pyc precompilados")
+
+    print(f"   {tamano(DEPENDENCIAS) / 1e6:.1f} MB → {tamano(args.salida) / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+tiempo_importacion.py
+=====================
+Presupuesto de tiempo de importación de la Lambda (arranque en frío).
+
+Importa `lambda_function` en un proceso nuevo con `python -X importtime`,
+muestra los módulos y paquetes que más tardan y falla (exit 1) si:
+
+- el total pasa de `--presupuesto-ms`, o
+- se importó algún módulo de PROHIBIDOS_EN_ARRANQUE: dependencias que sólo
+  usan algunos endpoints (autenticación) o que la API no usa y no deben
+  cargarse en cada contenedor nuevo.
+
+Corre en CI (.github/workflows/ci.yml) con las dependencias de
+backend/requirements.txt; el presupuesto es holgado porque los runners varían,
+la lista de prohibidos es la verificación estricta.
+
+Uso:
+$ python backend/tiempo_importacion.py                       # reporte + verificación
+$ python backend/tiempo_importacion.py --presupuesto-ms 800 --top 30
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+DIRECTORIO_LAMBDA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda-package-complete")
+
+# Se importan al primer uso (auth) o no los usa la API en absoluto
+PROHIBIDOS_EN_ARRANQUE = ["jwt", "passlib", "bcrypt", "boto3", "botocore", "psycopg2", "uvicorn"]
+
+# Al final de sys.path, como en tests/api/conftest.py: las copias empaquetadas en
+# lambda-package-complete son binarios de otra plataforma
+_IMPORTAR = f"import sys; sys.path.append({DIRECTORIO_LAMBDA!r}); import lambda_function"
+
+def medir_importacion() -> List[Tuple[str, int, int]]:
+    """(módulo, propio_us, acumulado_us) de cada módulo importado al cargar lambda_function."""
+    entorno = {k: v for k, v in os.environ.items() if k != "MIGRAR_AL_INICIAR"}
+    proceso = subprocess.run([sys.executable, "-X", "importtime", "-c", _IMPORTAR],
+                             capture_output=True, text=True, env=entorno)
+    if proceso.returncode != 0:
+        raise SystemExit(f"❌ No se pudo importar lambda_function:\n{proceso.stderr[-2000:]}")
+
+    modulos = []
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|")
+        modulos.append((nombre.strip(), int(propio), int(acumulado)))
+    return modulos
+
+def por_paquete(modulos: List[Tuple[str, int, int]]) -> Dict[str, int]:
+    """Tiempo propio sumado por paquete de primer nivel (us)."""
+    totales = defaultdict(int)
+    for nombre, propio, _ in modulos:
+        totales[nombre.split(".")[0]] += propio
+    return dict(totales)
+
+def main():
+    parser = argparse.ArgumentParser(description="Presupuesto de tiempo de importación de la Lambda")
+    parser.add_argument("--presupuesto-ms", type=float, default=float(os.environ.get("PRESUPUESTO_IMPORTACION_MS", 1500)))
+    parser.add_argument("--top", type=int, default=15, help="Módulos y paquetes a mostrar")
+    args = parser.parse_args()
+
+    modulos = medir_importacion()
+    total_ms = next(acumulado for nombre, _, acumulado in modulos if nombre == "lambda_function") / 1000
+
+    print(f"{'propio ms':>10} {'acum. ms':>10}  módulo")
+    for nombre, propio, acumulado in sorted(modulos, key=lambda m: m[1], reverse=True)[:args.top]:
+        print(f"{propio / 1000:10.1f} {acumulado / 1000:10.1f}  {nombre}")
+    print(f"\n{'ms':>10}  paquete")
+    for paquete, propio in sorted(por_paquete(modulos).items(), key=lambda p: p[1], reverse=True)[:args.top]:
+        print(f"{propio / 1000:10.1f}  {paquete}")
+    print(f"\nTotal import lambda_function: {total_ms:.0f}ms (presupuesto {args.presupuesto_ms:.0f}ms)")
+
+    importados = {nombre.split(".")[0] for nombre, _, _ in modulos}
+    prohibidos = [nombre for nombre in PROHIBIDOS_EN_ARRANQUE if nombre in importados]
+    errores = []
+    if prohibidos:
+        errores.append(f"se importan en el arranque: {', '.join(prohibidos)}")
+    if total_ms > args.presupuesto_ms:
+        errores.append(f"{total_ms:.0f}ms excede el presupuesto de {args.presupuesto_ms:.0f}ms")
+    if errores:
+        print("❌ " + "; ".join(errores))
+        sys.exit(1)
+    print("✅ Dentro del presupuesto")
+
+if __name__ == "__main__":
+    main()
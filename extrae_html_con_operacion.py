@@ -939,21 +939,42 @@ def ejecutar_procesamiento_automatico(conteo_propiedades):
             print(f"❌ Error en carga PostgreSQL: {result.stderr}")
             return False
         
-        # 3. Subir imágenes a S3
-        print("\n🔄 PASO 3: Subiendo imágenes a S3...")
+        # 3. Columnas derivadas, tarjetas y snapshot de facetas (post_carga_catalogo.py).
+        #    NO es opcional: los filtros de ciudad/amenidades/documentación, el orden por
+        #    precio e imagen y las tarjetas de la API salen de aquí, y la versión del
+        #    snapshot es la que invalida el cache de páginas y los ETag. Sin este paso las
+        #    filas nuevas quedan fuera de los filtros y la API sigue sirviendo lo anterior.
+        print("\n🔄 PASO 3: Calculando columnas derivadas, tarjetas y snapshot del catálogo...")
+        intentos = 3
+        for intento in range(1, intentos + 1):
+            result = subprocess.run([sys.executable, "src/post_carga_catalogo.py"],
+                                  capture_output=True, text=True)
+            if result.returncode == 0:
+                break
+            print(f"⚠️  post_carga_catalogo.py falló (intento {intento}/{intentos}): {result.stderr[-2000:]}")
+            if intento < intentos:
+                time.sleep(10 * intento)
+        if result.returncode != 0:
+            print("❌ Catálogo cargado pero sin columnas derivadas ni versión nueva: la API no verá estos cambios.")
+            print("   Corregir y correr `python src/post_carga_catalogo.py` antes de continuar.")
+            return False
+        print("✅ Columnas derivadas, tarjetas y snapshot del catálogo actualizados")
+        
+        # 4. Subir imágenes a S3
+        print("\n🔄 PASO 4: Subiendo imágenes a S3...")
         subida_exitosa = subir_imagenes_automatico_s3()
         if subida_exitosa:
             print("✅ Subida de imágenes completada")
         else:
             print("⚠️  Subida de imágenes no completada (continuando)")
         
-        # 4. Actualizar HTML
-        print("\n🔄 PASO 4: Actualizando HTML con conteo real...")
+        # 5. Actualizar HTML
+        print("\n🔄 PASO 5: Actualizando HTML con conteo real...")
         actualizar_html_con_conteo(conteo_propiedades)
         print("✅ HTML actualizado")
         
-        # 5. Verificar PostgreSQL
-        print("\n🔄 PASO 5: Verificando estado final...")
+        # 6. Verificar PostgreSQL
+        print("\n🔄 PASO 6: Verificando estado final...")
         verificar_postgresql()
         
         print("\n" + "="*60)
@@ -10,22 +10,43 @@ PROBLEMAS CORREGIDOS:
 ✅ Leads con páginas individuales implementadas
 """
 
-from fastapi import FastAPI, HTTPException, Query, Depends
+from fastapi import FastAPI, HTTPException, Query, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, HTMLResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional, Dict, Any
 import pg8000
+from pg8000.converters import make_params
+from pg8000.dbapi import convert_paramstyle
 import json
 import logging
 from datetime import datetime, timedelta
+from email.utils import formatdate, parsedate_to_datetime
 import time
 import re
-import jwt
-from passlib.context import CryptContext
+import base64
 import secrets
 import os
+import threading
+import asyncio
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from functools import lru_cache, partial
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # RespuestaJSON usa json de la biblioteca estándar (mismos bytes, más lento)
+
+from compresion import CompresionMiddleware
+from facetas import (BITS_AMENIDADES, COLUMNAS_CARACTERISTICAS_ADICIONALES, COLUMNAS_DOCUMENTACION,
+                     CONSULTA_FACETAS, condicion_amenidades, construir_estadisticas)
+from migraciones import aplicar_migraciones
+from orden import CAMPOS_ORDEN, llaves_orden, sql_orden
+from tarjetas import CAMPOS_RESUMEN, fila_resumen, generar_url_imagen
+from ubicaciones import llave_ciudad, normalizar_nombre
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
@@ -47,6 +68,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compresión gzip/brotli según Accept-Encoding (páginas de hasta 500 propiedades)
+app.add_middleware(CompresionMiddleware, minimo_bytes=int(os.environ.get('COMPRESION_MIN_BYTES', 1024)))
+
 # Configuración de base de datos usando variables de entorno
 DB_CONFIG = {
     'host': os.environ.get('DB_HOST', 'todaslascasas-postgres.cqpcyeqa0uqj.us-east-1.rds.amazonaws.com'),
@@ -62,19 +86,16 @@ SECRET_KEY = "pablo_sistema_inmobiliario_secreto_2025"  # 🎯 PABLO: CLAVE FIJA
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8 horas para que no expire tan rápido
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-security = HTTPBearer(auto_error=False)
+# ⚡ ARRANQUE EN FRÍO: jwt y passlib sólo los usan los endpoints de autenticación;
+# se importan al primer uso para no cargarlos en cada contenedor nuevo
+# (ver backend/tiempo_importacion.py).
+@lru_cache(maxsize=1)
+def _pwd_context():
+    """Password hashing"""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# Ciudades válidas de Morelos
-CIUDADES_MORELOS = {
-    'Cuernavaca', 'Jiutepec', 'Temixco', 'Emiliano Zapata', 'Xochitepec',
-    'Yautepec', 'Cuautla', 'Ayala', 'Tepoztlán', 'Huitzilac', 'Tetela del Volcán',
-    'Tlaltizapán', 'Tlaquiltenango', 'Jojutla', 'Puente de Ixtla', 'Zacatepec',
-    'Axochiapan', 'Jantetelco', 'Jonacatepec', 'Ocuituco', 'Temoac', 'Tetecala',
-    'Mazatepec', 'Miacatlán', 'Coatlán del Río', 'Tlalnepantla', 'Totolapan',
-    'Atlatlahucan', 'Yecapixtla', 'Amacuzac', 'Tres de Mayo'
-}
+security = HTTPBearer(auto_error=False)
 
 # Modelos Pydantic
 class PropiedadResumen(BaseModel):
@@ -133,6 +154,10 @@ class RespuestaPaginada(BaseModel):
     por_pagina: int
     total_paginas: int
     tiempo_consulta_ms: float
+    # Cursor opaco para pedir la página siguiente con ?cursor= (None si no hay más)
+    next_cursor: Optional[str] = None
+    # True cuando se pidió conteo=aproximado y `total` es una estimación
+    total_aproximado: bool = False
 
 class Estadisticas(BaseModel):
     total_propiedades: int
@@ -167,46 +192,16 @@ class Usuario(BaseModel):
     created_at: datetime
 
 # Funciones auxiliares
-def limpiar_ciudad(ciudad: str) -> Optional[str]:
-    """Limpia y valida nombres de ciudades"""
-    if not ciudad:
-        return None
-    
-    ciudad_limpia = ciudad.strip()
-    
-    # Buscar ciudad válida en el texto
-    for ciudad_valida in CIUDADES_MORELOS:
-        if ciudad_valida.lower() in ciudad_limpia.lower():
-            return ciudad_valida
-    
-    # Si no encuentra una ciudad válida, devolver None
-    return None
-
-def generar_url_imagen(nombre_imagen: str) -> str:
-    """Normaliza la ruta de la imagen para que el frontend pueda resolverla."""
-    if not nombre_imagen:
-        return "https://via.placeholder.com/400x300/e2e8f0/64748b?text=Sin+Imagen"
-    
-    # 1) Si ya es una URL absoluta (http/https) devolverla tal cual
-    if nombre_imagen.startswith("http://") or nombre_imagen.startswith("https://"):
-        return nombre_imagen
-    
-    # 2) Si ya viene con la fecha como primer segmento (2025-07-06/....) dejarla igual
-    if re.match(r"^\d{4}-\d{2}-\d{2}/", nombre_imagen):
-        return nombre_imagen
-
-    # 3) Si empieza con "resultados/", quitar ese prefijo para que quede relativo al bucket
-    if nombre_imagen.startswith("resultados/"):
-        return nombre_imagen[len("resultados/"):]
+def consulta_texto(texto: str) -> Optional[str]:
+    """Convierte la búsqueda del usuario en un tsquery por prefijos ("casa cuerna" → "casa:* & cuerna:*").
 
-    # 4) Extraer fecha (yyyy-mm-dd) del nombre y anteponerla
-    match = re.search(r"(\d{4}-\d{2}-\d{2})", nombre_imagen)
-    if match:
-        fecha = match.group(1)
-        return f"{fecha}/{nombre_imagen}"
-    
-    # 5) Como último recurso, devolver sin modificar
-    return nombre_imagen
+    Se usa con to_tsquery('spanish', ...) contra la columna indexada search_vector;
+    los prefijos conservan las coincidencias parciales que antes daba ILIKE.
+    """
+    palabras = re.findall(r"\w+", (texto or "").lower())
+    if not palabras:
+        return None
+    return " & ".join(f"{palabra}:*" for palabra in palabras)
 
 # Conexión a base de datos
 def get_db_connection():
@@ -219,50 +214,323 @@ def get_db_connection():
             password=DB_CONFIG['password'],
             port=DB_CONFIG['port'],
         )
+        # Cada consulta es una sentencia independiente: no dejar transacciones
+        # abiertas en conexiones que se reutilizan entre peticiones
+        conn.autocommit = True
         return conn
     except Exception as e:
         logger.error(f"Error conectando a BD: {e}")
         raise HTTPException(status_code=500, detail="Error de conexión a base de datos")
 
-def ejecutar_consulta(query: str, params: tuple = None, fetchall: bool = True):
-    """Ejecuta consulta con medición de tiempo"""
+# ⚡ POOL DE CONEXIONES - vive mientras el contenedor Lambda siga caliente
+# Un contenedor Lambda atiende una petición a la vez y ésta usa a lo más 2 conexiones
+# (página y total en paralelo); más sólo multiplica conexiones ociosas contra RDS
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 2))                    # tope por contenedor
+DB_POOL_TIMEOUT_S = float(os.environ.get('DB_POOL_TIMEOUT_S', 10))     # espera máxima por una conexión libre
+DB_POOL_PING_S = float(os.environ.get('DB_POOL_PING_S', 30))           # ociosa más de esto → SELECT 1 antes de usarla
+DB_POOL_MAX_VIDA_S = float(os.environ.get('DB_POOL_MAX_VIDA_S', 1800)) # reciclar conexiones viejas
+
+class PoolConexiones:
+    """Pool LIFO de conexiones pg8000 con tope de tamaño y validación al tomarlas."""
+
+    def __init__(self, maximo: int, timeout_s: float, ping_s: float, max_vida_s: float):
+        self.maximo = maximo
+        self.timeout_s = timeout_s
+        self.ping_s = ping_s
+        self.max_vida_s = max_vida_s
+        self._libres = []  # [(conexion, creada_en, liberada_en)]
+        self._lock = threading.Lock()
+        self._cupos = threading.BoundedSemaphore(maximo)
+        self.creadas = 0
+        self.reconexiones = 0
+
+    def _conexion_sana(self, conn, creada_en: float, liberada_en: float) -> bool:
+        ahora = time.monotonic()
+        if ahora - creada_en > self.max_vida_s:
+            return False
+        if ahora - liberada_en < self.ping_s:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception as e:
+            logger.warning(f"Conexión descartada al validarla: {e}")
+            return False
+
+    def _cerrar(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def tomar(self):
+        """Devuelve (conexion, creada_en, reutilizada). Bloquea si el pool está lleno."""
+        if not self._cupos.acquire(timeout=self.timeout_s):
+            logger.error("Pool de conexiones agotado")
+            raise HTTPException(status_code=503, detail="Base de datos saturada, intenta de nuevo")
+        try:
+            while True:
+                with self._lock:
+                    libre = self._libres.pop() if self._libres else None
+                if libre is None:
+                    break
+                conn, creada_en, liberada_en = libre
+                if self._conexion_sana(conn, creada_en, liberada_en):
+                    return conn, creada_en, True
+                self._cerrar(conn)
+                self.contar_reconexion()
+            conn = get_db_connection()
+            with self._lock:
+                self.creadas += 1
+            return conn, time.monotonic(), False
+        except Exception:
+            self._cupos.release()
+            raise
+
+    def contar_reconexion(self):
+        # Los hilos de _executor_bd toman y devuelven conexiones a la vez
+        with self._lock:
+            self.reconexiones += 1
+
+    def devolver(self, conn, creada_en: float, descartar: bool = False):
+        """Regresa la conexión al pool (o la cierra si quedó inutilizable)."""
+        try:
+            if descartar:
+                self._cerrar(conn)
+            else:
+                with self._lock:
+                    self._libres.append((conn, creada_en, time.monotonic()))
+        finally:
+            self._cupos.release()
+
+    def cerrar_todas(self):
+        with self._lock:
+            libres, self._libres = self._libres, []
+        for conn, _, _ in libres:
+            self._cerrar(conn)
+
+    def precalentar(self, cantidad: int) -> int:
+        """Deja hasta `cantidad` conexiones abiertas y validadas en el pool; devuelve cuántas."""
+        tomadas = []
+        try:
+            for _ in range(min(cantidad, self.maximo)):
+                tomadas.append(self.tomar())
+        finally:
+            for conn, creada_en, _ in tomadas:
+                self.devolver(conn, creada_en)
+        return len(tomadas)
+
+db_pool = PoolConexiones(DB_POOL_MAX, DB_POOL_TIMEOUT_S, DB_POOL_PING_S, DB_POOL_MAX_VIDA_S)
+
+def migrar_esquema() -> List[int]:
+    """Aplica las migraciones pendientes (migraciones.py) con una conexión del pool.
+
+    Lo llama lambda_function en el arranque en frío si MIGRAR_AL_INICIAR=1; el camino
+    normal es `make migrar` al desplegar. Ningún endpoint ejecuta DDL.
+    """
+    conn, creada_en, _ = db_pool.tomar()
+    try:
+        aplicadas = aplicar_migraciones(conn)
+    except Exception:
+        db_pool.devolver(conn, creada_en, descartar=True)
+        raise
+    db_pool.devolver(conn, creada_en)
+    return aplicadas
+
+def _error_de_conexion(e: Exception) -> bool:
+    """True si el error indica que el socket murió (RDS cerró la conexión, reinicio, etc.)."""
+    return isinstance(e, (pg8000.exceptions.InterfaceError, ConnectionError, OSError))
+
+# ⚡ SENTENCIAS PREPARADAS - cada conexión del pool guarda las suyas (PARSE una sola vez)
+DB_PREPARADAS_MAX = int(os.environ.get('DB_PREPARADAS_MAX', 64))  # por conexión; las menos usadas se cierran
+
+def _ejecutar_preparada(conn, query: str, params: tuple):
+    """Ejecuta `query` como sentencia preparada con nombre en `conn`; devuelve (columnas, filas).
+
+    La primera vez se envía PARSE/DESCRIBE; después sólo BIND/EXECUTE, y PostgreSQL
+    puede reutilizar el plan. `query` debe ser una plantilla (mismo texto para la
+    misma forma de consulta), nunca SQL con valores interpolados.
+    """
+    preparadas = getattr(conn, 'sentencias_preparadas', None)
+    if preparadas is None:
+        preparadas = conn.sentencias_preparadas = OrderedDict()
+    sentencia, valores = convert_paramstyle('format', query, params)
+
+    preparada = preparadas.get(query)
+    if preparada is None:
+        if len(preparadas) >= DB_PREPARADAS_MAX:
+            _, (nombre, _, _) = preparadas.popitem(last=False)
+            conn.close_prepared_statement(nombre)
+        preparada = preparadas[query] = conn.prepare_statement(sentencia, ())
+    else:
+        preparadas.move_to_end(query)
+
+    nombre, descripcion, input_funcs = preparada
+    contexto = conn.execute_named(nombre, make_params(conn.py_types, valores), descripcion, input_funcs, sentencia)
+    return [col['name'] for col in descripcion or []], contexto.rows or []
+
+def ejecutar_consulta(query: str, params: tuple = None, fetchall: bool = True, preparada: bool = False):
+    """Ejecuta consulta con medición de tiempo (como sentencia preparada si `preparada`)"""
     inicio = time.time()
-    
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        for intento in range(2):
+            conn, creada_en, reutilizada = db_pool.tomar()
+            try:
+                if preparada:
+                    columnas, filas = _ejecutar_preparada(conn, query, params or ())
+                else:
+                    cursor = conn.cursor()
 
-        # pg8000 exige tupla vacía si no hay parámetros
-        cursor.execute(query, params or ())
+                    # pg8000 exige tupla vacía si no hay parámetros
+                    cursor.execute(query, params or ())
+
+                    columnas = [desc[0] for desc in cursor.description] if cursor.description else []
+                    filas = cursor.fetchall() if fetchall else [cursor.fetchone()]
+                    cursor.close()
+
+                if fetchall:
+                    resultado = [dict(zip(columnas, fila)) for fila in filas]
+                else:
+                    fila = filas[0] if filas else None
+                    resultado = dict(zip(columnas, fila)) if fila else None
+            except Exception as e:
+                caida = _error_de_conexion(e)
+                db_pool.devolver(conn, creada_en, descartar=caida)
+                # Una conexión reutilizada pudo haber sido cerrada por RDS: reintentar una vez con una nueva
+                if caida and reutilizada and intento == 0:
+                    logger.warning(f"Conexión caída, reconectando: {e}")
+                    db_pool.contar_reconexion()
+                    continue
+                raise
+            db_pool.devolver(conn, creada_en)
+            break
 
-        columnas = [desc[0] for desc in cursor.description] if cursor.description else []
-        
-        if fetchall:
-            filas = cursor.fetchall()
-            resultado = [dict(zip(columnas, fila)) for fila in filas]
-        else:
-            fila = cursor.fetchone()
-            resultado = dict(zip(columnas, fila)) if fila else None
-        
-        cursor.close()
-        conn.close()
-        
         tiempo_ms = (time.time() - inicio) * 1000
         logger.info(f"Consulta ejecutada en {tiempo_ms:.2f}ms")
-        
+
         return resultado, tiempo_ms
     except Exception as e:
         logger.error(f"Error en consulta: {e}")
         raise
 
+# ⚡ ACCESO NO BLOQUEANTE PARA LOS ENDPOINTS async
+# Executor acotado al tamaño del pool: cada hilo siempre encuentra una conexión libre
+# y el event loop de uvicorn/Mangum queda libre mientras la consulta viaja a RDS.
+_executor_bd = ThreadPoolExecutor(max_workers=DB_POOL_MAX, thread_name_prefix="consultas-bd")
+
+# ⚡ COALESCENCIA (single-flight): lecturas idénticas en vuelo comparten UNA ejecución.
+# En un pico de tráfico, N peticiones iguales hacen una sola consulta a RDS; no hay
+# TTL, así que nadie recibe datos más viejos que la consulta que ya estaba corriendo.
+COALESCENCIA_TIMEOUT_S = float(os.environ.get('COALESCENCIA_TIMEOUT_S', 15))  # espera máxima de quien se suma
+_en_vuelo: Dict[tuple, asyncio.Future] = {}
+coalescencia = {'ejecutadas': 0, 'compartidas': 0}
+
+def clave_params(params) -> tuple:
+    """Parámetros como tupla hashable (los arreglos de `= ANY(%s)` llegan como listas)."""
+    return tuple(tuple(p) if isinstance(p, list) else p for p in params or ())
+
+def _es_lectura(query: str) -> bool:
+    # Sólo lecturas: dos INSERT iguales son dos filas, no una
+    return query.lstrip().upper().startswith(('SELECT', 'EXPLAIN'))
+
+def _copia_resultado(resultado):
+    """Copia por fila para que cada petición pueda modificar sus dicts sin afectar a las demás."""
+    if isinstance(resultado, list):
+        return [dict(fila) for fila in resultado]
+    return dict(resultado) if resultado is not None else None
+
+async def ejecutar_consulta_async(query: str, params: tuple = None, fetchall: bool = True, preparada: bool = False):
+    """Igual que ejecutar_consulta, pero sin bloquear el event loop (y compartiendo lecturas idénticas)"""
+    loop = asyncio.get_running_loop()
+    ejecutar = partial(ejecutar_consulta, query, params, fetchall, preparada)
+    if not _es_lectura(query):
+        return await loop.run_in_executor(_executor_bd, ejecutar)
+
+    clave = (query, clave_params(params), fetchall)
+    futuro = _en_vuelo.get(clave)
+    if futuro is not None and futuro.get_loop() is loop:
+        coalescencia['compartidas'] += 1
+        try:
+            resultado, tiempo_ms = await asyncio.wait_for(asyncio.shield(futuro), COALESCENCIA_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            logger.error("Tiempo agotado esperando una consulta compartida")
+            raise HTTPException(status_code=503, detail="Base de datos saturada, intenta de nuevo")
+        return _copia_resultado(resultado), tiempo_ms
+
+    coalescencia['ejecutadas'] += 1
+    futuro = loop.run_in_executor(_executor_bd, ejecutar)
+    _en_vuelo[clave] = futuro
+
+    def terminar(terminado):
+        if _en_vuelo.get(clave) is terminado:
+            del _en_vuelo[clave]
+
+    futuro.add_done_callback(terminar)
+    # shield: si se cancela la petición que la lanzó, las demás siguen esperando el resultado
+    return await asyncio.shield(futuro)
+
 # 🔐 FUNCIONES DE AUTENTICACIÓN
 def hash_password(password: str) -> str:
     """Hash de contraseña"""
-    return pwd_context.hash(password)
+    return _pwd_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verificar contraseña"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return _pwd_context().verify(plain_password, hashed_password)
+
+# ⚡ BCRYPT FUERA DEL EVENT LOOP
+# Cada hash/verify cuesta cientos de ms de CPU a propósito; en el event loop congelaba
+# también los listados. Corren en un executor propio y acotado; si ya hay HASH_COLA_MAX
+# pendientes (en curso + en espera) se responde 503 de inmediato en vez de encolar más.
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', 2))
+HASH_COLA_MAX = int(os.environ.get('HASH_COLA_MAX', 8))
+_executor_hash = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="hash-password")
+cola_hash = {'pendientes': 0, 'max_pendientes': 0, 'completadas': 0, 'fallidas': 0, 'rechazadas': 0}
+
+def _hash_terminado(futuro):
+    """Descuenta el hash cuando termina su hilo, no cuando deja de esperarlo quien lo pidió.
+
+    Si la petición se cancela (cliente desconectado, timeout) bcrypt sigue ocupando su
+    worker hasta acabar: hasta entonces cuenta como pendiente. Uno cancelado antes de
+    empezar sólo libera su lugar.
+    """
+    cola_hash['pendientes'] -= 1
+    if futuro.cancelled():
+        return
+    if futuro.exception() is not None:
+        cola_hash['fallidas'] += 1
+    else:
+        cola_hash['completadas'] += 1
+
+async def _en_executor_hash(funcion, *args):
+    # Los contadores sólo se tocan desde el event loop: no necesitan lock
+    if cola_hash['pendientes'] >= HASH_COLA_MAX:
+        cola_hash['rechazadas'] += 1
+        raise HTTPException(status_code=503, detail="Servidor ocupado, intenta de nuevo en unos segundos",
+                            headers={"Retry-After": "1"})
+    loop = asyncio.get_running_loop()
+
+    def al_terminar(futuro):
+        if loop.is_closed():
+            _hash_terminado(futuro)  # sin loop no hay con quién competir por el contador
+        else:
+            loop.call_soon_threadsafe(_hash_terminado, futuro)
+
+    futuro = _executor_hash.submit(funcion, *args)
+    cola_hash['pendientes'] += 1
+    cola_hash['max_pendientes'] = max(cola_hash['max_pendientes'], cola_hash['pendientes'])
+    futuro.add_done_callback(al_terminar)
+    return await asyncio.wrap_future(futuro)
+
+async def hash_password_async(password: str) -> str:
+    return await _en_executor_hash(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _en_executor_hash(verify_password, plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Crear token JWT"""
@@ -271,32 +539,69 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
+    import jwt
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """🎯 PABLO: OBTENER USUARIO ACTUAL CORREGIDO"""
+def claims_de_usuario(user_data: Dict) -> Dict:
+    """Claims del JWT: `sub` (email) más `id` y `es_admin` para los chequeos sin BD."""
+    return {"sub": user_data["email"], "id": user_data["id"], "es_admin": bool(user_data.get("es_admin", False))}
+
+def decodificar_token(credentials: Optional[HTTPAuthorizationCredentials]) -> Dict:
+    """Payload del JWT ya validado (firma, expiración y `sub`); 401 si no sirve."""
     if not credentials:
         raise HTTPException(status_code=401, detail="Token requerido")
     
+    import jwt
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=401, detail="Token inválido")
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expirado")
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Token inválido")
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Token inválido")
+    return payload
+
+# ⚡ CACHE DE USUARIOS: los endpoints de leads piden el usuario en cada llamada. Se
+# guarda por (sub, iat) en un LRU acotado con TTL corto; eliminar un usuario o cambiar
+# su es_admin lo invalida en este contenedor y el TTL acota lo que tarda en verse en
+# los demás (también para los tokens con claims: ver get_usuario_token).
+USUARIOS_CACHE_TTL_S = float(os.environ.get('USUARIOS_CACHE_TTL_S', 30))
+USUARIOS_CACHE_MAX = int(os.environ.get('USUARIOS_CACHE_MAX', 1024))
+_cache_usuarios: Dict[tuple, tuple] = OrderedDict()
+_cache_usuarios_lock = threading.Lock()
+
+def invalidar_usuario(usuario_id: int):
+    """Saca del cache al usuario (todos sus tokens); llamar al eliminarlo o cambiar es_admin."""
+    with _cache_usuarios_lock:
+        for clave in [c for c, (usuario, _) in _cache_usuarios.items() if usuario.id == usuario_id]:
+            del _cache_usuarios[clave]
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """🎯 PABLO: OBTENER USUARIO ACTUAL CORREGIDO"""
+    payload = decodificar_token(credentials)
+    email: str = payload["sub"]
+
+    clave = (email, payload.get("iat"))
+    ahora = time.monotonic()
+    with _cache_usuarios_lock:
+        en_cache = _cache_usuarios.get(clave)
+        if en_cache is not None:
+            if ahora - en_cache[1] < USUARIOS_CACHE_TTL_S:
+                _cache_usuarios.move_to_end(clave)
+                return en_cache[0]
+            del _cache_usuarios[clave]
     
     # Buscar usuario en BD
     query = "SELECT * FROM usuarios WHERE email = %s"
     try:
         resultado, _ = ejecutar_consulta(query, (email,), fetchall=False)
-        if resultado:
+        # Un usuario desactivado deja de autenticar igual que uno eliminado
+        if resultado and dict(resultado).get('activo', True):
             user_data = dict(resultado)
-            return Usuario(
+            usuario = Usuario(
                 id=user_data['id'],
                 nombre=user_data['nombre'],
                 email=user_data['email'],
@@ -304,12 +609,34 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
                 es_admin=user_data.get('es_admin', False),
                 created_at=user_data['created_at']
             )
+            with _cache_usuarios_lock:
+                _cache_usuarios[clave] = (usuario, ahora)
+                _cache_usuarios.move_to_end(clave)
+                while len(_cache_usuarios) > USUARIOS_CACHE_MAX:
+                    _cache_usuarios.popitem(last=False)
+            return usuario
     except Exception as e:
         logger.error(f"Error buscando usuario: {e}")
         raise HTTPException(status_code=401, detail="Usuario no encontrado")
     
     raise HTTPException(status_code=401, detail="Usuario no encontrado")
 
+class UsuarioToken(BaseModel):
+    """Lo que los endpoints de leads necesitan del usuario; suficiente para filtrar por usuario."""
+    id: int
+    email: str
+    es_admin: bool = False
+
+def get_usuario_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Usuario para chequeos de sólo lectura, desde el cache de get_current_user.
+
+    Los claims del token valen 8 horas: confiar sólo en ellos dejaría entrar a un
+    usuario eliminado o desactivado hasta que expire. Pasando por el cache la BD se
+    consulta a lo más una vez por token y USUARIOS_CACHE_TTL_S en cada contenedor.
+    """
+    usuario = get_current_user(credentials)
+    return UsuarioToken(id=usuario.id, email=usuario.email, es_admin=usuario.es_admin)
+
 # ENDPOINTS PRINCIPALES
 
 @app.get("/", response_model=Dict)
@@ -335,8 +662,317 @@ async def root():
         ]
     }
 
+# ⚡ SERIALIZACIÓN DIRECTA DE LISTADOS
+# Con por_pagina=500, construir PropiedadResumen por fila y volver a validar todo con
+# response_model costaba más que la consulta. Las filas se convierten directo a la forma
+# documentada (mismo orden de llaves y mismos tipos que el modelo, ver tarjetas.py) y se
+# serializan una vez; los bytes son iguales a los de la ruta con Pydantic
+# (tests/api/test_serializacion.py). `response_model` se conserva en los decoradores
+# para la documentación OpenAPI.
+
+# ⚡ PROYECCIÓN (campos=): cada campo de la respuesta sale de UNA expresión SQL, así
+# pedir menos campos también reduce lo que se lee y transfiere desde RDS
+_SQL_CAMPOS_RESUMEN = {
+    'id': "id", 'titulo': "titulo", 'descripcion': "descripcion", 'precio': "precio", 'ciudad': "ciudad",
+    'tipo_operacion': "tipo_operacion", 'tipo_propiedad': "tipo_propiedad",
+    'imagen_url': """CASE 
+            WHEN imagenes IS NOT NULL AND jsonb_array_length(imagenes) > 0 
+            THEN imagenes->>0 
+            ELSE NULL 
+        END""",
+    'images': "imagenes", 'url_original': "url_original", 'direccion': "direccion",
+    'estado': "estado", 'link': "url_original", 'recamaras': "recamaras", 'banos': "banos",
+    'estacionamientos': "estacionamientos", 'superficie_m2': "superficie_construida",
+    'autor': "autor", 'amenidades': "amenidades", 'caracteristicas': "caracteristicas",
+    # 🎯 PABLO: CREAR OBJETO UBICACION DINÁMICAMENTE
+    'ubicacion': """json_build_object(
+            'direccion_completa', COALESCE(direccion, ciudad || CASE WHEN estado IS NOT NULL THEN ', ' || estado ELSE '' END),
+            'ciudad', ciudad,
+            'estado', estado,
+            'texto_original', direccion
+        )""",
+}
+
+def _columnas_resumen(campos) -> str:
+    return ",\n        ".join(f"{_SQL_CAMPOS_RESUMEN[campo]} AS {campo}" for campo in campos)
+
+# ⚡ TARJETA PRECALCULADA: la carga guarda en `propiedades.tarjeta` la forma final de
+# cada fila (tarjetas.py). Las filas aún sin tarjeta (nuevas o modificadas después de
+# la última carga) traen sus columnas crudas marcadas con `_pendiente` y se arman aquí.
+SQL_TARJETA = (
+    "COALESCE(tarjeta, json_build_object("
+    + ", ".join(f"'{campo}', {expr}" for campo, expr in _SQL_CAMPOS_RESUMEN.items())
+    + ", '_pendiente', true)) AS tarjeta"
+)
+
+def tarjeta_de_fila(fila: Dict) -> Dict:
+    """Columna `tarjeta` de una fila → dict con la forma de PropiedadResumen."""
+    tarjeta = fila['tarjeta']
+    if isinstance(tarjeta, str):
+        tarjeta = json.loads(tarjeta)
+    # Sin modificar el dict: con la coalescencia varias peticiones comparten la misma fila
+    if tarjeta.get('_pendiente'):
+        return fila_resumen(tarjeta)
+    return tarjeta
+
+# Proyecciones con nombre; "tarjeta" es lo que muestra la cuadrícula de resultados
+PROYECCIONES = {
+    'tarjeta': ('id', 'titulo', 'precio', 'ciudad', 'tipo_operacion', 'tipo_propiedad', 'imagen_url',
+                'recamaras', 'banos', 'estacionamientos', 'superficie_m2'),
+}
+
+def campos_solicitados(campos: Optional[str]) -> Optional[tuple]:
+    """`campos=` (proyección o lista separada por comas) → campos en el orden del modelo; None = todos."""
+    if not campos:
+        return None
+    nombres = PROYECCIONES.get(campos.strip()) or {c.strip() for c in campos.split(',') if c.strip()}
+    desconocidos = sorted(set(nombres) - set(_SQL_CAMPOS_RESUMEN))
+    if desconocidos:
+        raise HTTPException(status_code=400, detail=f"Campos desconocidos: {', '.join(desconocidos)}")
+    # `id` siempre viaja: identifica la propiedad para el detalle y los favoritos
+    return tuple(campo for campo, _ in CAMPOS_RESUMEN if campo in nombres or campo == 'id')
+
+def respuesta_paginada(propiedades: List[Dict], total: int, pagina: int, por_pagina: int, tiempo_ms: float,
+                       next_cursor: Optional[str] = None, total_aproximado: bool = False) -> Dict:
+    """Cuerpo con la forma de RespuestaPaginada."""
+    return {
+        'propiedades': propiedades,
+        'total': int(total),
+        'pagina': pagina,
+        'por_pagina': por_pagina,
+        'total_paginas': (total + por_pagina - 1) // por_pagina,
+        'tiempo_consulta_ms': float(tiempo_ms),
+        'next_cursor': next_cursor,
+        'total_aproximado': total_aproximado,
+    }
+
+class RespuestaJSON(Response):
+    """JSON con orjson si está instalado; si no, los mismos bytes que JSONResponse."""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content  # ya serializado (páginas de cache_listados)
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+_CLAVE_TIEMPO = b'"tiempo_consulta_ms":'
+
+def partir_en_tiempo(cuerpo: bytes) -> tuple:
+    """Separa el JSON de una página alrededor del valor de tiempo_consulta_ms.
+
+    Es la última aparición de la llave: dentro de los textos de las propiedades las
+    comillas van escapadas y después sólo vienen next_cursor y total_aproximado.
+    """
+    cabeza, _, resto = cuerpo.rpartition(_CLAVE_TIEMPO)
+    return cabeza + _CLAVE_TIEMPO, resto[resto.index(b','):]
+
+# ⚡ CONTEO APROXIMADO (conteo=aproximado)
+ESTIMACION_TTL_S = float(os.environ.get('ESTIMACION_TTL_S', 300))
+_cache_estimaciones: Dict[tuple, tuple] = {}
+
+async def estimar_total(from_where: str, params: tuple, sin_filtros: bool = False) -> int:
+    """Total aproximado: conteo del snapshot si no hay filtros, si no la estimación del planner."""
+    if sin_filtros:
+        snapshot = await obtener_snapshot_facetas()
+        if snapshot is not None:
+            return snapshot['total']
+
+    clave = (from_where, clave_params(params))
+    ahora = time.monotonic()
+    en_cache = _cache_estimaciones.get(clave)
+    if en_cache and ahora - en_cache[1] < ESTIMACION_TTL_S:
+        return en_cache[0]
+
+    # EXPLAIN sólo planea la consulta: no recorre la tabla
+    plan, _ = await ejecutar_consulta_async(f"EXPLAIN (FORMAT JSON) SELECT 1 {from_where}", params, fetchall=False)
+    plan = plan['QUERY PLAN']
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    total = int(plan[0]['Plan']['Plan Rows'])
+
+    if len(_cache_estimaciones) >= 512:
+        _cache_estimaciones.clear()
+    _cache_estimaciones[clave] = (total, ahora)
+    return total
+
+# ⚡ CONTEO EXACTO (conteo=exacto, el valor por omisión)
+# El total sólo cambia con la carga: se cachea por filtro y por versión del catálogo
+# (la de `facet_snapshot`, como cache_listados). La primera página de un filtro lo
+# cuenta una vez; las siguientes, las de cursor y los demás contenedores que ya lo
+# tengan no vuelven a recorrer el conjunto filtrado.
+CONTEOS_CACHE_MAX = int(os.environ.get('CONTEOS_CACHE_MAX', 2048))
+_cache_conteos = {'version': None, 'totales': OrderedDict()}
+
+async def contar_total(from_where: str, params: tuple) -> int:
+    """Total exacto de `from_where`, cacheado mientras no cambie la versión del catálogo."""
+    version = _cache_facetas['version'] if _cache_facetas['datos'] is not None else None
+    clave = (from_where, clave_params(params))
+    totales = _cache_conteos['totales']
+    if version is not None:
+        if _cache_conteos['version'] != version:
+            totales.clear()
+            _cache_conteos['version'] = version
+        if clave in totales:
+            totales.move_to_end(clave)
+            return totales[clave]
+
+    fila, _ = await ejecutar_consulta_async(f"SELECT COUNT(*) {from_where}", params, fetchall=False, preparada=True)
+    total = fila['count']
+    # Sin versión no hay forma de invalidar: no se guarda
+    if version is not None and _cache_conteos['version'] == version:
+        totales[clave] = total
+        while len(totales) > CONTEOS_CACHE_MAX:
+            totales.popitem(last=False)
+    return total
+
+# ⚡ PAGINACIÓN POR CURSOR (keyset)
+# Las llaves de orden (orden.py) generan el ORDER BY y la condición "fila posterior
+# al cursor", así ?pagina= y ?cursor= coinciden.
+def _condicion_keyset(claves: List[tuple], valores: list):
+    """Condición SQL (y parámetros) para las filas que van DESPUÉS de `valores` en el orden dado."""
+    condicion, params = "FALSE", []
+    for (expr, desc, nulls_last), valor in reversed(list(zip(claves, valores))):
+        if valor is None:
+            despues = f"{expr} IS NOT NULL" if not nulls_last else "FALSE"
+            empate = f"{expr} IS NULL"
+            params_llave = []
+        else:
+            despues = f"{expr} {'<' if desc else '>'} %s" + (f" OR {expr} IS NULL" if nulls_last else "")
+            empate = f"{expr} = %s"
+            params_llave = [valor, valor]
+        condicion = f"(({despues}) OR ({empate} AND {condicion}))"
+        params = params_llave + params
+    return condicion, params
+
+def codificar_cursor(orden: str, valores: list) -> str:
+    contenido = json.dumps({'o': orden, 'v': valores}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(contenido.encode()).decode().rstrip('=')
+
+def decodificar_cursor(cursor: str, orden: str, num_claves: int) -> list:
+    try:
+        contenido = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        valores = contenido['v']
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if contenido.get('o') != orden or not isinstance(valores, list) or len(valores) != num_claves:
+        raise HTTPException(status_code=400, detail="El cursor no corresponde al orden solicitado")
+    return valores
+
+# ⚡ CACHE DE RESULTADOS DE /propiedades - vive mientras el contenedor siga caliente
+LISTADOS_CACHE_MAX_BYTES = int(os.environ.get('LISTADOS_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+class CacheListados:
+    """LRU de páginas de /propiedades acotado por bytes e invalidado por versión del catálogo.
+
+    Guarda el JSON ya serializado, así que el tope cuenta lo que de verdad ocupa y un
+    acierto no vuelve a pasar por orjson. La versión es la de `facet_snapshot`, que la
+    ingesta incrementa en cada carga (src/post_carga_catalogo.py); al cambiar se
+    descartan todas las páginas.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()  # clave -> (cuerpo, bytes)
+        self.bytes = 0
+        self.version = None
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _vaciar(self, version):
+        self._entradas.clear()
+        self.bytes = 0
+        self.version = version
+
+    def obtener(self, clave: tuple, version):
+        if version != self.version:
+            self._vaciar(version)
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            self.fallos += 1
+            return None
+        self._entradas.move_to_end(clave)
+        self.aciertos += 1
+        return entrada[0]
+
+    def guardar(self, clave: tuple, version, cuerpo, tamano: int):
+        if version != self.version or tamano > self.max_bytes:
+            return
+        anterior = self._entradas.pop(clave, None)
+        if anterior is not None:
+            self.bytes -= anterior[1]
+        self._entradas[clave] = (cuerpo, tamano)
+        self.bytes += tamano
+        while self.bytes > self.max_bytes:
+            _, (_, liberados) = self._entradas.popitem(last=False)
+            self.bytes -= liberados
+
+    def estadisticas(self) -> Dict:
+        consultas = self.aciertos + self.fallos
+        return {
+            "entradas": len(self._entradas),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "version_catalogo": self.version,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round(self.aciertos / consultas, 3) if consultas else 0.0,
+        }
+
+cache_listados = CacheListados(LISTADOS_CACHE_MAX_BYTES)
+
+# ⚡ PLANTILLAS DE /propiedades
+# El texto SQL depende sólo de la FORMA de la petición (qué filtros vienen, el orden,
+# si hay cursor y qué llaves del cursor son NULL), nunca de los valores: cada forma
+# se arma una vez por contenedor y corre como sentencia preparada en cada conexión.
+def _condicion_cantidad(columna: str, valores: List[int], tope: int, params: list) -> str:
+    """Condición para recámaras/baños/estacionamientos: valores exactos y "tope o más"."""
+    exactos = sorted({v for v in valores if v < tope})
+    partes = []
+    if exactos:
+        partes.append(f"{columna} = ANY(%s)")
+        params.append(exactos)
+    if any(v >= tope for v in valores):
+        partes.append(f"{columna} >= {tope}")
+    return f"({' OR '.join(partes)})"
+
+@lru_cache(maxsize=256)
+def _plantilla_listado(where_conditions: tuple, orden: str, nulos_cursor: Optional[tuple],
+                       campos: Optional[tuple] = None) -> str:
+    """SQL parametrizado de una página de /propiedades (ver orden de parámetros en listar_propiedades).
+
+    Sin total en la misma sentencia: un COUNT(*) OVER () obliga a leer el conjunto filtrado
+    completo y anula el recorrido del índice de orden que se detiene en el LIMIT.
+    """
+    where_clause = " AND ".join(where_conditions)
+    claves_orden = llaves_orden(orden)
+    page_where = where_clause
+
+    if nulos_cursor is not None:
+        # Sólo importa qué llaves son NULL; los valores viajan como parámetros
+        condicion_cursor, _ = _condicion_keyset(claves_orden, [None if nulo else 0 for nulo in nulos_cursor])
+        page_where = f"{where_clause} AND {condicion_cursor}"
+    columnas_orden = ", ".join(f"{expr} AS _orden_{i}" for i, (expr, _, _) in enumerate(claves_orden))
+    # Sin `campos=` basta la tarjeta precalculada; una proyección lee sólo sus columnas
+    columnas = _columnas_resumen(campos) if campos else SQL_TARJETA
+
+    # Consulta principal con paginación - RUTAS DE IMÁGENES CORREGIDAS + UBICACION
+    return f"""
+    SELECT 
+        {columnas},
+        {columnas_orden}
+    FROM propiedades 
+    WHERE {page_where}
+    ORDER BY 
+        {sql_orden(claves_orden)}
+    LIMIT %s OFFSET %s
+    """
+
 @app.get("/propiedades", response_model=RespuestaPaginada)
 async def listar_propiedades(
+    request: Request,
+    response: Response,
     pagina: int = Query(1, ge=1, description="Número de página"),
     por_pagina: int = Query(12, ge=1, le=500, description="Propiedades por página"),
     # Parámetros legacy (compatibilidad con front-end <= v3.3.3)
@@ -345,6 +981,7 @@ async def listar_propiedades(
     search_legacy: Optional[str] = Query(None, alias="search"),
     city_legacy: Optional[List[str]] = Query(None, alias="city"),
     ciudad: Optional[List[str]] = Query(None, description="Filtrar por ciudades"),
+    colonia: Optional[List[str]] = Query(None, description="Filtrar por colonias"),
     tipo_operacion: Optional[List[str]] = Query(None, description="Filtrar por tipos de operación"),
     tipo_propiedad: Optional[List[str]] = Query(None, description="Filtrar por tipos de propiedad"),
     precio_min: Optional[float] = Query(None, description="Precio mínimo"),
@@ -358,7 +995,10 @@ async def listar_propiedades(
     documentacion: Optional[List[str]] = Query(None, description="Filtrar por documentación"),
     caracteristicas_adicionales: Optional[List[str]] = Query(None, description="Filtrar por características adicionales"),
     q: Optional[str] = Query(None, description="Búsqueda de texto"),
-    orden: Optional[str] = Query("created_at", description="Campo para ordenar")
+    orden: Optional[str] = Query("created_at", description="Campo para ordenar"),
+    cursor: Optional[str] = Query(None, description="Cursor de la respuesta anterior (next_cursor); sustituye a pagina"),
+    conteo: Optional[str] = Query("exacto", description="exacto | aproximado (estimación, sin recorrer la tabla)"),
+    campos: Optional[str] = Query(None, description="Campos de cada propiedad separados por coma, o 'tarjeta' (id siempre incluido)")
 ):
     """
     Lista propiedades con paginación y filtros FUNCIONALES
@@ -368,6 +1008,12 @@ async def listar_propiedades(
     - ✅ Imágenes con rutas correctas
     - ✅ Ciudades limpias
     """
+    campos_respuesta = campos_solicitados(campos)
+    
+    # 304 antes de armar y correr la consulta si el cliente ya tiene esta versión
+    no_modificado = await validar_cache_http(request, response, 'listados')
+    if no_modificado is not None:
+        return no_modificado
     
     # Mapear parámetros legacy si los actuales no vienen informados
     if limit_legacy and not por_pagina:
@@ -383,92 +1029,50 @@ async def listar_propiedades(
     where_conditions = ["activo = true"]
     params = []
     
-    # FILTRO DE BÚSQUEDA DE TEXTO
-    if q:
-        where_conditions.append("(titulo ILIKE %s OR descripcion ILIKE %s OR direccion ILIKE %s)")
-        search_term = f"%{q}%"
-        params.extend([search_term, search_term, search_term])
+    # FILTRO DE BÚSQUEDA DE TEXTO (columna search_vector con índice GIN)
+    texto_busqueda = consulta_texto(q) if q else None
+    if texto_busqueda:
+        where_conditions.append("search_vector @@ to_tsquery('spanish', %s)")
+        params.append(texto_busqueda)
     
-    # FILTRO DE CIUDAD (más tolerante):
-    #  - Coincidencia parcial y sin distinción de mayúsculas/acentos en los campos ciudad o direccion
-    #  - Permite que el usuario envíe nombres como "Temixco" aun cuando en la BD la ciudad esté dentro de la dirección.
+    # FILTRO DE CIUDAD / COLONIA: llaves canónicas resueltas en la carga (índice B-tree).
+    # "temixco", "Temixco, Morelos" y "Tepoztlan" sin acento dan la misma llave.
     if ciudad and len(ciudad) > 0:
-        city_conditions = []
-        for c in ciudad:
-            nombre = c.strip()
-            if not nombre:
-                continue
-            city_conditions.append("(ciudad ILIKE %s OR direccion ILIKE %s OR descripcion ILIKE %s)")
-            like = f"%{nombre}%"
-            params.extend([like, like, like])
-        if city_conditions:
-            where_conditions.append(f"({' OR '.join(city_conditions)})")
-    
-    # FILTROS DE TIPO DE OPERACIÓN (insensible a mayúsculas/minúsculas)
+        llaves = sorted({llave for llave in map(llave_ciudad, ciudad) if llave})
+        if llaves:
+            where_conditions.append("ciudad_normalizada = ANY(%s)")
+            params.append(llaves)
+    
+    if colonia and len(colonia) > 0:
+        llaves = sorted({llave for llave in map(normalizar_nombre, colonia) if llave})
+        if llaves:
+            where_conditions.append("colonia_normalizada = ANY(%s)")
+            params.append(llaves)
+    
+    # FILTROS DE TIPO DE OPERACIÓN / PROPIEDAD (insensible a mayúsculas/minúsculas).
+    # Un solo arreglo por filtro: el texto SQL no cambia con el número de valores.
     if tipo_operacion and len(tipo_operacion) > 0:
-        op_conditions = []
-        for op in tipo_operacion:
-            op_conditions.append("LOWER(tipo_operacion) = LOWER(%s)")
-            params.append(op)
-        where_conditions.append(f"({' OR '.join(op_conditions)})")
+        where_conditions.append("LOWER(tipo_operacion) = ANY(%s)")
+        params.append(sorted({op.lower() for op in tipo_operacion}))
     
-    # FILTROS DE TIPO DE PROPIEDAD (insensible a mayúsculas/minúsculas)
     if tipo_propiedad and len(tipo_propiedad) > 0:
-        tp_conditions = []
-        for tp in tipo_propiedad:
-            tp_conditions.append("LOWER(tipo_propiedad) = LOWER(%s)")
-            params.append(tp)
-        where_conditions.append(f"({' OR '.join(tp_conditions)})")
+        where_conditions.append("LOWER(tipo_propiedad) = ANY(%s)")
+        params.append(sorted({tp.lower() for tp in tipo_propiedad}))
     
-    # FILTROS DE PRECIO
+    # FILTROS DE PRECIO (precio_num: numérico de la carga, 0 si no hay precio)
     if precio_min is not None:
-        # Cast seguro incluso si la columna es texto o contiene NULL
-        where_conditions.append("COALESCE(precio::numeric,0) >= %s")
+        where_conditions.append("precio_num >= %s")
         params.append(precio_min)
     
     if precio_max is not None:
-        where_conditions.append("COALESCE(precio::numeric,0) <= %s")
+        where_conditions.append("precio_num <= %s")
         params.append(precio_max)
     
-    # FILTROS DE CARACTERÍSTICAS - Múltiples valores
-    if recamaras and len(recamaras) > 0:
-        # Manejar "5+" como >= 5
-        recamaras_conditions = []
-        for rec in recamaras:
-            if rec >= 5:
-                recamaras_conditions.append("recamaras >= %s")
-                params.append(5)
-            else:
-                recamaras_conditions.append("recamaras = %s")
-                params.append(rec)
-        if recamaras_conditions:
-            where_conditions.append(f"({' OR '.join(recamaras_conditions)})")
-    
-    if banos and len(banos) > 0:
-        # Manejar "4+" como >= 4
-        banos_conditions = []
-        for ban in banos:
-            if ban >= 4:
-                banos_conditions.append("banos >= %s")
-                params.append(4)
-            else:
-                banos_conditions.append("banos = %s")
-                params.append(ban)
-        if banos_conditions:
-            where_conditions.append(f"({' OR '.join(banos_conditions)})")
-    
-    if estacionamientos and len(estacionamientos) > 0:
-        # Manejar "3+" como >= 3
-        est_conditions = []
-        for est in estacionamientos:
-            if est >= 3:
-                est_conditions.append("estacionamientos >= %s")
-                params.append(3)
-            else:
-                est_conditions.append("estacionamientos = %s")
-                params.append(est)
-        if est_conditions:
-            where_conditions.append(f"({' OR '.join(est_conditions)})")
+    # FILTROS DE CARACTERÍSTICAS - Múltiples valores ("5+" recámaras, "4+" baños, "3+" estacionamientos)
+    for columna, valores, tope in (("recamaras", recamaras, 5), ("banos", banos, 4),
+                                   ("estacionamientos", estacionamientos, 3)):
+        if valores:
+            where_conditions.append(_condicion_cantidad(columna, valores, tope, params))
     
     if superficie_min is not None:
         where_conditions.append("superficie_construida >= %s")
@@ -478,593 +1082,375 @@ async def listar_propiedades(
         where_conditions.append("superficie_construida <= %s")
         params.append(superficie_max)
     
-    # FILTROS DE AMENIDADES
+    # FILTROS DE AMENIDADES (bits de `amenidades_bits`; basta con tener una de las pedidas)
     if amenidad and len(amenidad) > 0:
-        amenidad_conditions = []
+        mascara = 0
         for am in amenidad:
-            if am == 'alberca':
-                amenidad_conditions.append("(amenidades->>'alberca')::boolean = true")
-            elif am == 'jardin':
-                amenidad_conditions.append("(amenidades->>'jardin')::boolean = true")
-            elif am == 'seguridad':
-                amenidad_conditions.append("(amenidades->>'seguridad')::boolean = true")
-            elif am == 'terraza':
-                amenidad_conditions.append("(amenidades->>'terraza')::boolean = true")
-            elif am == 'estacionamiento':
-                amenidad_conditions.append("(amenidades->>'estacionamiento')::boolean = true")
-            elif am == 'cisterna':
-                amenidad_conditions.append("(amenidades->>'cisterna')::boolean = true")
-            elif am == 'jacuzzi':
-                amenidad_conditions.append("(amenidades->>'jacuzzi')::boolean = true")
-        if amenidad_conditions:
-            where_conditions.append(f"({' OR '.join(amenidad_conditions)})")
-    
-    # FILTROS DE DOCUMENTACIÓN
-    if documentacion and len(documentacion) > 0:
-        doc_conditions = []
-        for doc in documentacion:
-            if doc in ['escrituras', 'Escrituras']:
-                doc_conditions.append("(LOWER(titulo) LIKE '%%escrituras%%' OR LOWER(descripcion) LIKE '%%escrituras%%')")
-            elif doc in ['cesion', 'Cesión']:
-                doc_conditions.append("(LOWER(titulo) LIKE '%%cesión%%' OR LOWER(descripcion) LIKE '%%cesión%%' OR LOWER(titulo) LIKE '%%cesion%%' OR LOWER(descripcion) LIKE '%%cesion%%')")
-        if doc_conditions:
-            where_conditions.append(f"({' OR '.join(doc_conditions)})")
-    
-    # FILTROS DE CARACTERÍSTICAS ADICIONALES
-    if caracteristicas_adicionales and len(caracteristicas_adicionales) > 0:
-        caracteristicas_adicionales_conditions = []
-        for ca in caracteristicas_adicionales:
-            if ca == 'Casa de un nivel':
-                caracteristicas_adicionales_conditions.append("(LOWER(titulo) LIKE '%%un nivel%%' OR LOWER(descripcion) LIKE '%%un nivel%%')")
-            elif ca == 'Recámara en planta baja':
-                caracteristicas_adicionales_conditions.append("(LOWER(titulo) LIKE '%%recámara en planta baja%%' OR LOWER(descripcion) LIKE '%%recámara en planta baja%%')")
-            elif ca == 'Cochera techada':
-                caracteristicas_adicionales_conditions.append("(LOWER(titulo) LIKE '%%cochera techada%%' OR LOWER(descripcion) LIKE '%%cochera techada%%')")
-            elif ca == 'Área de servicio':
-                caracteristicas_adicionales_conditions.append("(LOWER(titulo) LIKE '%%área de servicio%%' OR LOWER(descripcion) LIKE '%%área de servicio%%')")
-        if caracteristicas_adicionales_conditions:
-            where_conditions.append(f"({' OR '.join(caracteristicas_adicionales_conditions)})")
+            mascara |= BITS_AMENIDADES.get(am, 0)
+        if mascara:
+            where_conditions.append(condicion_amenidades(mascara))
+    
+    # FILTROS DE DOCUMENTACIÓN Y CARACTERÍSTICAS ADICIONALES (columnas booleanas de la carga)
+    for valores, columnas in ((documentacion, COLUMNAS_DOCUMENTACION),
+                              (caracteristicas_adicionales, COLUMNAS_CARACTERISTICAS_ADICIONALES)):
+        seleccionadas = sorted({columnas[v] for v in valores or [] if v in columnas})
+        if seleccionadas:
+            where_conditions.append(f"({' OR '.join(seleccionadas)})")
     
     where_clause = " AND ".join(where_conditions)
     
     # Validar campo de orden
-    campos_validos = ['created_at', 'precio', 'titulo', 'recamaras', 'banos', 'estacionamientos', 'superficie_construida']
-    if orden not in campos_validos:
+    if orden not in CAMPOS_ORDEN:
         orden = 'created_at'
     
-    # Contar total de registros
-    count_query = f"SELECT COUNT(*) FROM propiedades WHERE {where_clause}"
-    total_result, _ = ejecutar_consulta(count_query, tuple(params), fetchall=False)
-    total = total_result['count']
+    conteo_exacto = conteo != 'aproximado'
     
-    # Calcular offset
+    # Paginación: por cursor (costo constante) o por número de página (legacy)
+    claves_orden = llaves_orden(orden)
     offset = (pagina - 1) * por_pagina
-    
-    # Consulta principal con paginación - RUTAS DE IMÁGENES CORREGIDAS + UBICACION
-    main_query = f"""
-    SELECT 
-        id, titulo, descripcion, precio, ciudad, tipo_operacion, tipo_propiedad, autor,
-        CASE 
-            WHEN imagenes IS NOT NULL AND jsonb_array_length(imagenes) > 0 
-            THEN imagenes->>0 
-            ELSE NULL 
-        END as imagen_url,
-        imagenes as images,
-        direccion, estado, url_original, url_original as link,
-        recamaras, banos, estacionamientos, superficie_construida as superficie_m2,
-        amenidades, caracteristicas,
-        -- 🎯 PABLO: CREAR OBJETO UBICACION DINÁMICAMENTE
-        json_build_object(
-            'direccion_completa', COALESCE(direccion, ciudad || CASE WHEN estado IS NOT NULL THEN ', ' || estado ELSE '' END),
-            'ciudad', ciudad,
-            'estado', estado,
-            'texto_original', direccion
-        ) as ubicacion
+    nulos_cursor = None
+    page_params = list(params)
+    
+    if cursor:
+        valores_cursor = decodificar_cursor(cursor, orden, len(claves_orden))
+        _, params_cursor = _condicion_keyset(claves_orden, valores_cursor)
+        nulos_cursor = tuple(valor is None for valor in valores_cursor)
+        page_params.extend(params_cursor)
+        offset = 0
+    
+    main_query = _plantilla_listado(tuple(where_conditions), orden, nulos_cursor, campos_respuesta)
+    page_params.extend([por_pagina, offset])
+    
+    # Cache por consulta YA normalizada (alias legacy mapeados, ciudades canónicas,
+    # orden validado): peticiones equivalentes comparten entrada. Sin versión del
+    # catálogo no se cachea porque no habría forma de invalidar.
+    inicio = time.time()
+    snapshot = await obtener_snapshot_facetas()
+    version_catalogo = _cache_facetas['version'] if snapshot is not None else None
+    # El SQL ya no distingue conteo exacto/aproximado: va aparte en la clave
+    clave_cache = (main_query, clave_params(page_params), pagina, conteo_exacto)
+    if version_catalogo is not None:
+        en_cache = cache_listados.obtener(clave_cache, version_catalogo)
+        if en_cache is not None:
+            cabeza, cola = en_cache
+            tiempo = json.dumps((time.time() - inicio) * 1000).encode()
+            return RespuestaJSON(cabeza + tiempo + cola, headers=response.headers)
+    
+    # Página y total en paralelo: la página conserva su plan de índice + LIMIT. El total
+    # exacto casi siempre sale de _cache_conteos y entonces es una sola consulta.
+    from_where = f"FROM propiedades WHERE {where_clause}"
+    if conteo_exacto:
+        total_calculo = contar_total(from_where, tuple(params))
+    else:
+        total_calculo = estimar_total(from_where, tuple(params), sin_filtros=len(where_conditions) == 1)
+    (propiedades_result, tiempo_ms), total = await asyncio.gather(
+        ejecutar_consulta_async(main_query, tuple(page_params), preparada=True), total_calculo)
+    
+    # Cursor a partir de las llaves de orden de la última fila
+    next_cursor = None
+    if len(propiedades_result) == por_pagina:
+        ultima = propiedades_result[-1]
+        next_cursor = codificar_cursor(orden, [ultima[f"_orden_{i}"] for i in range(len(claves_orden))])
+    
+    # Filas → forma de PropiedadResumen (tarjeta precalculada o proyección) sin validar con Pydantic
+    filas = [fila_resumen(prop, campos_respuesta) if campos_respuesta else tarjeta_de_fila(prop)
+             for prop in propiedades_result]
+    contenido = respuesta_paginada(filas, total, pagina, por_pagina, tiempo_ms, next_cursor, not conteo_exacto)
+    respuesta = RespuestaJSON(contenido, headers=response.headers)
+    if version_catalogo is not None:
+        cabeza, cola = partir_en_tiempo(respuesta.body)
+        cache_listados.guardar(clave_cache, version_catalogo, (cabeza, cola), len(cabeza) + len(cola))
+    return respuesta
+
+# Primera página tal como la pide el front-end sin filtros (los Query(...) con su valor
+# por omisión) para quien llama a listar_propiedades fuera de FastAPI
+_ARGUMENTOS_PRIMERA_PAGINA = {
+    nombre: getattr(parametro.default, 'default', parametro.default)
+    for nombre, parametro in inspect.signature(listar_propiedades).parameters.items()
+    if nombre not in ('request', 'response')
+}
+
+# Columnas del detalle; las comparten /propiedades/{id} y /propiedades/lote
+_SQL_PROPIEDAD_COMPLETA = f"""
+    SELECT id, {SQL_TARJETA}, created_at
     FROM propiedades 
-    WHERE {where_clause}
-    ORDER BY 
-        CASE 
-            WHEN '{orden}' = 'precio' AND (precio IS NULL OR precio = 0) THEN 1 
-            ELSE 0 
-        END,
-        CASE 
-            WHEN imagenes IS NOT NULL AND jsonb_array_length(imagenes) > 0 THEN 0
-            ELSE 1 
-        END,
-        {orden} {'ASC' if orden == 'precio' else 'DESC'} NULLS LAST,
-        created_at DESC
-    LIMIT %s OFFSET %s
-    """
-    
-    params.extend([por_pagina, offset])
-    propiedades_result, tiempo_ms = ejecutar_consulta(main_query, tuple(params))
-    
-    # Convertir a modelos Pydantic y CORREGIR RUTAS DE IMÁGENES
-    propiedades = []
-    for prop in propiedades_result:
-        prop_dict = dict(prop)
-        
-        # CORREGIR RUTAS DE IMAGEN
-        if prop_dict.get('imagen_url'):
-            prop_dict['imagen_url'] = generar_url_imagen(prop_dict['imagen_url'])
-        
-        # Normalizar lista images (si existe)
-        if isinstance(prop_dict.get('images'), list):
-            prop_dict['images'] = [generar_url_imagen(img) for img in prop_dict['images']]
-        
-        # Procesar amenidades, características y ubicacion JSONB
-        for field in ['amenidades', 'caracteristicas', 'ubicacion']:
-            if prop_dict.get(field):
-                if isinstance(prop_dict[field], str):
-                    try:
-                        prop_dict[field] = json.loads(prop_dict[field])
-                    except:
-                        prop_dict[field] = {}
-        
-        propiedades.append(PropiedadResumen(**prop_dict))
-    
-    # Calcular metadatos de paginación
-    total_paginas = (total + por_pagina - 1) // por_pagina
-    
-    return RespuestaPaginada(
-        propiedades=propiedades,
-        total=total,
-        pagina=pagina,
-        por_pagina=por_pagina,
-        total_paginas=total_paginas,
-        tiempo_consulta_ms=tiempo_ms
+"""
+
+# Obligatorios en PropiedadCompleta pero sin NOT NULL en la tabla: una fila incompleta
+# no debe tumbar el detalle ni el lote completo (hasta LOTE_MAX propiedades)
+_TEXTOS_OBLIGATORIOS = ('titulo', 'ciudad', 'tipo_operacion', 'tipo_propiedad')
+
+def propiedad_completa(fila: Dict) -> PropiedadCompleta:
+    """Fila del detalle → PropiedadCompleta (misma tarjeta que los listados, más la fecha)."""
+    tarjeta = tarjeta_de_fila(fila)
+    vacios = {campo: '' for campo in _TEXTOS_OBLIGATORIOS if tarjeta.get(campo) is None}
+    return PropiedadCompleta(**{**tarjeta, **vacios}, imagenes=tarjeta['images'], created_at=fila['created_at'])
+
+# ⚡ LOTE: favoritos y leads piden N propiedades en una sola consulta
+LOTE_MAX = int(os.environ.get('LOTE_MAX', 100))
+
+class SolicitudLote(BaseModel):
+    ids: List[str]
+
+class RespuestaLote(BaseModel):
+    propiedades: List[PropiedadCompleta]
+    faltantes: List[str]
+    tiempo_consulta_ms: float
+
+def ids_lote(ids: List[str]) -> List[str]:
+    """Limpia y deduplica los IDs conservando el orden; 400 si está vacío o pasa de LOTE_MAX."""
+    unicos = list(dict.fromkeys(i.strip() for i in ids if i and i.strip()))
+    if not unicos:
+        raise HTTPException(status_code=400, detail="Indica al menos un id")
+    if len(unicos) > LOTE_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo {LOTE_MAX} ids por lote")
+    return unicos
+
+async def obtener_lote(ids: List[str]) -> RespuestaLote:
+    """Un solo `WHERE id = ANY(%s)`; la respuesta respeta el orden pedido e informa los que no existen."""
+    ids = ids_lote(ids)
+    query = _SQL_PROPIEDAD_COMPLETA + "    WHERE id = ANY(%s) AND activo = true\n"
+    filas, tiempo_ms = await ejecutar_consulta_async(query, (ids,), preparada=True)
+    por_id = {fila['id']: fila for fila in filas}
+    return RespuestaLote(
+        propiedades=[propiedad_completa(por_id[i]) for i in ids if i in por_id],
+        faltantes=[i for i in ids if i not in por_id],
+        tiempo_consulta_ms=tiempo_ms,
     )
 
+# Va antes de /propiedades/{propiedad_id} para que "lote" no se tome como un ID
+@app.get("/propiedades/lote", response_model=RespuestaLote)
+async def obtener_propiedades_lote(
+    request: Request,
+    response: Response,
+    ids: str = Query(..., description="IDs separados por coma, en el orden deseado")
+):
+    """
+    Obtiene varias propiedades por ID en una sola consulta
+    """
+    no_modificado = await validar_cache_http(request, response, 'propiedad')
+    if no_modificado is not None:
+        return no_modificado
+    return await obtener_lote(ids.split(','))
+
+@app.post("/propiedades/lote", response_model=RespuestaLote)
+async def obtener_propiedades_lote_post(solicitud: SolicitudLote):
+    """
+    Igual que GET /propiedades/lote, para listas de IDs que no caben en la URL
+    """
+    return await obtener_lote(solicitud.ids)
+
 @app.get("/propiedades/{propiedad_id}", response_model=PropiedadCompleta)
-async def obtener_propiedad(propiedad_id: str):
+async def obtener_propiedad(propiedad_id: str, request: Request, response: Response):
     """
     Obtiene una propiedad específica por ID
     """
+    no_modificado = await validar_cache_http(request, response, 'propiedad')
+    if no_modificado is not None:
+        return no_modificado
     
-    query = """
-    SELECT 
-        id, titulo, descripcion, precio, ciudad, tipo_operacion, tipo_propiedad, autor,
-        direccion, estado, url_original, url_original as link,
-        recamaras, banos, estacionamientos, superficie_construida as superficie_m2,
-        amenidades, caracteristicas, imagenes, created_at,
-        CASE 
-            WHEN imagenes IS NOT NULL AND jsonb_array_length(imagenes) > 0 
-            THEN imagenes->>0 
-            ELSE NULL 
-        END as imagen_url,
-        -- 🎯 PABLO: CREAR OBJETO UBICACION DINÁMICAMENTE
-        json_build_object(
-            'direccion_completa', COALESCE(direccion, ciudad || CASE WHEN estado IS NOT NULL THEN ', ' || estado ELSE '' END),
-            'ciudad', ciudad,
-            'estado', estado,
-            'texto_original', direccion
-        ) as ubicacion
-    FROM propiedades 
-    WHERE id = %s AND activo = true
-    """
+    query = _SQL_PROPIEDAD_COMPLETA + "    WHERE id = %s AND activo = true\n"
     
-    resultado, tiempo_ms = ejecutar_consulta(query, (propiedad_id,), fetchall=False)
+    resultado, tiempo_ms = await ejecutar_consulta_async(query, (propiedad_id,), fetchall=False, preparada=True)
     
     if not resultado:
         raise HTTPException(status_code=404, detail="Propiedad no encontrada")
     
-    # Convertir JSONB a dict y CORREGIR IMAGEN
-    propiedad_dict = dict(resultado)
-    
-    # CORREGIR RUTAS DE IMAGEN
-    if propiedad_dict.get('imagen_url'):
-        propiedad_dict['imagen_url'] = generar_url_imagen(propiedad_dict['imagen_url'])
-
-    if isinstance(propiedad_dict.get('imagenes'), list):
-        propiedad_dict['imagenes'] = [generar_url_imagen(img) for img in propiedad_dict['imagenes']]
-    if isinstance(propiedad_dict.get('images'), list):
-        propiedad_dict['images'] = [generar_url_imagen(img) for img in propiedad_dict['images']]
-    
-    # Procesar JSONB fields
-    for field in ['amenidades', 'caracteristicas', 'imagenes', 'ubicacion']:
-        if propiedad_dict.get(field):
-            if isinstance(propiedad_dict[field], str):
-                try:
-                    propiedad_dict[field] = json.loads(propiedad_dict[field])
-                except:
-                    propiedad_dict[field] = {}
-    
-    return PropiedadCompleta(**propiedad_dict)
+    return propiedad_completa(resultado)
 
 @app.get("/buscar", response_model=RespuestaPaginada)
 async def buscar_propiedades(
+    request: Request,
+    response: Response,
     q: str = Query(..., description="Término de búsqueda"),
     pagina: int = Query(1, ge=1),
-    por_pagina: int = Query(12, ge=1, le=50)
+    por_pagina: int = Query(12, ge=1, le=50),
+    conteo: Optional[str] = Query("exacto", description="exacto | aproximado (estimación, sin recorrer la tabla)")
 ):
     """
     Búsqueda de texto completo en título y descripción
     """
+    no_modificado = await validar_cache_http(request, response, 'listados')
+    if no_modificado is not None:
+        return no_modificado
     
-    # Consulta con búsqueda de texto completo mejorada
-    search_query = """
-    SELECT 
-        id, titulo, descripcion, precio, ciudad, tipo_operacion, tipo_propiedad, autor,
-        CASE 
-            WHEN imagenes IS NOT NULL AND jsonb_array_length(imagenes) > 0 
-            THEN imagenes->>0 
-            ELSE NULL 
-        END as imagen_url,
-        direccion, estado, url_original, url_original as link, 
-        recamaras, banos, estacionamientos, superficie_construida as superficie_m2,
-        amenidades, caracteristicas,
-        -- 🎯 PABLO: CREAR OBJETO UBICACION DINÁMICAMENTE
-        json_build_object(
-            'direccion_completa', COALESCE(direccion, ciudad || CASE WHEN estado IS NOT NULL THEN ', ' || estado ELSE '' END),
-            'ciudad', ciudad,
-            'estado', estado,
-            'texto_original', direccion
-        ) as ubicacion,
-        ts_rank(to_tsvector('spanish', titulo || ' ' || COALESCE(descripcion, '') || ' ' || COALESCE(direccion, '') || ' ' || COALESCE(ciudad, '')), 
-                plainto_tsquery('spanish', %s)) as relevancia
-    FROM propiedades 
+    conteo_exacto = conteo != 'aproximado'
+    
+    # Consulta con búsqueda de texto completo sobre search_vector (índice GIN, pesos:
+    # título A, dirección/ciudad B, descripción C)
+    from_where = """
+    FROM propiedades, to_tsquery('spanish', %s) AS consulta
     WHERE activo = true 
-    AND (
-        to_tsvector('spanish', titulo || ' ' || COALESCE(descripcion, '') || ' ' || COALESCE(direccion, '') || ' ' || COALESCE(ciudad, '')) 
-        @@ plainto_tsquery('spanish', %s)
-        OR titulo ILIKE %s
-        OR descripcion ILIKE %s
-        OR direccion ILIKE %s
-        OR ciudad ILIKE %s
-    )
+    AND search_vector @@ consulta
+    """
+    
+    search_query = f"""
+    SELECT 
+        {SQL_TARJETA},
+        ts_rank(search_vector, consulta) as relevancia
+    {from_where}
     ORDER BY relevancia DESC, 
              CASE WHEN precio IS NOT NULL THEN 0 ELSE 1 END,
              created_at DESC
     LIMIT %s OFFSET %s
     """
     
-    # Contar resultados de búsqueda
-    count_query = """
-    SELECT COUNT(*) FROM propiedades 
-    WHERE activo = true 
-    AND (
-        to_tsvector('spanish', titulo || ' ' || COALESCE(descripcion, '') || ' ' || COALESCE(direccion, '') || ' ' || COALESCE(ciudad, '')) 
-        @@ plainto_tsquery('spanish', %s)
-        OR titulo ILIKE %s
-        OR descripcion ILIKE %s
-        OR direccion ILIKE %s
-        OR ciudad ILIKE %s
-    )
-    """
-    
-    search_term = f"%{q}%"
-    search_params = (q, q, search_term, search_term, search_term, search_term)
-    
-    # Ejecutar conteo
-    total_result, _ = ejecutar_consulta(count_query, search_params, fetchall=False)
-    total = total_result['count']
+    texto_busqueda = consulta_texto(q)
+    if not texto_busqueda:
+        return RespuestaJSON(respuesta_paginada([], 0, pagina, por_pagina, 0), headers=response.headers)
+    search_params = (texto_busqueda,)
     
     # Calcular offset
     offset = (pagina - 1) * por_pagina
     
-    # Ejecutar búsqueda principal
+    # Ejecutar búsqueda principal (y el total en paralelo)
     main_params = search_params + (por_pagina, offset)
-    propiedades_result, tiempo_ms = ejecutar_consulta(search_query, main_params)
-    
-    # Procesar resultados
-    propiedades = []
-    for prop in propiedades_result:
-        prop_dict = dict(prop)
-        # Remover campo de relevancia para el modelo
-        prop_dict.pop('relevancia', None)
-        
-        # CORREGIR RUTA DE IMAGEN
-        if prop_dict.get('imagen_url'):
-            prop_dict['imagen_url'] = generar_url_imagen(prop_dict['imagen_url'])
-        
-        # Procesar JSONB
-        for field in ['amenidades', 'caracteristicas', 'ubicacion']:
-            if prop_dict.get(field):
-                if isinstance(prop_dict[field], str):
-                    try:
-                        prop_dict[field] = json.loads(prop_dict[field])
-                    except:
-                        prop_dict[field] = {}
-        
-        propiedades.append(PropiedadResumen(**prop_dict))
-    
-    # Calcular metadatos de paginación
-    total_paginas = (total + por_pagina - 1) // por_pagina
-    
-    return RespuestaPaginada(
-        propiedades=propiedades,
-        total=total,
-        pagina=pagina,
-        por_pagina=por_pagina,
-        total_paginas=total_paginas,
-        tiempo_consulta_ms=tiempo_ms
-    )
+    total_calculo = contar_total(from_where, search_params) if conteo_exacto else estimar_total(from_where, search_params)
+    (propiedades_result, tiempo_ms), total = await asyncio.gather(
+        ejecutar_consulta_async(search_query, main_params, preparada=True), total_calculo)
+    
+    # Procesar resultados (misma forma que /propiedades, sin validar con Pydantic)
+    contenido = respuesta_paginada([tarjeta_de_fila(prop) for prop in propiedades_result], total, pagina,
+                                   por_pagina, tiempo_ms, total_aproximado=not conteo_exacto)
+    return RespuestaJSON(contenido, headers=response.headers)
+
+# ⚡ SNAPSHOT DE FACETAS - lo genera la ingesta (src/post_carga_catalogo.py) y aquí se cachea
+FACETAS_VERIFICAR_S = float(os.environ.get('FACETAS_VERIFICAR_S', 30))  # cada cuánto revisar si hay versión nueva
+_cache_facetas = {'version': None, 'datos': None, 'generado_en': None, 'verificado_en': 0.0}
+
+# Una sola ida a la BD: si la versión no cambió no se vuelve a transferir el JSON
+SNAPSHOT_FACETAS_QUERY = """
+SELECT version, generado_en, CASE WHEN version IS DISTINCT FROM %s THEN datos END AS datos
+FROM facet_snapshot
+WHERE id = 1
+"""
+
+async def obtener_snapshot_facetas() -> Optional[Dict]:
+    """Devuelve el snapshot de facetas cacheado, revalidando su versión cada FACETAS_VERIFICAR_S."""
+    ahora = time.monotonic()
+    if _cache_facetas['datos'] is not None and ahora - _cache_facetas['verificado_en'] < FACETAS_VERIFICAR_S:
+        return _cache_facetas['datos']
+
+    try:
+        fila, _ = await ejecutar_consulta_async(SNAPSHOT_FACETAS_QUERY, (_cache_facetas['version'],), fetchall=False)
+    except Exception as e:
+        logger.warning(f"Snapshot de facetas no disponible: {e}")
+        return _cache_facetas['datos']
+
+    if fila:
+        if fila['datos'] is not None:
+            datos = fila['datos']
+            _cache_facetas['datos'] = json.loads(datos) if isinstance(datos, str) else datos
+            _cache_facetas['version'] = fila['version']
+            _cache_facetas['generado_en'] = fila.get('generado_en')
+            logger.info(f"Snapshot de facetas cargado (versión {fila['version']})")
+        _cache_facetas['verificado_en'] = ahora
+    return _cache_facetas['datos']
+
+# ⚡ GET CONDICIONAL - ETag/Last-Modified del catálogo y Cache-Control por endpoint
+# El catálogo sólo cambia en la ingesta, que sube la versión del snapshot: mientras no
+# cambie, cualquier respuesta de lectura sigue vigente y un If-None-Match termina en 304
+# sin consultar la página. s-maxage es lo que CloudFront puede servir sin revalidar.
+CACHE_CONTROL = {
+    'listados': "public, max-age=60, s-maxage=300",
+    'propiedad': "public, max-age=300, s-maxage=3600",
+    'estadisticas': "public, max-age=300, s-maxage=3600",
+}
+# Cada versión publicada de la Lambda tiene su propio ETag: un despliegue que cambie el
+# formato de las respuestas no debe contestar 304 a lo que el cliente guardó antes
+_VERSION_DESPLIEGUE = os.environ.get('AWS_LAMBDA_FUNCTION_VERSION', 'local')
+
+def _etag_coincide(if_none_match: str, etag: str) -> bool:
+    # Comparación débil (RFC 9110): se ignora el prefijo W/
+    if if_none_match.strip() == '*':
+        return True
+    return any(candidato.strip().removeprefix('W/') == etag.removeprefix('W/')
+               for candidato in if_none_match.split(','))
+
+async def validar_cache_http(request: Request, response: Response, politica: str) -> Optional[Response]:
+    """Agrega ETag, Last-Modified y Cache-Control; devuelve un 304 si el cliente ya tiene esta versión.
+
+    Sin snapshot no hay versión del catálogo: la respuesta sale sin validadores.
+    """
+    if await obtener_snapshot_facetas() is None:
+        return None
+
+    encabezados = {
+        'ETag': f'W/"{_VERSION_DESPLIEGUE}-{_cache_facetas["version"]}"',
+        'Cache-Control': CACHE_CONTROL[politica],
+    }
+    generado_en = _cache_facetas.get('generado_en')
+    if generado_en is not None:
+        encabezados['Last-Modified'] = formatdate(generado_en.timestamp(), usegmt=True)
+    response.headers.update(encabezados)
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        vigente = _etag_coincide(if_none_match, encabezados['ETag'])
+    else:
+        # If-Modified-Since sólo cuenta si no vino If-None-Match
+        try:
+            desde = parsedate_to_datetime(request.headers['if-modified-since'])
+            vigente = generado_en is not None and generado_en.replace(microsecond=0) <= desde
+        except (KeyError, TypeError, ValueError):
+            vigente = False
+    return Response(status_code=304, headers=encabezados) if vigente else None
 
 @app.get("/estadisticas")
-async def obtener_estadisticas():
+async def obtener_estadisticas(request: Request, response: Response):
     """
     Estadísticas generales con FILTROS LIMPIOS
-    """
-    
-    query = """
-    SELECT 
-        COUNT(*) as total_propiedades,
-        COUNT(CASE WHEN precio IS NOT NULL THEN 1 END) as con_precio,
-        COALESCE(AVG(precio), 0) as precio_promedio,
-        COALESCE(MIN(precio), 0) as precio_minimo,
-        COALESCE(MAX(precio), 0) as precio_maximo
-    FROM propiedades 
-    WHERE activo = true
-    """
-    
-    # Estadísticas por tipo de operación
-    tipos_query = """
-    SELECT tipo_operacion, COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true AND tipo_operacion IS NOT NULL
-    GROUP BY tipo_operacion
-    ORDER BY cantidad DESC
-    """
-    
-    # CIUDADES - Todas las ciudades válidas que existen en la BD
-    ciudades_query = """
-    SELECT ciudad, COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true 
-    AND ciudad IS NOT NULL 
-    AND ciudad != ''
-    AND ciudad NOT LIKE '%Chats%'
-    AND ciudad NOT LIKE '%Notificaciones%'  
-    GROUP BY ciudad
-    ORDER BY cantidad DESC
-    """
-    
-    # Estadísticas por tipo de propiedad
-    tipos_prop_query = """
-    SELECT tipo_propiedad, COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true AND tipo_propiedad IS NOT NULL
-    GROUP BY tipo_propiedad
-    ORDER BY cantidad DESC
-    """
-    
-    # Estadísticas por recámaras (solo valores razonables)
-    recamaras_query = """
-    SELECT recamaras, COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true AND recamaras IS NOT NULL AND recamaras BETWEEN 1 AND 10
-    GROUP BY recamaras
-    ORDER BY recamaras
-    """
-    
-    # Estadísticas por baños (solo valores razonables)
-    banos_query = """
-    SELECT banos, COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true AND banos IS NOT NULL AND banos BETWEEN 1 AND 10
-    GROUP BY banos
-    ORDER BY banos
-    """
-    
-    # Estadísticas por estacionamientos (solo valores razonables)
-    estacionamientos_query = """
-    SELECT estacionamientos, COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true AND estacionamientos IS NOT NULL AND estacionamientos BETWEEN 1 AND 20
-    GROUP BY estacionamientos
-    ORDER BY estacionamientos
-    """
-    
-    # Amenidades desde columna amenidades JSONB
-    amenidades_query = """
-    SELECT 
-        'Alberca' as amenidad, 
-        COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true 
-    AND (amenidades->>'alberca')::boolean = true
-    
-    UNION ALL
-    
-    SELECT 
-        'Jardín' as amenidad, 
-        COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true 
-    AND (amenidades->>'jardin')::boolean = true
-    
-    UNION ALL
-    
-    SELECT 
-        'Seguridad' as amenidad, 
-        COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true 
-    AND (amenidades->>'seguridad')::boolean = true
-    
-    UNION ALL
-    
-    SELECT 
-        'Terraza' as amenidad, 
-        COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true 
-    AND (amenidades->>'terraza')::boolean = true
-    
-    UNION ALL
     
-    SELECT 
-        'Estacionamiento' as amenidad, 
-        COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true 
-    AND (amenidades->>'estacionamiento')::boolean = true
-    
-    UNION ALL
-    
-    SELECT 
-        'Cisterna' as amenidad, 
-        COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true 
-    AND (amenidades->>'cisterna')::boolean = true
-    
-    UNION ALL
-    
-    SELECT 
-        'Jacuzzi' as amenidad, 
-        COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true 
-    AND (amenidades->>'jacuzzi')::boolean = true
+    Se sirven del snapshot precalculado en la ingesta; si aún no existe se
+    calculan en vivo en un solo recorrido de la tabla (ver facetas.py)
     """
+    inicio = time.time()
+    no_modificado = await validar_cache_http(request, response, 'estadisticas')
+    if no_modificado is not None:
+        return no_modificado
+    snapshot = await obtener_snapshot_facetas()
+    if snapshot is not None:
+        return {**snapshot, 'tiempo_consulta_ms': (time.time() - inicio) * 1000}
 
-    # Estadísticas de documentación (basadas en texto)
-    documentacion_query = """
-    SELECT 
-        'Escrituras' as tipo_doc, 
-        COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true 
-    AND (LOWER(titulo) LIKE '%escrituras%' OR LOWER(descripcion) LIKE '%escrituras%')
-    
-    UNION ALL
-    
-    SELECT 
-        'Cesión' as tipo_doc, 
-        COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true 
-    AND (LOWER(titulo) LIKE '%cesión%' OR LOWER(descripcion) LIKE '%cesión%' OR LOWER(titulo) LIKE '%cesion%' OR LOWER(descripcion) LIKE '%cesion%')
-    """
-    
-    # Estadísticas de características adicionales (basadas en texto)
-    caracteristicas_adicionales_query = """
-    SELECT 
-        'Casa de un nivel' as caracteristica, 
-        COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true 
-    AND (
-        LOWER(titulo) LIKE '%un nivel%' OR 
-        LOWER(descripcion) LIKE '%un nivel%' OR
-        LOWER(titulo) LIKE '%1 nivel%' OR 
-        LOWER(descripcion) LIKE '%1 nivel%'
-    )
-    
-    UNION ALL
-    
-    SELECT 
-        'Recámara en planta baja' as caracteristica, 
-        COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true 
-    AND (
-        LOWER(titulo) LIKE '%recámara en planta baja%' OR 
-        LOWER(descripcion) LIKE '%recámara en planta baja%' OR
-        LOWER(titulo) LIKE '%recamara en planta baja%' OR 
-        LOWER(descripcion) LIKE '%recamara en planta baja%' OR
-        LOWER(titulo) LIKE '%planta baja%' OR 
-        LOWER(descripcion) LIKE '%planta baja%'
-    )
-    
-    UNION ALL
-    
-    SELECT 
-        'Cochera techada' as caracteristica, 
-        COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true 
-    AND (
-        LOWER(titulo) LIKE '%cochera techada%' OR 
-        LOWER(descripcion) LIKE '%cochera techada%' OR
-        LOWER(titulo) LIKE '%garage techado%' OR 
-        LOWER(descripcion) LIKE '%garage techado%'
-    )
-    
-    UNION ALL
-    
-    SELECT 
-        'Área de servicio' as caracteristica, 
-        COUNT(*) as cantidad
-    FROM propiedades 
-    WHERE activo = true 
-    AND (
-        LOWER(titulo) LIKE '%área de servicio%' OR 
-        LOWER(descripcion) LIKE '%área de servicio%' OR
-        LOWER(titulo) LIKE '%area de servicio%' OR 
-        LOWER(descripcion) LIKE '%area de servicio%'
-    )
+    filas, tiempo_ms = await ejecutar_consulta_async(CONSULTA_FACETAS)
+    return construir_estadisticas(filas, tiempo_ms)
+
+# ⚡ CALENTAMIENTO - ping programado (EventBridge) que lambda_function atiende sin pasar
+# por Mangum: el primer usuario después de un scale-out ya no paga la conexión a RDS ni
+# los fallos de cache. Basta una conexión abierta: el ping llega a todos los contenedores
+# calientes y abrir DB_POOL_MAX en cada uno multiplica las conexiones ociosas en RDS; las
+# demás se abren cuando una ráfaga las pide.
+CALENTAR_CONEXIONES = int(os.environ.get('CALENTAR_CONEXIONES', 1))
+
+async def calentar(conexiones: int = CALENTAR_CONEXIONES) -> Dict:
+    """Abre el pool y precarga el snapshot de facetas y la primera página de /propiedades.
+
+    Cada paso es independiente: si uno falla se registra y se sigue con el resto.
     """
-    
-    # Ejecutar consultas
-    stats_result, tiempo_ms1 = ejecutar_consulta(query, fetchall=False)
-    tipos_result, tiempo_ms2 = ejecutar_consulta(tipos_query)
-    ciudades_result, tiempo_ms3 = ejecutar_consulta(ciudades_query)
-    tipos_prop_result, tiempo_ms4 = ejecutar_consulta(tipos_prop_query)
-    recamaras_result, tiempo_ms5 = ejecutar_consulta(recamaras_query)
-    banos_result, tiempo_ms6 = ejecutar_consulta(banos_query)
-    estacionamientos_result, tiempo_ms7 = ejecutar_consulta(estacionamientos_query)
-    amenidades_result, tiempo_ms8 = ejecutar_consulta(amenidades_query)
-    documentacion_result, tiempo_ms9 = ejecutar_consulta(documentacion_query)
-    caracteristicas_adicionales_result, tiempo_ms10 = ejecutar_consulta(caracteristicas_adicionales_query)
-    
-    # Procesar resultados
-    stats = dict(stats_result)
-    tipos_operacion = {row['tipo_operacion']: row['cantidad'] for row in tipos_result}
-    ciudades = {row['ciudad']: row['cantidad'] for row in ciudades_result}
-    tipos_propiedad = {row['tipo_propiedad']: row['cantidad'] for row in tipos_prop_result}
-    
-    # Formatear características numéricas
-    caracteristicas = {}
-    for row in recamaras_result:
-        if row['recamaras']:
-            key = f"{row['recamaras']} Recámara{'s' if row['recamaras'] > 1 else ''}"
-            caracteristicas[key] = row['cantidad']
-    
-    for row in banos_result:
-        if row['banos']:
-            key = f"{row['banos']} Baño{'s' if row['banos'] > 1 else ''}"
-            caracteristicas[key] = row['cantidad']
-    
-    for row in estacionamientos_result:
-        if row['estacionamientos']:
-            key = f"{row['estacionamientos']} Estacionamiento{'s' if row['estacionamientos'] > 1 else ''}"
-            caracteristicas[key] = row['cantidad']
-    
-    # Procesar amenidades (solo incluir si tienen más de 0)
-    amenidades = {row['amenidad']: row['cantidad'] for row in amenidades_result if row['amenidad'] and row['cantidad'] > 0}
-    
-    # Procesar documentación
-    documentacion = {row['tipo_doc']: row['cantidad'] for row in documentacion_result if row['tipo_doc'] and row['cantidad'] > 0}
-    
-    # Procesar características adicionales
-    caracteristicas_adicionales = {row['caracteristica']: row['cantidad'] for row in caracteristicas_adicionales_result if row['caracteristica'] and row['cantidad'] > 0}
-    
-    tiempo_total = tiempo_ms1 + tiempo_ms2 + tiempo_ms3 + tiempo_ms4 + tiempo_ms5 + tiempo_ms6 + tiempo_ms7 + tiempo_ms8 + tiempo_ms9 + tiempo_ms10
-    
-    return {
-        'total': stats['total_propiedades'],
-        'total_propiedades': stats['total_propiedades'],
-        'con_precio': stats['con_precio'],
-        'precio_promedio': float(stats['precio_promedio']),
-        'precio_minimo': float(stats['precio_minimo']),
-        'precio_maximo': float(stats['precio_maximo']),
-        'por_tipo_operacion': tipos_operacion,
-        'tipos_operacion': tipos_operacion,
-        'ciudades': ciudades,  # Agregar ciudades al nivel principal
-        'tiempo_consulta_ms': tiempo_total,
-        # Estructura de filtros LIMPIOS para el frontend
-        'filtros': {
-            'operaciones': tipos_operacion,
-            'ciudades': ciudades,
-            'tipos': tipos_propiedad,
-            'amenidades': amenidades,
-            'caracteristicas': caracteristicas,
-            'documentacion': documentacion,
-            'caracteristicas_adicionales': caracteristicas_adicionales
-        }
-    }
+    inicio = time.monotonic()
+    resultado = {'conexiones': 0, 'version_catalogo': None, 'primera_pagina': False, 'errores': []}
+    try:
+        resultado['conexiones'] = await asyncio.get_running_loop().run_in_executor(
+            _executor_bd, db_pool.precalentar, conexiones)
+    except Exception as e:
+        resultado['errores'].append(f"conexiones: {e}")
+
+    if await obtener_snapshot_facetas() is not None:
+        resultado['version_catalogo'] = _cache_facetas['version']
+        peticion = Request({'type': 'http', 'method': 'GET', 'path': '/propiedades', 'headers': []})
+        try:
+            await listar_propiedades(peticion, Response(), **_ARGUMENTOS_PRIMERA_PAGINA)
+            resultado['primera_pagina'] = True
+        except Exception as e:
+            resultado['errores'].append(f"primera página: {e}")
+    else:
+        # Sin versión del catálogo la página no se guardaría en cache_listados
+        resultado['errores'].append("snapshot de facetas no disponible")
+
+    for error in resultado['errores']:
+        logger.warning(f"Calentamiento incompleto: {error}")
+    resultado['tiempo_ms'] = (time.monotonic() - inicio) * 1000
+    return resultado
 
 @app.get("/salud")
 async def verificar_salud():
@@ -1074,7 +1460,7 @@ async def verificar_salud():
     try:
         # Probar conexión a BD
         query = "SELECT COUNT(*) as total FROM propiedades WHERE activo = true"
-        resultado, tiempo_ms = ejecutar_consulta(query, fetchall=False)
+        resultado, tiempo_ms = await ejecutar_consulta_async(query, fetchall=False)
         
         return {
             "estado": "saludable",
@@ -1082,6 +1468,9 @@ async def verificar_salud():
             "base_datos": "conectada",
             "total_propiedades": resultado['total'],
             "tiempo_respuesta_ms": tiempo_ms,
+            "cache_listados": cache_listados.estadisticas(),
+            "consultas_coalescidas": dict(coalescencia),
+            "cola_hash": dict(cola_hash),
             "correcciones": [
                 "✅ Filtros de Operación corregidos (tipo_operacion)",
                 "✅ Filtros de Amenidades funcionando",
@@ -1112,13 +1501,8 @@ async def health_check():
     Endpoint de health check para monitor de uptime
     """
     try:
-        # Verificar conexión a la base de datos
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT 1")
-        cursor.fetchone()
-        cursor.close()
-        connection.close()
+        # Verificar conexión a la base de datos (usa el pool para no abrir una conexión extra)
+        await ejecutar_consulta_async("SELECT 1", fetchall=False)
         
         return {"status": "healthy", "timestamp": datetime.now().isoformat()}
     except Exception as e:
@@ -1137,38 +1521,22 @@ async def registrar_usuario(usuario: UsuarioRegistro):
     # Verificar si usuario ya existe
     query_check = "SELECT id FROM usuarios WHERE email = %s"
     try:
-        resultado, _ = ejecutar_consulta(query_check, (usuario.email,), fetchall=False)
+        resultado, _ = await ejecutar_consulta_async(query_check, (usuario.email,), fetchall=False)
         if resultado:
             raise HTTPException(status_code=400, detail="El email ya está registrado")
     except Exception as e:
         if "ya está registrado" in str(e):
             raise e
-        # Si la tabla no existe, la crearemos
+        # Si la verificación falla, el UNIQUE de email sigue protegiendo el INSERT
         pass
     
-    # Crear tabla usuarios si no existe
-    create_table_query = """
-    CREATE TABLE IF NOT EXISTS usuarios (
-        id SERIAL PRIMARY KEY,
-        nombre VARCHAR(100) NOT NULL,
-        email VARCHAR(100) UNIQUE NOT NULL,
-        telefono VARCHAR(20),
-        password_hash VARCHAR(255) NOT NULL,
-        es_admin BOOLEAN DEFAULT FALSE,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """
-    
-    try:
-        ejecutar_consulta(create_table_query, fetchall=False)
-    except:
-        pass
+    # La tabla usuarios la crea migraciones.py al desplegar, no cada registro
     
     # Pablo es admin por defecto
     es_admin = usuario.email.lower() == "pabloravel@gmail.com"
     
     # Hash de contraseña
-    password_hash = hash_password(usuario.password)
+    password_hash = await hash_password_async(usuario.password)
     
     # Insertar usuario
     insert_query = """
@@ -1178,7 +1546,7 @@ async def registrar_usuario(usuario: UsuarioRegistro):
     """
     
     try:
-        resultado, _ = ejecutar_consulta(
+        resultado, _ = await ejecutar_consulta_async(
             insert_query, 
             (usuario.nombre, usuario.email, password_hash, es_admin),
             fetchall=False
@@ -1189,7 +1557,7 @@ async def registrar_usuario(usuario: UsuarioRegistro):
         # Crear token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": usuario.email}, expires_delta=access_token_expires
+            data=claims_de_usuario(user_data), expires_delta=access_token_expires
         )
         
         # 🎯 PABLO: DEVOLVER ESTRUCTURA QUE ESPERA EL FRONTEND
@@ -1220,7 +1588,7 @@ async def login_usuario(usuario: UsuarioLogin):
     
     query = "SELECT id, nombre, email, telefono, password_hash, es_admin, created_at FROM usuarios WHERE email = %s AND activo = true"
     try:
-        resultado, _ = ejecutar_consulta(query, (usuario.email,), fetchall=False)
+        resultado, _ = await ejecutar_consulta_async(query, (usuario.email,), fetchall=False)
         
         if not resultado:
             raise HTTPException(status_code=401, detail="Email o contraseña incorrectos")
@@ -1228,13 +1596,13 @@ async def login_usuario(usuario: UsuarioLogin):
         user_data = dict(resultado)
         
         # Verificar password
-        if not verify_password(usuario.password, user_data['password_hash']):
+        if not await verify_password_async(usuario.password, user_data['password_hash']):
             raise HTTPException(status_code=401, detail="Email o contraseña incorrectos")
         
         # Crear token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": usuario.email}, expires_delta=access_token_expires
+            data=claims_de_usuario(user_data), expires_delta=access_token_expires
         )
         
         # 🎯 PABLO: DEVOLVER ESTRUCTURA CORRECTA SIN ERRORES
@@ -1279,7 +1647,7 @@ async def listar_usuarios(current_user: Usuario = Depends(get_current_user)):
     
     query = "SELECT id, nombre, email, es_admin, created_at FROM usuarios ORDER BY created_at DESC"
     try:
-        resultado, _ = ejecutar_consulta(query)
+        resultado, _ = await ejecutar_consulta_async(query)
         return {"usuarios": [dict(row) for row in resultado]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener usuarios: {str(e)}")
@@ -1295,17 +1663,18 @@ async def eliminar_usuario(usuario_id: int, current_user: Usuario = Depends(get_
     
     query = "DELETE FROM usuarios WHERE id = %s"
     try:
-        ejecutar_consulta(query, (usuario_id,), fetchall=False)
+        await ejecutar_consulta_async(query, (usuario_id,), fetchall=False)
+        invalidar_usuario(usuario_id)
         return {"mensaje": "Usuario eliminado exitosamente"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al eliminar usuario: {str(e)}")
 
 # Endpoint adicional para compatibilidad con frontend actual
 @app.get("/api/propiedades")
-async def api_propiedades_compatibilidad():
+async def api_propiedades_compatibilidad(request: Request, response: Response):
     """Endpoint de compatibilidad con frontend actual"""
-    # Redirigir a endpoint principal con parámetros por defecto
-    return await listar_propiedades(pagina=1, por_pagina=12)
+    # Redirigir a endpoint principal con parámetros por defecto (mismo cache, ETag y 304)
+    return await listar_propiedades(request, response, **_ARGUMENTOS_PRIMERA_PAGINA)
 
 # 🔥 ENDPOINTS PARA LEADS - PABLO REQUISITO CRÍTICO
 
@@ -1327,37 +1696,7 @@ async def crear_lead(lead: Lead, current_user: Usuario = Depends(get_current_use
     if not current_user:
         raise HTTPException(status_code=401, detail="No autenticado")
     
-    # Crear tabla leads si no existe
-    create_leads_table = """
-    CREATE TABLE IF NOT EXISTS leads (
-        id SERIAL PRIMARY KEY,
-        usuario_id INTEGER REFERENCES usuarios(id),
-        nombre VARCHAR(100) NOT NULL,
-        telefono VARCHAR(20) NOT NULL,
-        email VARCHAR(100),
-        detalles TEXT,
-        tipo_lead VARCHAR(20) DEFAULT 'privado',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """
-    
-    # Crear tabla para propiedades de leads
-    create_propiedades_leads_table = """
-    CREATE TABLE IF NOT EXISTS propiedades_leads (
-        id SERIAL PRIMARY KEY,
-        lead_id INTEGER REFERENCES leads(id) ON DELETE CASCADE,
-        propiedad_id VARCHAR(50) NOT NULL,
-        notas TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        UNIQUE(lead_id, propiedad_id)
-    )
-    """
-    
-    try:
-        ejecutar_consulta(create_leads_table, fetchall=False)
-        ejecutar_consulta(create_propiedades_leads_table, fetchall=False)
-    except:
-        pass
+    # Las tablas leads y propiedades_leads las crea migraciones.py al desplegar
     
     # Insertar lead
     insert_query = """
@@ -1367,7 +1706,7 @@ async def crear_lead(lead: Lead, current_user: Usuario = Depends(get_current_use
     """
     
     try:
-        resultado, _ = ejecutar_consulta(
+        resultado, _ = await ejecutar_consulta_async(
             insert_query,
             (current_user.id, lead.nombre, lead.telefono, lead.email, lead.detalles, lead.tipo_lead),
             fetchall=False
@@ -1379,7 +1718,7 @@ async def crear_lead(lead: Lead, current_user: Usuario = Depends(get_current_use
         raise HTTPException(status_code=500, detail=f"Error al crear lead: {str(e)}")
 
 @app.get("/api/leads")
-async def obtener_leads(current_user: Usuario = Depends(get_current_user)):
+async def obtener_leads(current_user: UsuarioToken = Depends(get_usuario_token)):
     """Obtener leads del usuario"""
     if not current_user:
         raise HTTPException(status_code=401, detail="No autenticado")
@@ -1398,7 +1737,7 @@ async def obtener_leads(current_user: Usuario = Depends(get_current_user)):
     """
     
     try:
-        resultado, _ = ejecutar_consulta(query, (current_user.id,))
+        resultado, _ = await ejecutar_consulta_async(query, (current_user.id,))
         return {"leads": [dict(row) for row in resultado]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener leads: {str(e)}")
@@ -1420,7 +1759,7 @@ async def agregar_propiedad_a_lead(
     """
     
     try:
-        lead_result, _ = ejecutar_consulta(query_check, (lead_id, current_user.id), fetchall=False)
+        lead_result, _ = await ejecutar_consulta_async(query_check, (lead_id, current_user.id), fetchall=False)
         if not lead_result:
             raise HTTPException(status_code=404, detail="Lead no encontrado")
         
@@ -1432,7 +1771,7 @@ async def agregar_propiedad_a_lead(
         RETURNING *
         """
         
-        resultado, _ = ejecutar_consulta(
+        resultado, _ = await ejecutar_consulta_async(
             insert_query,
             (lead_id, propiedad_lead.propiedad_id, propiedad_lead.notas),
             fetchall=False
@@ -1446,7 +1785,7 @@ async def agregar_propiedad_a_lead(
 @app.get("/api/leads/{lead_id}/propiedades")
 async def obtener_propiedades_lead(
     lead_id: int,
-    current_user: Usuario = Depends(get_current_user)
+    current_user: UsuarioToken = Depends(get_usuario_token)
 ):
     """Obtener propiedades de un lead"""
     if not current_user:
@@ -1459,7 +1798,7 @@ async def obtener_propiedades_lead(
     """
     
     try:
-        lead_result, _ = ejecutar_consulta(query_check, (lead_id, current_user.id), fetchall=False)
+        lead_result, _ = await ejecutar_consulta_async(query_check, (lead_id, current_user.id), fetchall=False)
         if not lead_result:
             raise HTTPException(status_code=404, detail="Lead no encontrado")
         
@@ -1473,7 +1812,7 @@ async def obtener_propiedades_lead(
         ORDER BY pl.created_at DESC
         """
         
-        resultado, _ = ejecutar_consulta(query, (lead_id,))
+        resultado, _ = await ejecutar_consulta_async(query, (lead_id,))
         propiedades = []
         
         for row in resultado:
@@ -1505,13 +1844,13 @@ async def eliminar_propiedad_de_lead(
         WHERE id = %s AND (usuario_id = %s OR tipo_lead = 'compartido')
         """
         
-        lead_result, _ = ejecutar_consulta(query_check, (lead_id, current_user.id), fetchall=False)
+        lead_result, _ = await ejecutar_consulta_async(query_check, (lead_id, current_user.id), fetchall=False)
         if not lead_result:
             raise HTTPException(status_code=404, detail="Lead no encontrado")
         
         # Eliminar propiedad del lead
         delete_query = "DELETE FROM propiedades_leads WHERE lead_id = %s AND propiedad_id = %s"
-        ejecutar_consulta(delete_query, (lead_id, propiedad_id), fetchall=False)
+        await ejecutar_consulta_async(delete_query, (lead_id, propiedad_id), fetchall=False)
         
         return {"mensaje": "Propiedad eliminada del lead"}
         
@@ -1527,14 +1866,14 @@ async def eliminar_lead(lead_id: int, current_user: Usuario = Depends(get_curren
     try:
         # Verificar que el lead pertenece al usuario
         query_check = "SELECT * FROM leads WHERE id = %s AND usuario_id = %s"
-        lead_result, _ = ejecutar_consulta(query_check, (lead_id, current_user.id), fetchall=False)
+        lead_result, _ = await ejecutar_consulta_async(query_check, (lead_id, current_user.id), fetchall=False)
         
         if not lead_result:
             raise HTTPException(status_code=404, detail="Lead no encontrado")
         
         # Eliminar lead (CASCADE eliminará las propiedades asociadas)
         delete_query = "DELETE FROM leads WHERE id = %s"
-        ejecutar_consulta(delete_query, (lead_id,), fetchall=False)
+        await ejecutar_consulta_async(delete_query, (lead_id,), fetchall=False)
         
         return {"mensaje": "Lead eliminado exitosamente"}
         
@@ -1543,7 +1882,7 @@ async def eliminar_lead(lead_id: int, current_user: Usuario = Depends(get_curren
 
 # 🎯 PABLO: ENDPOINT PARA PÁGINA INDIVIDUAL DEL LEAD
 @app.get("/api/leads/{lead_id}")
-async def obtener_lead_completo(lead_id: int, current_user: Usuario = Depends(get_current_user)):
+async def obtener_lead_completo(lead_id: int, current_user: UsuarioToken = Depends(get_usuario_token)):
     """Obtener información completa del lead para su página individual"""
     if not current_user:
         raise HTTPException(status_code=401, detail="No autenticado")
@@ -1551,7 +1890,7 @@ async def obtener_lead_completo(lead_id: int, current_user: Usuario = Depends(ge
     try:
         # Obtener información del lead
         lead_query = "SELECT * FROM leads WHERE id = %s"
-        lead_resultado, _ = ejecutar_consulta(lead_query, (lead_id,), fetchall=False)
+        lead_resultado, _ = await ejecutar_consulta_async(lead_query, (lead_id,), fetchall=False)
         
         if not lead_resultado:
             raise HTTPException(status_code=404, detail="Lead no encontrado")
@@ -1572,7 +1911,7 @@ async def obtener_lead_completo(lead_id: int, current_user: Usuario = Depends(ge
         ORDER BY pl.created_at DESC
         """
         
-        propiedades_resultado, _ = ejecutar_consulta(propiedades_query, (lead_id,))
+        propiedades_resultado, _ = await ejecutar_consulta_async(propiedades_query, (lead_id,))
         propiedades = []
         
         for prop in propiedades_resultado:
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+compresion.py
+=============
+Middleware ASGI que comprime las respuestas (brotli si el cliente lo acepta,
+si no gzip). El paquete de la Lambda siempre trae brotli (BINARIAS en
+backend/empaquetar_lambda.py); sin él, en local, sólo se ofrece gzip.
+
+- Respeta `Accept-Encoding` con sus valores q (`gzip;q=0` lo descarta).
+- Sólo comprime tipos de texto (JSON, HTML…) por encima de `minimo_bytes`;
+  las respuestas ya comprimidas, 204 y 304 pasan intactas.
+- Agrega `Vary: Accept-Encoding` para que CloudFront guarde una copia por
+  codificación.
+
+Con Mangum el cuerpo comprimido viaja en base64 (`isBase64Encoded`); ver
+`lambda_function.py`. No depende de FastAPI ni del driver.
+"""
+
+import gzip
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # sólo gzip
+
+# Tipos que vale la pena comprimir (imágenes y binarios ya vienen comprimidos)
+TIPOS_COMPRIMIBLES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+def codificaciones_aceptadas(accept_encoding: str) -> Dict[str, float]:
+    """`Accept-Encoding` → {codificación: q}. `*` cubre lo que no aparezca explícito."""
+    aceptadas = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        if not nombre:
+            continue
+        q = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                q = 0.0
+        aceptadas[nombre.strip().lower()] = q
+    return aceptadas
+
+def elegir_codificacion(accept_encoding: str) -> Optional[str]:
+    """"br" o "gzip" según lo que acepte el cliente (y lo disponible); None = sin comprimir."""
+    aceptadas = codificaciones_aceptadas(accept_encoding)
+    comodin = aceptadas.get("*", 0.0)
+    candidatas = (["br"] if brotli is not None else []) + ["gzip"]
+    mejor, mejor_q = None, 0.0
+    for codificacion in candidatas:
+        q = aceptadas.get(codificacion, comodin)
+        if q > mejor_q:
+            mejor, mejor_q = codificacion, q
+    return mejor
+
+def comprimir(cuerpo: bytes, codificacion: str) -> bytes:
+    if codificacion == "br":
+        # Calidad 5: casi el tamaño de 11 a una fracción del tiempo de CPU
+        return brotli.compress(cuerpo, quality=5)
+    return gzip.compress(cuerpo, compresslevel=6)
+
+class CompresionMiddleware:
+    """Comprime respuestas completas de la app; ver la documentación del módulo."""
+
+    def __init__(self, app, minimo_bytes: int = 1024):
+        self.app = app
+        self.minimo_bytes = minimo_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encabezados = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        codificacion = elegir_codificacion(encabezados.get("accept-encoding", ""))
+        inicio = None
+        partes = []
+
+        async def enviar(mensaje):
+            nonlocal inicio
+            if mensaje["type"] == "http.response.start":
+                inicio = mensaje
+                return
+            if mensaje["type"] != "http.response.body" or inicio is None:
+                await send(mensaje)
+                return
+            # Se junta el cuerpo completo: Mangum también lo junta antes de responder
+            partes.append(mensaje.get("body", b""))
+            if mensaje.get("more_body", False):
+                return
+            await self._responder(inicio, b"".join(partes), codificacion, send)
+
+        await self.app(scope, receive, enviar)
+
+    async def _responder(self, inicio, cuerpo: bytes, codificacion: Optional[str], send):
+        headers = [(k, v) for k, v in inicio.get("headers", [])]
+        nombres = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in headers}
+        comprimible = (
+            inicio["status"] not in (204, 304)
+            and "content-encoding" not in nombres
+            and nombres.get("content-type", "").startswith(TIPOS_COMPRIMIBLES)
+        )
+        if comprimible:
+            vary = nombres.get("vary")
+            if not vary or "accept-encoding" not in vary.lower():
+                headers = [(k, v) for k, v in headers if k.lower() != b"vary"]
+                headers.append((b"vary", (f"{vary}, Accept-Encoding" if vary else "Accept-Encoding").encode("latin-1")))
+            if codificacion and len(cuerpo) >= self.minimo_bytes:
+                cuerpo = comprimir(cuerpo, codificacion)
+                headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+                headers.append((b"content-encoding", codificacion.encode("latin-1")))
+                headers.append((b"content-length", str(len(cuerpo)).encode("latin-1")))
+
+        await send({**inicio, "headers": headers})
+        await send({"type": "http.response.body", "body": cuerpo, "more_body": False})
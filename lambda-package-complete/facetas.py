@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+facetas.py
+==========
+Motor de facetas de /estadisticas.
+
+Calcula TODOS los conteos que necesita el frontend (operaciones, ciudades,
+tipos, características numéricas, amenidades, documentación y características
+adicionales) en UN solo recorrido de `propiedades`:
+
+- Las facetas agrupables salen de `GROUP BY GROUPING SETS`.
+- Los indicadores booleanos (amenidades, documentación…) son columnas que
+  calcula la carga; se cuentan con `COUNT(*) FILTER (WHERE ...)`.
+
+No depende de FastAPI ni del driver: recibe filas como dicts y devuelve la
+misma estructura que regresaba /estadisticas.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+# Bit de cada amenidad en `amenidades_bits`, entero que la carga deriva del JSONB
+# `amenidades` (src/post_carga_catalogo.py). Probar un bit es aritmética sobre una
+# columna fija; `(amenidades->>'x')::boolean` extraía y convertía JSONB por fila y
+# por amenidad. Las amenidades nuevas (p. ej. las de modules/amenidades.AMENIDADES)
+# se agregan AL FINAL con el siguiente bit libre y subiendo VERSION_DERIVADAS.
+#
+# Índices: un B-tree no sirve para `amenidades_bits & n`. Si una amenidad poco
+# común se vuelve un filtro frecuente, crear un índice parcial con el bit LITERAL
+# (la API escribe la máscara como literal para que el planner lo empareje):
+#   CREATE INDEX ... ON propiedades (created_at DESC) WHERE activo AND (amenidades_bits & 64) <> 0
+# Para combinaciones arbitrarias, la alternativa es un arreglo de llaves con GIN
+# (`&&`); con las amenidades actuales el filtro acompaña a otros más selectivos
+# y basta con la prueba de bits sobre las filas que ya quedan.
+BITS_AMENIDADES: Dict[str, int] = {
+    'alberca': 1 << 0,
+    'jardin': 1 << 1,
+    'seguridad': 1 << 2,
+    'terraza': 1 << 3,
+    'estacionamiento': 1 << 4,
+    'cisterna': 1 << 5,
+    'jacuzzi': 1 << 6,
+}
+
+# Textos que PostgreSQL acepta como `true` en un cast ::boolean
+_VERDADEROS = {'true', 't', 'yes', 'y', 'on', '1'}
+
+def mascara_amenidades(amenidades: Optional[Dict]) -> int:
+    """Máscara de bits de un JSONB `amenidades` (misma regla que `(amenidades->>k)::boolean`)."""
+    mascara = 0
+    for llave, bit in BITS_AMENIDADES.items():
+        valor = (amenidades or {}).get(llave)
+        if valor is not None and not isinstance(valor, (dict, list)) and str(valor).strip().lower() in _VERDADEROS:
+            mascara |= bit
+    return mascara
+
+def condicion_amenidades(mascara: int) -> str:
+    """Condición SQL: la fila tiene AL MENOS una de las amenidades de la máscara."""
+    return f"(amenidades_bits & {int(mascara)}) <> 0"
+
+# (etiqueta en la respuesta, alias SQL, condición evaluada por fila)
+AMENIDADES_FACETA: List[Tuple[str, str, str]] = [
+    ('Alberca', 'a_alberca', condicion_amenidades(BITS_AMENIDADES['alberca'])),
+    ('Jardín', 'a_jardin', condicion_amenidades(BITS_AMENIDADES['jardin'])),
+    ('Seguridad', 'a_seguridad', condicion_amenidades(BITS_AMENIDADES['seguridad'])),
+    ('Terraza', 'a_terraza', condicion_amenidades(BITS_AMENIDADES['terraza'])),
+    ('Estacionamiento', 'a_estacionamiento', condicion_amenidades(BITS_AMENIDADES['estacionamiento'])),
+    ('Cisterna', 'a_cisterna', condicion_amenidades(BITS_AMENIDADES['cisterna'])),
+    ('Jacuzzi', 'a_jacuzzi', condicion_amenidades(BITS_AMENIDADES['jacuzzi'])),
+]
+
+# Documentación y características adicionales: columnas booleanas que la carga
+# calcula con los detectores de src/modules (legal, caracteristicas), en lugar
+# de LIKE sobre título y descripción en cada petición.
+DOCUMENTACION_FACETA: List[Tuple[str, str, str]] = [
+    ('Escrituras', 'd_escrituras', 'tiene_escrituras'),
+    ('Cesión', 'd_cesion', 'es_cesion'),
+]
+
+CARACTERISTICAS_ADICIONALES_FACETA: List[Tuple[str, str, str]] = [
+    ('Casa de un nivel', 'c_un_nivel', 'un_nivel'),
+    ('Recámara en planta baja', 'c_recamara_pb', 'recamara_pb'),
+    ('Cochera techada', 'c_cochera_techada', 'cochera_techada'),
+    ('Área de servicio', 'c_area_servicio', 'area_servicio'),
+]
+
+# Valores aceptados por los filtros de /propiedades -> columna booleana
+COLUMNAS_DOCUMENTACION: Dict[str, str] = {
+    'escrituras': 'tiene_escrituras', 'Escrituras': 'tiene_escrituras',
+    'cesion': 'es_cesion', 'Cesión': 'es_cesion',
+}
+COLUMNAS_CARACTERISTICAS_ADICIONALES: Dict[str, str] = {
+    etiqueta: columna for etiqueta, _, columna in CARACTERISTICAS_ADICIONALES_FACETA
+}
+
+# Facetas agrupables: (nombre interno, columna del CTE)
+FACETAS_AGRUPADAS: List[Tuple[str, str]] = [
+    ('operaciones', 'tipo_operacion'),
+    ('ciudades', 'ciudad_f'),
+    ('tipos', 'tipo_propiedad'),
+    ('recamaras', 'recamaras_f'),
+    ('banos', 'banos_f'),
+    ('estacionamientos', 'estacionamientos_f'),
+]
+
+INDICADORES_FACETA = AMENIDADES_FACETA + DOCUMENTACION_FACETA + CARACTERISTICAS_ADICIONALES_FACETA
+
+def _construir_consulta() -> str:
+    indicadores = ",\n        ".join(f"{condicion} AS {alias}" for _, alias, condicion in INDICADORES_FACETA)
+    conteos = ",\n    ".join(f"COUNT(*) FILTER (WHERE {alias}) AS {alias}" for _, alias, _ in INDICADORES_FACETA)
+    faceta_case = "\n        ".join(
+        f"WHEN GROUPING({columna}) = 0 THEN '{nombre}'" for nombre, columna in FACETAS_AGRUPADAS
+    )
+    valor = ", ".join(f"{columna}::text" for _, columna in FACETAS_AGRUPADAS)
+    grupos = ", ".join(f"({columna})" for _, columna in FACETAS_AGRUPADAS)
+    return f"""
+    WITH base AS (
+        SELECT
+            tipo_operacion, tipo_propiedad, precio,
+            CASE
+                WHEN ciudad != '' AND ciudad NOT LIKE '%Chats%' AND ciudad NOT LIKE '%Notificaciones%'
+                THEN ciudad
+            END AS ciudad_f,
+            CASE WHEN recamaras BETWEEN 1 AND 10 THEN recamaras END AS recamaras_f,
+            CASE WHEN banos BETWEEN 1 AND 10 THEN banos END AS banos_f,
+            CASE WHEN estacionamientos BETWEEN 1 AND 20 THEN estacionamientos END AS estacionamientos_f,
+            {indicadores}
+        FROM propiedades
+        WHERE activo = true
+    )
+    SELECT
+    CASE
+        {faceta_case}
+        ELSE 'total'
+    END AS faceta,
+    COALESCE({valor}) AS valor,
+    COUNT(*) AS cantidad,
+    COUNT(precio) AS con_precio,
+    COALESCE(AVG(precio), 0) AS precio_promedio,
+    COALESCE(MIN(precio), 0) AS precio_minimo,
+    COALESCE(MAX(precio), 0) AS precio_maximo,
+    {conteos}
+    FROM base
+    GROUP BY GROUPING SETS ((), {grupos})
+    """
+
+CONSULTA_FACETAS = _construir_consulta()
+
+def _plural(numero: int, singular: str, plural: str) -> str:
+    return f"{numero} {plural if numero > 1 else singular}"
+
+def construir_estadisticas(filas: List[Dict], tiempo_ms: float) -> Dict:
+    """Convierte las filas de CONSULTA_FACETAS en la respuesta de /estadisticas."""
+    total: Optional[Dict] = None
+    grupos: Dict[str, List[Tuple[str, int]]] = {nombre: [] for nombre, _ in FACETAS_AGRUPADAS}
+
+    for fila in filas:
+        if fila['faceta'] == 'total':
+            total = fila
+        elif fila['valor'] is not None:
+            grupos[fila['faceta']].append((fila['valor'], fila['cantidad']))
+
+    total = total or {'cantidad': 0, 'con_precio': 0, 'precio_promedio': 0, 'precio_minimo': 0, 'precio_maximo': 0}
+
+    def por_cantidad(nombre: str) -> Dict[str, int]:
+        return {valor: cantidad for valor, cantidad in sorted(grupos[nombre], key=lambda g: -g[1])}
+
+    def por_valor(nombre: str) -> List[Tuple[int, int]]:
+        return sorted((int(valor), cantidad) for valor, cantidad in grupos[nombre])
+
+    tipos_operacion = por_cantidad('operaciones')
+    ciudades = por_cantidad('ciudades')
+    tipos_propiedad = por_cantidad('tipos')
+
+    caracteristicas = {}
+    for numero, cantidad in por_valor('recamaras'):
+        caracteristicas[_plural(numero, 'Recámara', 'Recámaras')] = cantidad
+    for numero, cantidad in por_valor('banos'):
+        caracteristicas[_plural(numero, 'Baño', 'Baños')] = cantidad
+    for numero, cantidad in por_valor('estacionamientos'):
+        caracteristicas[_plural(numero, 'Estacionamiento', 'Estacionamientos')] = cantidad
+
+    def indicadores(catalogo: List[Tuple[str, str, str]]) -> Dict[str, int]:
+        # Solo incluir los que tienen más de 0
+        return {etiqueta: total.get(alias, 0) for etiqueta, alias, _ in catalogo if total.get(alias, 0) > 0}
+
+    return {
+        'total': total['cantidad'],
+        'total_propiedades': total['cantidad'],
+        'con_precio': total['con_precio'],
+        'precio_promedio': float(total['precio_promedio']),
+        'precio_minimo': float(total['precio_minimo']),
+        'precio_maximo': float(total['precio_maximo']),
+        'por_tipo_operacion': tipos_operacion,
+        'tipos_operacion': tipos_operacion,
+        'ciudades': ciudades,
+        'tiempo_consulta_ms': tiempo_ms,
+        # Estructura de filtros LIMPIOS para el frontend
+        'filtros': {
+            'operaciones': tipos_operacion,
+            'ciudades': ciudades,
+            'tipos': tipos_propiedad,
+            'amenidades': indicadores(AMENIDADES_FACETA),
+            'caracteristicas': caracteristicas,
+            'documentacion': indicadores(DOCUMENTACION_FACETA),
+            'caracteristicas_adicionales': indicadores(CARACTERISTICAS_ADICIONALES_FACETA),
+        },
+    }
@@ -1,3 +1,5 @@
+import asyncio
+import base64
 import json
 import os
 import sys
@@ -25,14 +27,47 @@ except ModuleNotFoundError:
         raise
 
 # Importar la aplicación FastAPI de api_postgresql.py
-from api_postgresql import app
+from api_postgresql import app, calentar, migrar_esquema
+
+# Esquema de usuarios/leads: normalmente lo aplica `make migrar` al desplegar;
+# con MIGRAR_AL_INICIAR=1 también se verifica una vez por arranque en frío.
+if os.environ.get('MIGRAR_AL_INICIAR') == '1':
+    try:
+        migrar_esquema()
+    except Exception as e:
+        # Sin BD los endpoints fallarán igual; no impedir que el contenedor arranque
+        import logging
+        logging.error("No se pudieron aplicar las migraciones: %s", e)
 
 # Crear el handler de Lambda usando Mangum
 handler = Mangum(app)
 
+def _cuerpo_comprimido_en_base64(respuesta):
+    """Mangum manda como texto todo lo que sea application/json si se puede decodificar
+    como UTF-8; un cuerpo gzip/brotli debe viajar en base64 para llegar intacto."""
+    encabezados = {k.lower(): v for k, v in (respuesta.get("headers") or {}).items()}
+    for k, valores in (respuesta.get("multiValueHeaders") or {}).items():
+        encabezados.setdefault(k.lower(), valores[0] if valores else "")
+    if encabezados.get("content-encoding") and respuesta.get("body") and not respuesta.get("isBase64Encoded"):
+        respuesta["body"] = base64.b64encode(respuesta["body"].encode()).decode()
+        respuesta["isBase64Encoded"] = True
+    return respuesta
+
+def es_calentamiento(event):
+    """Regla programada de EventBridge o invocación manual con {"calentar": true}."""
+    if not isinstance(event, dict):
+        return False
+    return event.get('calentar') is True or (
+        event.get('source') == 'aws.events' and event.get('detail-type') == 'Scheduled Event')
+
 def lambda_handler(event, context):
     """
     Función principal para AWS Lambda
     """
-    return handler(event, context)
+    if es_calentamiento(event):
+        # Mismo loop que usa Mangum: asyncio.run() lo cerraría y dejaría el hilo sin loop
+        conexiones = event.get('conexiones')
+        argumentos = {'conexiones': int(conexiones)} if conexiones else {}
+        return asyncio.get_event_loop().run_until_complete(calentar(**argumentos))
+    return _cuerpo_comprimido_en_base64(handler(event, context))
  
\ No newline at end of file
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+migraciones.py
+==============
+Esquema de la base como migraciones versionadas: tablas propias de la API
+(usuarios y leads) y las columnas derivadas, índices y trigger de
+`propiedades` que usa la API, más `facet_snapshot`. Antes cada registro y cada
+lead nuevo corrían `CREATE TABLE IF NOT EXISTS`, y cada carga del catálogo
+corría sus `ALTER TABLE propiedades` / `CREATE INDEX` (ACCESS EXCLUSIVE sobre la
+tabla hasta el COMMIT, con la API esperando detrás); ahora el DDL se aplica
+UNA vez:
+
+- al desplegar: `make migrar` (backend/Makefile; en CI, paso propio antes de deploy-stg), o
+- en el primer arranque en frío si la Lambda tiene MIGRAR_AL_INICIAR=1.
+
+Las versiones aplicadas quedan en `schema_migraciones`. Cada migración corre
+en su propia transacción, bajo un advisory lock de sesión: dos procesos que
+migran a la vez no aplican la misma migración dos veces (el segundo espera y
+ya no encuentra pendientes). Las migraciones de índices (SinTransaccion) usan
+CREATE INDEX CONCURRENTLY, que PostgreSQL no permite dentro de una transacción
+y que no bloquea las lecturas ni escrituras de la tabla mientras construye.
+Las sentencias usan IF NOT EXISTS para que la primera corrida sobre una base
+que ya tenía el esquema sólo agregue lo que falte.
+
+La carga (`src/post_carga_catalogo.py`) también corre este módulo antes de
+calcular las derivadas y ya no ejecuta DDL propio.
+
+No depende de FastAPI; funciona con cualquier conexión DB-API (pg8000 en la
+Lambda, psycopg2 en scripts).
+
+Uso:
+$ python lambda-package-complete/migraciones.py   # aplica las pendientes
+"""
+
+import logging
+import os
+import re
+import sys
+from typing import List, Tuple
+
+logger = logging.getLogger("migraciones")
+
+# Sin valor por omisión: nunca migrar por accidente contra otra base
+VARIABLES_REQUERIDAS = ["DB_HOST", "DB_USER", "DB_PASSWORD"]
+
+class SinTransaccion(str):
+    """Sentencia que no puede ir dentro de una transacción (CREATE INDEX CONCURRENTLY).
+
+    Una migración lleva sólo sentencias de este tipo o ninguna.
+    """
+
+# Llave del advisory lock (cualquier entero fijo, único en la base)
+_LOCK_MIGRACIONES = 4815162342
+
+# (versión, descripción, sentencias). Nunca editar una migración ya aplicada:
+# agregar una nueva con la siguiente versión.
+MIGRACIONES: List[Tuple[int, str, List[str]]] = [
+    (1, "usuarios", [
+        """
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id SERIAL PRIMARY KEY,
+            nombre VARCHAR(100) NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            telefono VARCHAR(20),
+            password_hash VARCHAR(255) NOT NULL,
+            es_admin BOOLEAN DEFAULT FALSE,
+            activo BOOLEAN NOT NULL DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # El login filtra por activo; tablas creadas antes no siempre la tienen
+        "ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS activo BOOLEAN NOT NULL DEFAULT TRUE",
+    ]),
+    (2, "leads y propiedades_leads", [
+        """
+        CREATE TABLE IF NOT EXISTS leads (
+            id SERIAL PRIMARY KEY,
+            usuario_id INTEGER REFERENCES usuarios(id),
+            nombre VARCHAR(100) NOT NULL,
+            telefono VARCHAR(20) NOT NULL,
+            email VARCHAR(100),
+            detalles TEXT,
+            tipo_lead VARCHAR(20) DEFAULT 'privado',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS propiedades_leads (
+            id SERIAL PRIMARY KEY,
+            lead_id INTEGER REFERENCES leads(id) ON DELETE CASCADE,
+            propiedad_id VARCHAR(50) NOT NULL,
+            notas TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(lead_id, propiedad_id)
+        )
+        """,
+    ]),
+    (3, "índices de leads", [
+        # GET /api/leads: privados del usuario y compartidos, más recientes primero
+        "CREATE INDEX IF NOT EXISTS idx_leads_usuario_tipo_creado ON leads (usuario_id, tipo_lead, created_at DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_leads_compartidos_creado ON leads (created_at DESC) WHERE tipo_lead = 'compartido'",
+        # Propiedades de un lead en orden de alta (el UNIQUE ya cubre la búsqueda por lead_id sola)
+        "CREATE INDEX IF NOT EXISTS idx_propiedades_leads_lead_creado ON propiedades_leads (lead_id, created_at DESC)",
+    ]),
+    (4, "trigger de invalidación de columnas derivadas", [
+        # Lo que escribe el trigger; el resto de las derivadas las agrega la carga
+        "ALTER TABLE propiedades ADD COLUMN IF NOT EXISTS derivadas_version SMALLINT",
+        # JSON (no JSONB) para conservar el orden de llaves de la respuesta
+        "ALTER TABLE propiedades ADD COLUMN IF NOT EXISTS tarjeta JSON",
+        """
+        CREATE OR REPLACE FUNCTION propiedades_invalidar_derivadas() RETURNS trigger AS $$
+        BEGIN
+            NEW.derivadas_version := NULL;
+            -- Sin tarjeta la API arma la fila en vivo: nunca sirve una tarjeta vieja
+            NEW.tarjeta := NULL;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        # Las cargas anteriores ya lo crearon en las bases existentes: sólo si falta.
+        # Columnas = COLUMNAS_FUENTE de post_carga_catalogo.py; si cambian, nueva migración.
+        """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                           WHERE tgname = 'trg_propiedades_invalidar_derivadas'
+                             AND tgrelid = 'propiedades'::regclass) THEN
+                CREATE TRIGGER trg_propiedades_invalidar_derivadas
+                BEFORE UPDATE OF titulo, descripcion, ciudad, direccion, amenidades, precio, imagenes,
+                                 tipo_operacion, tipo_propiedad, url_original, estado, recamaras, banos,
+                                 estacionamientos, superficie_construida, autor, caracteristicas
+                ON propiedades
+                FOR EACH ROW EXECUTE FUNCTION propiedades_invalidar_derivadas();
+            END IF;
+        END
+        $$
+        """,
+    ]),
+    (5, "facet_snapshot.datos como JSON", [
+        # Las primeras cargas la crearon como JSONB (reordena las llaves); la carga la
+        # crea ya como JSON. Convertir una sola vez, no en cada refresco del snapshot.
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM information_schema.columns
+                       WHERE table_name = 'facet_snapshot' AND column_name = 'datos'
+                         AND data_type = 'jsonb') THEN
+                ALTER TABLE facet_snapshot ALTER COLUMN datos TYPE JSON USING datos::json;
+            END IF;
+        END
+        $$
+        """,
+    ]),
+    (6, "columnas derivadas de propiedades y facet_snapshot", [
+        # Sin esperar detrás de lecturas largas (y sin que la API espere detrás del ALTER)
+        "SET LOCAL lock_timeout = '10s'",
+        # Búsqueda de texto: vector ponderado mantenido por PostgreSQL en cada INSERT/UPDATE.
+        # En una base nueva reescribe la tabla UNA vez; las existentes ya la tienen.
+        """
+        ALTER TABLE propiedades ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('spanish', COALESCE(titulo, '')), 'A') ||
+            setweight(to_tsvector('spanish', COALESCE(direccion, '') || ' ' || COALESCE(ciudad, '')), 'B') ||
+            setweight(to_tsvector('spanish', COALESCE(descripcion, '')), 'C')
+        ) STORED
+        """,
+        # Ubicación canónica: filtros ciudad/colonia con `= ANY(%s)` en lugar de ILIKE
+        "ALTER TABLE propiedades ADD COLUMN IF NOT EXISTS ciudad_normalizada TEXT",
+        "ALTER TABLE propiedades ADD COLUMN IF NOT EXISTS colonia_normalizada TEXT",
+        # Amenidades como bits: `amenidades_bits & n` en vez de extraer JSONB por fila
+        "ALTER TABLE propiedades ADD COLUMN IF NOT EXISTS amenidades_bits INTEGER NOT NULL DEFAULT 0",
+        # Documentación y características adicionales detectadas en la carga
+        "ALTER TABLE propiedades ADD COLUMN IF NOT EXISTS tiene_escrituras BOOLEAN",
+        "ALTER TABLE propiedades ADD COLUMN IF NOT EXISTS es_cesion BOOLEAN",
+        "ALTER TABLE propiedades ADD COLUMN IF NOT EXISTS un_nivel BOOLEAN",
+        "ALTER TABLE propiedades ADD COLUMN IF NOT EXISTS recamara_pb BOOLEAN",
+        "ALTER TABLE propiedades ADD COLUMN IF NOT EXISTS cochera_techada BOOLEAN",
+        "ALTER TABLE propiedades ADD COLUMN IF NOT EXISTS area_servicio BOOLEAN",
+        # Precio numérico e indicadores de orden: NOT NULL para que el índice de cada
+        # orden (mismas llaves que el ORDER BY de la API) sirva la página completa
+        "ALTER TABLE propiedades ADD COLUMN IF NOT EXISTS precio_num NUMERIC NOT NULL DEFAULT 0",
+        "ALTER TABLE propiedades ADD COLUMN IF NOT EXISTS precio_valido BOOLEAN NOT NULL DEFAULT false",
+        "ALTER TABLE propiedades ADD COLUMN IF NOT EXISTS tiene_imagen BOOLEAN NOT NULL DEFAULT false",
+        # Snapshot de /estadisticas; `datos` JSON (no JSONB) para conservar el orden de llaves
+        """
+        CREATE TABLE IF NOT EXISTS facet_snapshot (
+            id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+            version BIGINT NOT NULL,
+            generado_en TIMESTAMPTZ NOT NULL DEFAULT now(),
+            datos JSON NOT NULL
+        )
+        """,
+    ]),
+    (7, "índices de propiedades", [SinTransaccion(sentencia) for sentencia in [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_propiedades_search_vector ON propiedades USING GIN (search_vector)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_propiedades_ciudad_normalizada ON propiedades "
+        "(ciudad_normalizada) WHERE activo = true",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_propiedades_colonia_normalizada ON propiedades "
+        "(colonia_normalizada) WHERE activo = true",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_propiedades_precio_num ON propiedades (precio_num) "
+        "WHERE activo = true",
+        # Un índice por orden de /propiedades = orden.sql_indices_orden(); si cambian, nueva migración
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_propiedades_orden_created_at ON propiedades "
+        "(tiene_imagen DESC NULLS LAST, created_at DESC NULLS LAST, id ASC NULLS LAST) WHERE activo = true",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_propiedades_orden_precio ON propiedades "
+        "(precio_valido DESC NULLS LAST, tiene_imagen DESC NULLS LAST, precio_num ASC NULLS LAST, "
+        "created_at DESC NULLS FIRST, id ASC NULLS LAST) WHERE activo = true",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_propiedades_orden_titulo ON propiedades "
+        "(tiene_imagen DESC NULLS LAST, titulo DESC NULLS LAST, created_at DESC NULLS FIRST, id ASC NULLS LAST) "
+        "WHERE activo = true",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_propiedades_orden_recamaras ON propiedades "
+        "(tiene_imagen DESC NULLS LAST, recamaras DESC NULLS LAST, created_at DESC NULLS FIRST, id ASC NULLS LAST) "
+        "WHERE activo = true",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_propiedades_orden_banos ON propiedades "
+        "(tiene_imagen DESC NULLS LAST, banos DESC NULLS LAST, created_at DESC NULLS FIRST, id ASC NULLS LAST) "
+        "WHERE activo = true",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_propiedades_orden_estacionamientos ON propiedades "
+        "(tiene_imagen DESC NULLS LAST, estacionamientos DESC NULLS LAST, created_at DESC NULLS FIRST, "
+        "id ASC NULLS LAST) WHERE activo = true",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_propiedades_orden_superficie_construida ON propiedades "
+        "(tiene_imagen DESC NULLS LAST, superficie_construida DESC NULLS LAST, created_at DESC NULLS FIRST, "
+        "id ASC NULLS LAST) WHERE activo = true",
+    ]]),
+]
+
+SQL_CREAR_REGISTRO = """
+CREATE TABLE IF NOT EXISTS schema_migraciones (
+    version INTEGER PRIMARY KEY,
+    descripcion TEXT NOT NULL,
+    aplicada_en TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+SQL_REGISTRAR = "INSERT INTO schema_migraciones (version, descripcion) VALUES (%s, %s)"
+
+# Un CREATE INDEX CONCURRENTLY interrumpido deja el índice INVALID, y IF NOT EXISTS
+# lo daría por creado: se borra antes de reintentar
+_INDICE_CONCURRENTE = re.compile(r"CREATE INDEX CONCURRENTLY IF NOT EXISTS (\w+)")
+SQL_INDICE_INVALIDO = """
+SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+WHERE c.relname = %s AND NOT i.indisvalid
+"""
+
+def _aplicar_en_transaccion(cur, version: int, descripcion: str, sentencias: List[str]):
+    cur.execute("BEGIN")
+    try:
+        for sentencia in sentencias:
+            cur.execute(sentencia)
+        cur.execute(SQL_REGISTRAR, (version, descripcion))
+        cur.execute("COMMIT")
+    except Exception:
+        cur.execute("ROLLBACK")
+        raise
+
+def _aplicar_sin_transaccion(cur, version: int, descripcion: str, sentencias: List[str]):
+    for sentencia in sentencias:
+        indice = _INDICE_CONCURRENTE.search(sentencia)
+        if indice:
+            cur.execute(SQL_INDICE_INVALIDO, (indice.group(1),))
+            if cur.fetchall():
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {indice.group(1)}")
+        cur.execute(sentencia)
+    # Se registra al final: si algo falló, la siguiente corrida repite lo que falte
+    cur.execute(SQL_REGISTRAR, (version, descripcion))
+
+def aplicar_migraciones(conn) -> List[int]:
+    """Aplica las migraciones pendientes (cada una en su transacción); devuelve las versiones aplicadas.
+
+    Deja la conexión en autocommit, como la usa el pool de la API.
+    """
+    conn.autocommit = True
+    cur = conn.cursor()
+    aplicadas = []
+    # Lock de sesión y no de transacción: los índices CONCURRENTLY corren fuera de una
+    cur.execute("SELECT pg_advisory_lock(%s)", (_LOCK_MIGRACIONES,))
+    try:
+        cur.execute(SQL_CREAR_REGISTRO)
+        cur.execute("SELECT version FROM schema_migraciones")
+        existentes = {fila[0] for fila in cur.fetchall()}
+        for version, descripcion, sentencias in MIGRACIONES:
+            if version in existentes:
+                continue
+            if isinstance(sentencias[0], SinTransaccion):
+                _aplicar_sin_transaccion(cur, version, descripcion, sentencias)
+            else:
+                _aplicar_en_transaccion(cur, version, descripcion, sentencias)
+            aplicadas.append(version)
+            logger.info("Migración %s aplicada: %s", version, descripcion)
+    finally:
+        try:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_MIGRACIONES,))
+        except Exception as e:
+            # Con la conexión caída el lock se libera al cerrarse la sesión
+            logger.warning("No se pudo liberar el lock de migraciones: %s", e)
+        cur.close()
+
+    if aplicadas:
+        logger.info("Migraciones aplicadas: %s", aplicadas)
+    return aplicadas
+
+def main():
+    faltantes = [variable for variable in VARIABLES_REQUERIDAS if not os.environ.get(variable)]
+    if faltantes:
+        sys.exit(f"❌ Faltan variables de entorno para migrar: {', '.join(faltantes)} "
+                 "(las mismas que usa la API; en CI, los secrets del paso de migraciones)")
+
+    import pg8000
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    # Mismas variables de entorno que la API
+    conn = pg8000.connect(
+        host=os.environ["DB_HOST"],
+        database=os.environ.get("DB_NAME") or "propiedades_db",
+        user=os.environ["DB_USER"],
+        password=os.environ["DB_PASSWORD"],
+        port=int(os.environ.get("DB_PORT") or 5432),
+    )
+    try:
+        aplicadas = aplicar_migraciones(conn)
+        logger.info("✅ Esquema al día (%s nuevas)", len(aplicadas))
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
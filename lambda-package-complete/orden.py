@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+orden.py
+========
+Llaves de orden de /propiedades y los índices que las sirven.
+
+Cada llave es (expresión, descendente, nulls_last). La misma lista genera el
+ORDER BY de la API, la condición del cursor (keyset) y la definición del
+índice compuesto de cada orden (migración 7 de `migraciones.py`): como el
+índice declara exactamente el mismo orden, PostgreSQL lo recorre y corta en
+el LIMIT en lugar de ordenar todas las filas filtradas.
+
+Las llaves son columnas que calcula la carga (`precio_valido`, `tiene_imagen`,
+`precio_num`), no expresiones como `CASE WHEN jsonb_array_length(imagenes) > 0`,
+que ningún índice puede satisfacer.
+
+No depende de FastAPI ni del driver.
+"""
+
+from typing import List, Tuple
+
+# Campos que acepta el parámetro `orden`; cualquier otro cae en created_at
+CAMPOS_ORDEN = ['created_at', 'precio', 'titulo', 'recamaras', 'banos', 'estacionamientos', 'superficie_construida']
+
+# Columna que se ordena para cada campo (el precio se ordena por su versión numérica)
+_COLUMNA_ORDEN = {'precio': 'precio_num'}
+
+def llaves_orden(orden: str) -> List[Tuple[str, bool, bool]]:
+    """Llaves de orden (expresión, descendente, nulls_last) para un campo de CAMPOS_ORDEN."""
+    claves = []
+    if orden == 'precio':
+        # Propiedades sin precio al final cuando se ordena por precio
+        claves.append(("precio_valido", True, True))
+    # Propiedades con imagen primero
+    claves.append(("tiene_imagen", True, True))
+    claves.append((_COLUMNA_ORDEN.get(orden, orden), orden != 'precio', True))
+    if orden != 'created_at':
+        claves.append(("created_at", True, False))
+    # Desempate único para que el cursor nunca salte ni repita filas
+    claves.append(("id", False, True))
+    return claves
+
+def sql_orden(claves: List[Tuple[str, bool, bool]]) -> str:
+    """Lista "expr DESC NULLS LAST, ..." válida tanto en ORDER BY como en CREATE INDEX."""
+    return ",\n        ".join(
+        f"{expr} {'DESC' if desc else 'ASC'} NULLS {'LAST' if nulls_last else 'FIRST'}"
+        for expr, desc, nulls_last in claves
+    )
+
+def sql_indices_orden() -> List[str]:
+    """CREATE INDEX de cada orden, como debe estar en las migraciones (una prueba los compara).
+
+    Parciales sobre activo como el resto de los índices; CONCURRENTLY para no bloquear la tabla.
+    """
+    return [
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_propiedades_orden_{orden} ON propiedades "
+        f"({sql_orden(llaves_orden(orden))}) WHERE activo = true"
+        for orden in CAMPOS_ORDEN
+    ]
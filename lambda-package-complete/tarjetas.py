@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+tarjetas.py
+===========
+La "tarjeta" de una propiedad: el dict con la forma final de PropiedadResumen
+(rutas de imagen corregidas, ubicación armada, JSONB decodificado).
+
+La carga (`src/post_carga_catalogo.py`) la calcula una vez por fila con
+`construir_tarjeta` y la guarda en la columna JSON `propiedades.tarjeta`; la
+API la lee tal cual en /propiedades, /buscar y el detalle en lugar de rehacer
+la imagen principal, `ubicacion` y las URLs en cada petición. Las filas nuevas
+o modificadas desde la última carga tienen `tarjeta` NULL (el trigger de la
+carga la limpia) y la API arma su tarjeta en vivo con `fila_resumen`, el
+MISMO código: ambos caminos dan los mismos bytes.
+
+No depende de FastAPI ni del driver.
+"""
+
+import json
+import re
+from typing import Dict, Optional
+
+def generar_url_imagen(nombre_imagen: str) -> str:
+    """Normaliza la ruta de la imagen para que el frontend pueda resolverla."""
+    if not nombre_imagen:
+        return "https://via.placeholder.com/400x300/e2e8f0/64748b?text=Sin+Imagen"
+
+    # 1) Si ya es una URL absoluta (http/https) devolverla tal cual
+    if nombre_imagen.startswith("http://") or nombre_imagen.startswith("https://"):
+        return nombre_imagen
+
+    # 2) Si ya viene con la fecha como primer segmento (2025-07-06/....) dejarla igual
+    if re.match(r"^\d{4}-\d{2}-\d{2}/", nombre_imagen):
+        return nombre_imagen
+
+    # 3) Si empieza con "resultados/", quitar ese prefijo para que quede relativo al bucket
+    if nombre_imagen.startswith("resultados/"):
+        return nombre_imagen[len("resultados/"):]
+
+    # 4) Extraer fecha (yyyy-mm-dd) del nombre y anteponerla
+    match = re.search(r"(\d{4}-\d{2}-\d{2})", nombre_imagen)
+    if match:
+        fecha = match.group(1)
+        return f"{fecha}/{nombre_imagen}"
+
+    # 5) Como último recurso, devolver sin modificar
+    return nombre_imagen
+
+def _texto(valor):
+    return None if valor is None else str(valor)
+
+def _flotante(valor):
+    return None if valor is None else float(valor)
+
+def _entero(valor):
+    return None if valor is None else int(valor)
+
+def _jsonb(valor):
+    # JSONB que llegue como texto; si no es JSON válido se manda vacío (como antes)
+    if valor and isinstance(valor, str):
+        try:
+            return json.loads(valor)
+        except ValueError:
+            return {}
+    return valor
+
+def _imagenes(valor):
+    if isinstance(valor, list):
+        return [generar_url_imagen(img) for img in valor]
+    return valor
+
+def _imagen_principal(valor):
+    return generar_url_imagen(valor) if valor else valor
+
+# Mismo orden y tipos que PropiedadResumen
+CAMPOS_RESUMEN = [
+    ('id', _texto), ('titulo', _texto), ('descripcion', _texto), ('precio', _flotante),
+    ('ciudad', _texto), ('tipo_operacion', _texto), ('tipo_propiedad', _texto),
+    ('imagen_url', _imagen_principal), ('images', _imagenes), ('url_original', _texto),
+    ('direccion', _texto), ('estado', _texto), ('link', _texto), ('recamaras', _entero),
+    ('banos', _entero), ('estacionamientos', _entero), ('superficie_m2', _entero),
+    ('autor', _texto), ('amenidades', _jsonb), ('caracteristicas', _jsonb), ('ubicacion', _jsonb),
+]
+
+# Columnas de `propiedades` que lee `construir_tarjeta`
+COLUMNAS_TARJETA = [
+    "titulo", "descripcion", "precio", "ciudad", "tipo_operacion", "tipo_propiedad", "imagenes", "url_original",
+    "direccion", "estado", "recamaras", "banos", "estacionamientos", "superficie_construida", "autor",
+    "amenidades", "caracteristicas",
+]
+
+def fila_resumen(prop: Dict, campos: Optional[tuple] = None) -> Dict:
+    """Fila de la BD → dict con la forma de PropiedadResumen (sólo `campos`, si se indican)."""
+    return {campo: convertir(prop.get(campo)) for campo, convertir in CAMPOS_RESUMEN
+            if campos is None or campo in campos}
+
+def ubicacion(fila: Dict) -> Dict:
+    """Igual que el json_build_object de la API: dirección o "ciudad, estado"."""
+    ciudad, estado, direccion = fila.get("ciudad"), fila.get("estado"), fila.get("direccion")
+    # `ciudad || ...` es NULL si ciudad es NULL
+    if direccion is not None:
+        direccion_completa = direccion
+    elif ciudad is not None:
+        direccion_completa = ciudad + (f", {estado}" if estado is not None else "")
+    else:
+        direccion_completa = None
+    return {"direccion_completa": direccion_completa, "ciudad": ciudad, "estado": estado, "texto_original": direccion}
+
+def construir_tarjeta(fila: Dict) -> Dict:
+    """Fila de `propiedades` (id + COLUMNAS_TARJETA) → tarjeta lista para la respuesta."""
+    imagenes = fila.get("imagenes")
+    if isinstance(imagenes, str):
+        imagenes = json.loads(imagenes or "null")
+    return fila_resumen({
+        **fila,
+        "imagen_url": imagenes[0] if isinstance(imagenes, list) and imagenes else None,
+        "images": imagenes,
+        "link": fila.get("url_original"),
+        "superficie_m2": fila.get("superficie_construida"),
+        "ubicacion": ubicacion(fila),
+    })
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+ubicaciones.py
+==============
+Nombres canónicos de ciudad/colonia compartidos por la API y la carga.
+
+La carga (`src/post_carga_catalogo.py`) guarda en `ciudad_normalizada` y
+`colonia_normalizada` la llave que produce `normalizar_nombre`; la API
+normaliza los valores que pide el usuario con las MISMAS funciones y filtra
+con `= ANY(%s)` sobre un índice B-tree.
+
+No depende de FastAPI ni del driver.
+"""
+
+import re
+import unicodedata
+from typing import Optional
+
+# Ciudades válidas de Morelos
+CIUDADES_MORELOS = {
+    'Cuernavaca', 'Jiutepec', 'Temixco', 'Emiliano Zapata', 'Xochitepec',
+    'Yautepec', 'Cuautla', 'Ayala', 'Tepoztlán', 'Huitzilac', 'Tetela del Volcán',
+    'Tlaltizapán', 'Tlaquiltenango', 'Jojutla', 'Puente de Ixtla', 'Zacatepec',
+    'Axochiapan', 'Jantetelco', 'Jonacatepec', 'Ocuituco', 'Temoac', 'Tetecala',
+    'Mazatepec', 'Miacatlán', 'Coatlán del Río', 'Tlalnepantla', 'Totolapan',
+    'Atlatlahucan', 'Yecapixtla', 'Amacuzac', 'Tres de Mayo'
+}
+
+def normalizar_nombre(texto: Optional[str]) -> Optional[str]:
+    """Llave de comparación: minúsculas, sin acentos y con espacios simples."""
+    if not texto:
+        return None
+    sin_acentos = unicodedata.normalize('NFKD', texto)
+    sin_acentos = ''.join(c for c in sin_acentos if not unicodedata.combining(c))
+    llave = re.sub(r'\s+', ' ', sin_acentos.lower()).strip()
+    return llave or None
+
+# Se prueban primero los nombres largos ("Emiliano Zapata" antes que "Ayala"…)
+_CIUDADES_POR_LLAVE = sorted(
+    ((normalizar_nombre(ciudad), ciudad) for ciudad in CIUDADES_MORELOS),
+    key=lambda par: -len(par[0]),
+)
+
+def limpiar_ciudad(ciudad: str) -> Optional[str]:
+    """Limpia y valida nombres de ciudades"""
+    if not ciudad:
+        return None
+
+    ciudad_limpia = normalizar_nombre(ciudad) or ''
+
+    # Buscar ciudad válida en el texto (sin distinguir mayúsculas ni acentos)
+    for llave, ciudad_valida in _CIUDADES_POR_LLAVE:
+        if llave in ciudad_limpia:
+            return ciudad_valida
+
+    # Si no encuentra una ciudad válida, devolver None
+    return None
+
+def llave_ciudad(ciudad: Optional[str]) -> Optional[str]:
+    """Llave de `ciudad_normalizada` para un nombre de ciudad (canónico si es de Morelos)."""
+    return normalizar_nombre(limpiar_ciudad(ciudad) or ciudad)
@@ -83,6 +83,15 @@ INDICADORES = {
         "puede crecer", "oportunidad de crecer"
     ],
     
+    "cochera_techada": [
+        "cochera techada", "garage techado", "garaje techado",
+        "estacionamiento techado", "cochera cubierta"
+    ],
+    
+    "area_servicio": [
+        "area de servicio", "área de servicio", "cuarto de servicio"
+    ],
+    
     "estacionamiento_general": [
         "estacionamiento", "cochera", "garage"
     ]
@@ -422,6 +431,16 @@ def extraer_caracteristicas_adicionales(texto: str) -> Dict:
             "valor": False,
             "confianza": 0.0,
             "evidencia": []
+        },
+        "cochera_techada": {
+            "valor": False,
+            "confianza": 0.0,
+            "evidencia": []
+        },
+        "area_servicio": {
+            "valor": False,
+            "confianza": 0.0,
+            "evidencia": []
         }
     }
     
@@ -450,6 +469,17 @@ def extraer_caracteristicas_adicionales(texto: str) -> Dict:
             })
             break
     
+    # Detectar cochera techada y área de servicio
+    for caracteristica in ("cochera_techada", "area_servicio"):
+        for indicador in INDICADORES[caracteristica]:
+            if indicador in texto_norm:
+                resultado[caracteristica].update({
+                    "valor": True,
+                    "confianza": 0.9,
+                    "evidencia": [f"Indicador encontrado: {indicador}"]
+                })
+                break
+    
     return resultado
 
 def extraer_caracteristicas(texto: str) -> Dict:
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+post_carga_catalogo.py
+======================
+Pasos que corren DESPUÉS de cargar propiedades a PostgreSQL para que la API
+sirva datos precalculados en lugar de recalcularlos en cada petición:
+
+    0. Esquema: aplica las migraciones pendientes (lambda-package-complete/
+       migraciones.py), dueñas de las columnas derivadas, índices y trigger de
+       `propiedades` y de `facet_snapshot`. Con el esquema al día no corre DDL,
+       así una carga no bloquea (ACCESS EXCLUSIVE) la tabla que lee la API:
+       - `search_vector`: tsvector generado (título A, dirección/ciudad B,
+         descripción C) con índice GIN para /buscar y el parámetro q.
+       - `ciudad_normalizada` / `colonia_normalizada`: llaves canónicas con
+         índice B-tree para los filtros ciudad y colonia.
+       - `amenidades_bits`: máscara de bits del JSONB `amenidades` para el
+         filtro amenidad y sus facetas (ver BITS_AMENIDADES en facetas.py,
+         incluida la estrategia de índices parciales).
+       - `tiene_escrituras`, `es_cesion`, `un_nivel`, `recamara_pb`,
+         `cochera_techada`, `area_servicio`: detectores de src/modules (legal,
+         caracteristicas) evaluados una vez por fila en lugar de LIKE por petición.
+       - `precio_num` (0 si no hay precio), `precio_valido`, `tiene_imagen`:
+         llaves de filtro y orden de /propiedades, con un índice compuesto por
+         cada orden (ver orden.py) para que el LIMIT salga de recorrer el índice.
+       - `tarjeta`: JSON con la forma final de la propiedad en la respuesta
+         (imágenes con su URL canónica, ubicación armada). /propiedades, /buscar
+         y el detalle la devuelven tal cual (ver tarjetas.py).
+    1. Columnas derivadas: se calculan en Python para las filas nuevas, las
+       modificadas (un trigger limpia `derivadas_version` y `tarjeta` al cambiar
+       sus campos fuente) y todas cuando sube VERSION_DERIVADAS. Mientras una
+       fila no tenga tarjeta, la API la arma en vivo con el mismo código.
+    2. Snapshot de facetas (`facet_snapshot`) que sirve /estadisticas.
+       Cada refresco incrementa `version`; la API cachea el snapshot en memoria
+       y sólo lo vuelve a leer cuando esa versión cambia. La misma versión marca
+       el catálogo: al cambiar, la API descarta su cache de páginas de /propiedades.
+
+Las facetas se calculan con el MISMO motor que usa la Lambda
+(`lambda-package-complete/facetas.py`), así ambos caminos dan la misma respuesta.
+Las ciudades se normalizan con `lambda-package-complete/ubicaciones.py`, el
+mismo código con el que la API normaliza lo que pide el usuario, y las
+tarjetas se arman con `lambda-package-complete/tarjetas.py`.
+
+Correr ANTES de desplegar una versión de la API que use columnas nuevas: las
+migraciones las crean (también `make migrar`) y esta carga las llena.
+
+Uso:
+$ python src/post_carga_catalogo.py               # esquema + derivadas + snapshot
+$ python src/post_carga_catalogo.py --recalcular  # backfill: recalcula derivadas en todas las filas
+$ python src/post_carga_catalogo.py --dry-run     # sólo calcula y muestra conteos
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from typing import Dict
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_batch
+
+# Reutilizar el motor de facetas y la normalización de la API
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda-package-complete"))
+from facetas import CONSULTA_FACETAS, construir_estadisticas, mascara_amenidades  # type: ignore
+from migraciones import aplicar_migraciones  # type: ignore
+from tarjetas import COLUMNAS_TARJETA, construir_tarjeta  # type: ignore
+from ubicaciones import limpiar_ciudad, normalizar_nombre    # type: ignore
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from modules.caracteristicas import extraer_caracteristicas_adicionales, extraer_niveles  # type: ignore
+from modules.legal import detectar_cesion_derechos, detectar_escrituras  # type: ignore
+from modules.ubicacion import extraer_ciudad, extraer_colonia  # type: ignore
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+logger = logging.getLogger("post_carga")
+
+# Mismas variables de entorno que la API (lambda-package-complete/api_postgresql.py)
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "todaslascasas-postgres.cqpcyeqa0uqj.us-east-1.rds.amazonaws.com"),
+    "database": os.getenv("DB_NAME", "propiedades_db"),
+    "user": os.getenv("DB_USER", "pabloravel"),
+    "password": os.getenv("DB_PASSWORD", "Todaslascasas2025"),
+    "port": int(os.getenv("DB_PORT", "5432")),
+}
+
+# Subir este número cuando cambie `derivar_columnas`: la siguiente corrida
+# recalcula las columnas derivadas en todas las filas.
+VERSION_DERIVADAS = 5
+
+# Columnas de `propiedades` que lee `derivar_columnas`; si un UPDATE cambia
+# alguna, el trigger marca la fila como pendiente de recalcular. El trigger es
+# una migración (migraciones.py): al cambiar esta lista hay que agregar otra.
+COLUMNAS_FUENTE = ["titulo", "descripcion", "ciudad", "direccion", "amenidades", "precio", "imagenes"]
+COLUMNAS_FUENTE += [columna for columna in COLUMNAS_TARJETA if columna not in COLUMNAS_FUENTE]
+
+# Columnas que escribe `derivar_columnas` (las crean las migraciones 4 y 6)
+# Indicadores booleanos de documentación y características adicionales
+COLUMNAS_INDICADORES = ["tiene_escrituras", "es_cesion", "un_nivel", "recamara_pb", "cochera_techada", "area_servicio"]
+
+# Llaves tipadas de filtro y orden de /propiedades
+COLUMNAS_ORDEN = ["precio_num", "precio_valido", "tiene_imagen"]
+
+COLUMNAS_DERIVADAS = (["ciudad_normalizada", "colonia_normalizada", "amenidades_bits"] + COLUMNAS_INDICADORES
+                      + COLUMNAS_ORDEN + ["tarjeta"])
+
+SQL_GUARDAR_SNAPSHOT = """
+INSERT INTO facet_snapshot (id, version, generado_en, datos)
+VALUES (1, 1, now(), %s::json)
+ON CONFLICT (id) DO UPDATE
+    SET version = facet_snapshot.version + 1,
+        generado_en = EXCLUDED.generado_en,
+        datos = EXCLUDED.datos
+RETURNING version
+"""
+
+def asegurar_esquema(conn):
+    """Aplica las migraciones pendientes: columnas, índices y trigger de `propiedades` viven en migraciones.py.
+
+    Al día no ejecuta DDL: una carga ya no toma ACCESS EXCLUSIVE sobre la tabla que lee la API.
+    """
+    aplicadas = aplicar_migraciones(conn)
+    conn.autocommit = False
+    logger.info("Esquema al día (%s migraciones nuevas)", len(aplicadas))
+
+def precio_numerico(valor) -> Decimal:
+    """Precio como NUMERIC; 0 si falta o no es un número (misma regla que COALESCE(precio::numeric, 0))."""
+    if valor is None or isinstance(valor, bool):
+        return Decimal(0)
+    try:
+        precio = Decimal(str(valor).strip())
+    except InvalidOperation:
+        return Decimal(0)
+    return precio if precio.is_finite() else Decimal(0)
+
+def derivar_columnas(fila: Dict) -> Dict:
+    """Valores de COLUMNAS_DERIVADAS para una fila con COLUMNAS_FUENTE."""
+    ciudad = (fila.get("ciudad") or "").strip()
+    direccion = (fila.get("direccion") or "").strip()
+
+    # Ciudad: catálogo de Morelos en ciudad y dirección, luego las variantes de
+    # modules.ubicacion (Ocotepec, 3 Marías…) y, si nada aplica, el texto original.
+    # La descripción NO se usa: mencionar una ciudad no la ubica ahí.
+    ciudad_canonica = (
+        limpiar_ciudad(ciudad)
+        or limpiar_ciudad(direccion)
+        or extraer_ciudad(f"{ciudad} {direccion}".strip())["ciudad"]
+        or ciudad
+    )
+    colonia = extraer_colonia(direccion)["colonia"]
+
+    texto = f"{fila.get('titulo') or ''} {fila.get('descripcion') or ''}"
+    adicionales = extraer_caracteristicas_adicionales(texto)
+    precio = precio_numerico(fila.get("precio"))
+    imagenes = fila.get("imagenes")
+    if isinstance(imagenes, str):
+        imagenes = json.loads(imagenes or "null")
+
+    return {
+        "ciudad_normalizada": normalizar_nombre(ciudad_canonica),
+        "colonia_normalizada": normalizar_nombre(colonia),
+        "amenidades_bits": mascara_amenidades(fila.get("amenidades")),
+        "tiene_escrituras": detectar_escrituras(texto)["valor"] is True,
+        "es_cesion": bool(detectar_cesion_derechos(texto)["valor"]),
+        "un_nivel": extraer_niveles(texto)["valor"] == 1,
+        "recamara_pb": bool(adicionales["recamara_planta_baja"]["valor"]),
+        "cochera_techada": bool(adicionales["cochera_techada"]["valor"]),
+        "area_servicio": bool(adicionales["area_servicio"]["valor"]),
+        "precio_num": precio,
+        "precio_valido": precio > 0,
+        "tiene_imagen": isinstance(imagenes, list) and len(imagenes) > 0,
+        "tarjeta": json.dumps(construir_tarjeta(fila), ensure_ascii=False),
+    }
+
+def actualizar_columnas_derivadas(conn, todas: bool = False, dry_run: bool = False, batch: int = 500):
+    """Recalcula las columnas derivadas de las filas pendientes (o de todas)."""
+    inicio = time.time()
+    columnas = ", ".join(["id"] + COLUMNAS_FUENTE)
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        if todas or dry_run:
+            cur.execute(f"SELECT {columnas} FROM propiedades")
+        else:
+            cur.execute(
+                f"SELECT {columnas} FROM propiedades WHERE derivadas_version IS DISTINCT FROM %s",
+                (VERSION_DERIVADAS,),
+            )
+        filas = cur.fetchall()
+
+    updates = [{**derivar_columnas(fila), "id": fila["id"], "version": VERSION_DERIVADAS} for fila in filas]
+    logger.info("Columnas derivadas calculadas para %s filas en %.0fms", len(updates), (time.time() - inicio) * 1000)
+
+    if dry_run or not updates:
+        return len(updates)
+
+    asignaciones = ", ".join(f"{columna} = %({columna})s" for columna in COLUMNAS_DERIVADAS)
+    with conn.cursor() as cur:
+        execute_batch(
+            cur,
+            f"UPDATE propiedades SET {asignaciones}, derivadas_version = %(version)s WHERE id = %(id)s",
+            updates,
+            page_size=max(1, batch),
+        )
+        # Estadísticas frescas para el planner (filtros nuevos y conteo=aproximado)
+        cur.execute("ANALYZE propiedades")
+    conn.commit()
+    logger.info("✅ Columnas derivadas guardadas (%s filas)", len(updates))
+    return len(updates)
+
+def refrescar_snapshot_facetas(conn, dry_run: bool = False):
+    """Calcula las facetas y las guarda como nueva versión del snapshot."""
+    inicio = time.time()
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(CONSULTA_FACETAS)
+        filas = cur.fetchall()
+    tiempo_ms = (time.time() - inicio) * 1000
+    datos = construir_estadisticas(filas, tiempo_ms)
+    logger.info("Facetas calculadas en %.0fms (%s propiedades activas)", tiempo_ms, datos["total"])
+
+    if dry_run:
+        logger.info("--dry-run activado, no se guarda el snapshot")
+        return None
+
+    with conn.cursor() as cur:
+        cur.execute(SQL_GUARDAR_SNAPSHOT, (json.dumps(datos, ensure_ascii=False),))
+        version = cur.fetchone()[0]
+    conn.commit()
+    logger.info("✅ Snapshot de facetas guardado (versión %s)", version)
+    return version
+
+def main():
+    parser = argparse.ArgumentParser(description="Actualiza datos precalculados tras la carga a PostgreSQL")
+    parser.add_argument("--dry-run", action="store_true", help="No guarda cambios")
+    parser.add_argument("--recalcular", action="store_true", help="Recalcula columnas derivadas en todas las filas")
+    parser.add_argument("--batch", type=int, default=500, help="Tamaño de lote para UPDATE")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        if not args.dry_run:
+            asegurar_esquema(conn)
+        actualizar_columnas_derivadas(conn, todas=args.recalcular, dry_run=args.dry_run, batch=args.batch)
+        refrescar_snapshot_facetas(conn, dry_run=args.dry_run)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""Configuración común para las pruebas de la API Lambda.
+
+`api_postgresql.py` vive en `lambda-package-complete/`; se agrega esa carpeta al
+final del PYTHONPATH para que las dependencias instaladas en el entorno tengan
+prioridad sobre las copias empaquetadas para Lambda.
+"""
+import os
+import sys
+
+API_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "lambda-package-complete"))
+if API_DIR not in sys.path:
+    sys.path.append(API_DIR)
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""Arranque en frío: qué se importa al cargar lambda_function."""
+import os
+import subprocess
+import sys
+
+from conftest import API_DIR
+
+BACKEND_DIR = os.path.join(os.path.dirname(API_DIR), "backend")
+sys.path.append(BACKEND_DIR)
+
+from tiempo_importacion import PROHIBIDOS_EN_ARRANQUE  # noqa: E402
+
+
+def test_autenticacion_no_se_importa_al_arrancar():
+    codigo = (f"import sys; sys.path.append({API_DIR!r}); import lambda_function; "
+              f"print(','.join(m for m in {PROHIBIDOS_EN_ARRANQUE!r} if m in sys.modules))")
+    entorno = {k: v for k, v in os.environ.items() if k != "MIGRAR_AL_INICIAR"}
+    salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, env=entorno, check=True)
+    assert salida.stdout.strip() == ""
+
+
+def test_passlib_y_jwt_al_primer_uso():
+    from fastapi.security import HTTPAuthorizationCredentials
+
+    import api_postgresql as api
+
+    hash_ = api.hash_password("secreta")
+    assert api.verify_password("secreta", hash_)
+    token = api.create_access_token({"sub": "ana@ejemplo.mx"})
+    credenciales = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    assert api.decodificar_token(credenciales)["sub"] == "ana@ejemplo.mx"
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Cache de usuarios por token y claims `id`/`es_admin` del JWT."""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.security import HTTPAuthorizationCredentials
+
+import api_postgresql as api
+
+FILA_USUARIO = {"id": 7, "nombre": "Ana", "email": "ana@ejemplo.mx", "telefono": None, "es_admin": False,
+                "created_at": datetime(2026, 1, 5)}
+
+
+def credenciales(datos):
+    token = api.create_access_token(datos, expires_delta=timedelta(minutes=5))
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+@pytest.fixture
+def filas():
+    return {"ana@ejemplo.mx": FILA_USUARIO}
+
+
+@pytest.fixture
+def consultas(monkeypatch, filas):
+    realizadas = []
+
+    def consulta_falsa(query, params=None, fetchall=True, preparada=False):
+        realizadas.append(params)
+        fila = filas.get(params[0])
+        return (dict(fila) if fila else None), 0.5
+
+    monkeypatch.setattr(api, "ejecutar_consulta", consulta_falsa)
+    monkeypatch.setattr(api, "_cache_usuarios", OrderedDict())
+    return realizadas
+
+
+def test_usuario_en_cache_por_token(consultas):
+    token = credenciales(api.claims_de_usuario(FILA_USUARIO))
+    assert api.get_current_user(token).id == 7
+    assert api.get_current_user(token).nombre == "Ana"
+    assert len(consultas) == 1
+
+    # Eliminar (o cambiar es_admin) lo saca del cache
+    api.invalidar_usuario(7)
+    api.get_current_user(token)
+    assert len(consultas) == 2
+
+
+def test_cache_expira(consultas, monkeypatch):
+    token = credenciales({"sub": "ana@ejemplo.mx"})
+    api.get_current_user(token)
+    monkeypatch.setattr(api, "USUARIOS_CACHE_TTL_S", 0)
+    api.get_current_user(token)
+    assert len(consultas) == 2
+
+
+def test_usuario_token_pasa_por_el_cache(consultas):
+    token = credenciales(api.claims_de_usuario(FILA_USUARIO))
+    for _ in range(3):
+        usuario = api.get_usuario_token(token)
+    assert (usuario.id, usuario.email, usuario.es_admin) == (7, "ana@ejemplo.mx", False)
+    assert consultas == [("ana@ejemplo.mx",)]
+
+
+@pytest.mark.parametrize("fila", [None, {**FILA_USUARIO, "activo": False}])
+def test_usuario_eliminado_o_desactivado_deja_de_autenticar(consultas, filas, monkeypatch, fila):
+    # Los claims siguen vigentes 8 horas; el usuario se revisa al vencer el TTL
+    token = credenciales(api.claims_de_usuario(FILA_USUARIO))
+    api.get_usuario_token(token)
+    filas["ana@ejemplo.mx"] = fila
+    monkeypatch.setattr(api, "USUARIOS_CACHE_TTL_S", 0)
+    with pytest.raises(api.HTTPException) as exc:
+        api.get_usuario_token(token)
+    assert exc.value.status_code == 401
+
+
+def test_cache_lru_acotado(consultas, filas, monkeypatch):
+    monkeypatch.setattr(api, "USUARIOS_CACHE_MAX", 2)
+    for i in range(3):
+        filas[f"u{i}@ejemplo.mx"] = {**FILA_USUARIO, "id": i, "email": f"u{i}@ejemplo.mx"}
+    tokens = [credenciales({"sub": f"u{i}@ejemplo.mx"}) for i in range(3)]
+    api.get_current_user(tokens[0])
+    api.get_current_user(tokens[1])
+    api.get_current_user(tokens[0])  # acierto: tokens[1] queda como el menos usado
+    api.get_current_user(tokens[2])
+    assert len(api._cache_usuarios) == 2 and len(consultas) == 3
+
+    # Sale sólo el menos usado, no todo el cache
+    api.get_current_user(tokens[0])
+    assert len(consultas) == 3
+    api.get_current_user(tokens[1])
+    assert len(consultas) == 4
+
+
+@pytest.mark.parametrize("token", [None, HTTPAuthorizationCredentials(scheme="Bearer", credentials="basura")])
+def test_token_invalido(consultas, token):
+    with pytest.raises(api.HTTPException) as exc:
+        api.get_usuario_token(token)
+    assert exc.value.status_code == 401
+    assert consultas == []
+
+
+def test_bcrypt_fuera_del_event_loop_y_con_tope(monkeypatch):
+    import asyncio
+    import threading
+
+    liberar = threading.Event()
+
+    def hash_lento(password):
+        liberar.wait(5)
+        return f"hash-{password}"
+
+    monkeypatch.setattr(api, "hash_password", hash_lento)
+    monkeypatch.setattr(api, "HASH_COLA_MAX", 2)
+    monkeypatch.setattr(api, "cola_hash", {"pendientes": 0, "max_pendientes": 0, "completadas": 0, "fallidas": 0,
+                                           "rechazadas": 0})
+
+    async def escenario():
+        hashes = [asyncio.ensure_future(api.hash_password_async(f"c{i}")) for i in range(2)]
+        await asyncio.sleep(0.05)
+        # El loop sigue atendiendo mientras los hashes esperan en sus hilos
+        assert api.cola_hash["pendientes"] == 2
+        with pytest.raises(api.HTTPException) as exc:
+            await api.hash_password_async("c3")
+        assert exc.value.status_code == 503
+        liberar.set()
+        return await asyncio.gather(*hashes)
+
+    assert asyncio.run(escenario()) == ["hash-c0", "hash-c1"]
+    assert api.cola_hash == {"pendientes": 0, "max_pendientes": 2, "completadas": 2, "fallidas": 0, "rechazadas": 1}
+
+
+def test_hash_que_falla_no_cuenta_como_completado(monkeypatch):
+    import asyncio
+
+    def hash_roto(password):
+        raise ValueError("bcrypt no disponible")
+
+    monkeypatch.setattr(api, "hash_password", hash_roto)
+    monkeypatch.setattr(api, "cola_hash", {"pendientes": 0, "max_pendientes": 0, "completadas": 0, "fallidas": 0,
+                                           "rechazadas": 0})
+    with pytest.raises(ValueError):
+        asyncio.run(api.hash_password_async("secreta"))
+    assert api.cola_hash == {"pendientes": 0, "max_pendientes": 1, "completadas": 0, "fallidas": 1, "rechazadas": 0}
+
+
+def test_hash_cancelado_sigue_pendiente_hasta_que_termina_su_hilo(monkeypatch):
+    import asyncio
+    import threading
+
+    liberar = threading.Event()
+
+    def hash_lento(password):
+        liberar.wait(5)
+        return f"hash-{password}"
+
+    monkeypatch.setattr(api, "hash_password", hash_lento)
+    monkeypatch.setattr(api, "HASH_COLA_MAX", 1)
+    monkeypatch.setattr(api, "cola_hash", {"pendientes": 0, "max_pendientes": 0, "completadas": 0, "fallidas": 0,
+                                           "rechazadas": 0})
+
+    async def escenario():
+        tarea = asyncio.ensure_future(api.hash_password_async("c0"))
+        await asyncio.sleep(0.05)
+        tarea.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await tarea
+        # bcrypt sigue ocupando el worker: el tope lo cuenta
+        assert api.cola_hash["pendientes"] == 1
+        with pytest.raises(api.HTTPException):
+            await api.hash_password_async("c1")
+        liberar.set()
+        while api.cola_hash["pendientes"]:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(escenario())
+    assert api.cola_hash == {"pendientes": 0, "max_pendientes": 1, "completadas": 1, "fallidas": 0, "rechazadas": 1}
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de la conversión de búsquedas de texto a tsquery."""
+import api_postgresql as api
+
+
+def test_consulta_texto_por_prefijos():
+    assert api.consulta_texto("Casa  Cuerna") == "casa:* & cuerna:*"
+    assert api.consulta_texto("recámara, jardín") == "recámara:* & jardín:*"
+
+
+def test_consulta_texto_descarta_operadores_tsquery():
+    # Sólo palabras: el usuario no puede inyectar &, |, ! ni paréntesis
+    assert api.consulta_texto("casa & !(renta)") == "casa:* & renta:*"
+    assert api.consulta_texto("!!") is None
+    assert api.consulta_texto("") is None
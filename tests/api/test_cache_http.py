@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del GET condicional (ETag / Last-Modified) de los endpoints de lectura."""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from starlette.requests import Request
+from starlette.responses import Response
+
+import api_postgresql as api
+
+
+def peticion(**encabezados):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/propiedades",
+        "headers": [(k.replace("_", "-").encode(), v.encode()) for k, v in encabezados.items()],
+    })
+
+
+@pytest.fixture
+def catalogo(monkeypatch):
+    async def snapshot_falso():
+        return {"total": 10}
+
+    monkeypatch.setattr(api, "obtener_snapshot_facetas", snapshot_falso)
+    monkeypatch.setattr(api, "_VERSION_DESPLIEGUE", "12")
+    monkeypatch.setattr(api, "_cache_facetas", {
+        "version": 7, "datos": {"total": 10},
+        "generado_en": datetime(2026, 10, 1, 6, 30, 15, 250000, tzinfo=timezone.utc), "verificado_en": 0.0,
+    })
+
+
+def test_respuesta_completa_lleva_validadores(catalogo):
+    respuesta = Response()
+    assert asyncio.run(api.validar_cache_http(peticion(), respuesta, "listados")) is None
+    assert respuesta.headers["etag"] == 'W/"12-7"'
+    assert respuesta.headers["last-modified"] == "Thu, 01 Oct 2026 06:30:15 GMT"
+    assert "s-maxage=300" in respuesta.headers["cache-control"]
+
+
+@pytest.mark.parametrize("encabezados", [
+    {"if_none_match": '"12-7"'},
+    {"if_none_match": 'W/"11-6", W/"12-7"'},
+    {"if_modified_since": "Thu, 01 Oct 2026 06:30:15 GMT"},
+])
+def test_304_si_el_cliente_tiene_la_version(catalogo, encabezados):
+    no_modificado = asyncio.run(api.validar_cache_http(peticion(**encabezados), Response(), "propiedad"))
+    assert no_modificado.status_code == 304
+    assert no_modificado.headers["etag"] == 'W/"12-7"'
+
+
+@pytest.mark.parametrize("encabezados", [
+    {"if_none_match": 'W/"12-6"'},
+    # If-None-Match manda aunque la fecha coincida
+    {"if_none_match": 'W/"12-6"', "if_modified_since": "Thu, 01 Oct 2026 06:30:15 GMT"},
+    {"if_modified_since": "Thu, 01 Oct 2026 06:30:14 GMT"},
+    {"if_modified_since": "ayer"},
+])
+def test_200_si_el_catalogo_cambio(catalogo, encabezados):
+    assert asyncio.run(api.validar_cache_http(peticion(**encabezados), Response(), "listados")) is None
+
+
+def test_sin_snapshot_no_hay_validadores(monkeypatch):
+    async def sin_snapshot():
+        return None
+
+    monkeypatch.setattr(api, "obtener_snapshot_facetas", sin_snapshot)
+    respuesta = Response()
+    assert asyncio.run(api.validar_cache_http(peticion(if_none_match="*"), respuesta, "listados")) is None
+    assert "etag" not in respuesta.headers
+
+
+def test_compatibilidad_api_propiedades(catalogo, monkeypatch):
+    async def consulta_falsa(query, params=None, fetchall=True, preparada=False):
+        if query.startswith("SELECT COUNT(*)"):
+            return {"count": 1}, 1.0
+        return [{"tarjeta": '{"id": "p1"}'}], 1.0
+
+    monkeypatch.setattr(api, "ejecutar_consulta_async", consulta_falsa)
+    monkeypatch.setattr(api, "cache_listados", api.CacheListados(1024 * 1024))
+
+    respuesta = Response()
+    completa = asyncio.run(api.api_propiedades_compatibilidad(peticion(), respuesta))
+    assert completa.status_code == 200 and completa.headers["etag"] == 'W/"12-7"'
+    # Pasa por el mismo GET condicional que /propiedades
+    no_modificado = asyncio.run(api.api_propiedades_compatibilidad(peticion(if_none_match='W/"12-7"'), Response()))
+    assert no_modificado.status_code == 304
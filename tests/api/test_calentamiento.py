@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Calentamiento del contenedor con el ping programado (sin pasar por Mangum)."""
+import asyncio
+import json
+from collections import OrderedDict
+
+import pytest
+from starlette.requests import Request
+from starlette.responses import Response
+
+import api_postgresql as api
+import lambda_function
+
+PING_EVENTBRIDGE = {"source": "aws.events", "detail-type": "Scheduled Event", "detail": {}}
+
+
+class ConexionFalsa:
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def catalogo(monkeypatch):
+    consultas = []
+
+    async def snapshot_falso():
+        return {"total": 1}
+
+    async def consulta_falsa(query, params=None, fetchall=True, preparada=False):
+        consultas.append(params)
+        if query.startswith("SELECT COUNT(*)"):
+            return {"count": 1}, 1.0
+        return [{"tarjeta": '{"id": "p1", "titulo": "Casa p1"}'}], 2.0
+
+    monkeypatch.setattr(api, "obtener_snapshot_facetas", snapshot_falso)
+    monkeypatch.setattr(api, "_cache_facetas", {"version": 7, "datos": {"total": 1}, "generado_en": None,
+                                                "verificado_en": 0.0})
+    monkeypatch.setattr(api, "ejecutar_consulta_async", consulta_falsa)
+    monkeypatch.setattr(api, "cache_listados", api.CacheListados(1024 * 1024))
+    monkeypatch.setattr(api, "_cache_conteos", {"version": None, "totales": OrderedDict()})
+    monkeypatch.setattr(api, "get_db_connection", ConexionFalsa)
+    monkeypatch.setattr(api, "db_pool", api.PoolConexiones(maximo=3, timeout_s=0.05, ping_s=30, max_vida_s=1800))
+    return consultas
+
+
+def test_precalentar_abre_hasta_el_maximo(catalogo):
+    assert api.db_pool.precalentar(5) == 3
+    assert api.db_pool.creadas == 3 and len(api.db_pool._libres) == 3
+    # Un segundo ping reutiliza las abiertas
+    assert api.db_pool.precalentar(5) == 3
+    assert api.db_pool.creadas == 3
+
+
+def test_calentar_deja_la_primera_pagina_en_cache(catalogo):
+    resultado = asyncio.run(api.calentar(conexiones=2))
+    assert resultado["conexiones"] == 2 and resultado["primera_pagina"] and resultado["errores"] == []
+    assert resultado["version_catalogo"] == 7
+    assert len(catalogo) == 2  # página y total
+
+    # El primer usuario pide la página sin filtros y no llega a la BD
+    peticion = Request({"type": "http", "method": "GET", "path": "/propiedades", "headers": []})
+    respuesta = asyncio.run(api.listar_propiedades(peticion, Response(), **api._ARGUMENTOS_PRIMERA_PAGINA))
+    assert respuesta.status_code == 200
+    assert len(catalogo) == 2
+    assert api.cache_listados.aciertos == 1
+    cuerpo = json.loads(respuesta.body)
+    assert cuerpo["propiedades"] == [{"id": "p1", "titulo": "Casa p1"}] and cuerpo["total"] == 1
+    # Lo guardado es el JSON: el tope cuenta esos bytes
+    assert api.cache_listados.bytes == len(respuesta.body) - len(json.dumps(cuerpo["tiempo_consulta_ms"]))
+
+
+def test_calentar_sigue_si_la_bd_no_responde(catalogo, monkeypatch):
+    def sin_bd():
+        raise api.HTTPException(status_code=500, detail="Error de conexión a base de datos")
+
+    monkeypatch.setattr(api, "get_db_connection", sin_bd)
+    resultado = asyncio.run(api.calentar())
+    assert resultado["conexiones"] == 0 and resultado["primera_pagina"]
+    assert len(resultado["errores"]) == 1
+
+
+@pytest.mark.parametrize("evento, argumentos", [
+    (PING_EVENTBRIDGE, {}),
+    ({"calentar": True, "conexiones": 2}, {"conexiones": 2}),
+])
+def test_handler_atiende_el_ping_sin_mangum(monkeypatch, evento, argumentos):
+    llamadas = []
+
+    async def calentar_falso(**kwargs):
+        llamadas.append(kwargs)
+        return {"conexiones": 1}
+
+    def mangum_no(event, context):
+        raise AssertionError("el ping no debe pasar por Mangum")
+
+    monkeypatch.setattr(lambda_function, "calentar", calentar_falso)
+    monkeypatch.setattr(lambda_function, "handler", mangum_no)
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    assert lambda_function.lambda_handler(evento, None) == {"conexiones": 1}
+    assert llamadas == [argumentos]
+
+
+@pytest.mark.parametrize("evento", [
+    {"source": "aws.events", "detail-type": "EC2 Instance State-change Notification"},
+    {"httpMethod": "GET", "path": "/propiedades", "calentar": "no"},
+])
+def test_otros_eventos_no_son_calentamiento(evento):
+    assert not lambda_function.es_calentamiento(evento)
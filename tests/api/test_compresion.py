@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del middleware de compresión contra la app ASGI (y a través de Mangum)."""
+import asyncio
+import base64
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI, Response
+from mangum import Mangum
+
+import compresion
+from compresion import CompresionMiddleware, elegir_codificacion
+
+GRANDE = {"propiedades": [{"titulo": "Casa en Cuernavaca", "descripcion": "Jardín y alberca " * 20}] * 50}
+
+
+def app_de_prueba():
+    app = FastAPI()
+    app.add_middleware(CompresionMiddleware, minimo_bytes=1024)
+
+    @app.get("/grande")
+    async def grande():
+        return GRANDE
+
+    @app.get("/chica")
+    async def chica():
+        return {"ok": True}
+
+    @app.get("/imagen")
+    async def imagen():
+        return Response(b"\x89PNG" + b"\x00" * 4096, media_type="image/png")
+
+    @app.get("/no-modificado")
+    async def no_modificado():
+        return Response(status_code=304, headers={"ETag": 'W/"1"'})
+
+    return app
+
+
+def llamar(app, ruta, accept_encoding=None):
+    """Ejecuta una petición GET directamente sobre la app ASGI."""
+    headers = [(b"host", b"prueba")]
+    if accept_encoding is not None:
+        headers.append((b"accept-encoding", accept_encoding.encode()))
+    scope = {"type": "http", "http_version": "1.1", "method": "GET", "path": ruta, "raw_path": ruta.encode(),
+             "query_string": b"", "headers": headers, "scheme": "http", "server": ("prueba", 80), "client": None,
+             "root_path": ""}
+    mensajes = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(mensaje):
+        mensajes.append(mensaje)
+
+    asyncio.run(app(scope, receive, send))
+    inicio = mensajes[0]
+    cuerpo = b"".join(m.get("body", b"") for m in mensajes[1:])
+    return inicio["status"], {k.decode(): v.decode() for k, v in inicio["headers"]}, cuerpo
+
+
+def test_gzip_sobre_el_umbral():
+    status, headers, cuerpo = llamar(app_de_prueba(), "/grande", "gzip, deflate")
+    assert status == 200
+    assert headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding"
+    assert int(headers["content-length"]) == len(cuerpo)
+    assert json.loads(gzip.decompress(cuerpo)) == GRANDE
+
+
+def test_brotli_si_se_acepta():
+    brotli = pytest.importorskip("brotli")
+    _, headers, cuerpo = llamar(app_de_prueba(), "/grande", "gzip, deflate, br")
+    assert headers["content-encoding"] == "br"
+    assert json.loads(brotli.decompress(cuerpo)) == GRANDE
+
+
+@pytest.mark.parametrize("ruta, accept_encoding", [
+    ("/grande", None),
+    ("/grande", "identity"),
+    ("/grande", "gzip;q=0, br;q=0"),
+    ("/chica", "gzip"),
+    ("/imagen", "gzip"),
+    ("/no-modificado", "gzip"),
+])
+def test_sin_comprimir(ruta, accept_encoding):
+    _, headers, _ = llamar(app_de_prueba(), ruta, accept_encoding)
+    assert "content-encoding" not in headers
+
+
+def test_elegir_codificacion_respeta_q(monkeypatch):
+    monkeypatch.setattr(compresion, "brotli", None)
+    assert elegir_codificacion("br, gzip;q=0.5") == "gzip"
+    assert elegir_codificacion("*") == "gzip"
+    assert elegir_codificacion("*;q=0, deflate") is None
+    assert elegir_codificacion("") is None
+
+
+def test_mangum_entrega_el_cuerpo_comprimido_en_base64():
+    from lambda_function import _cuerpo_comprimido_en_base64
+
+    evento = {
+        "version": "2.0", "routeKey": "$default", "rawPath": "/grande", "rawQueryString": "",
+        "headers": {"accept-encoding": "gzip", "host": "api.todaslascasas.mx"},
+        "requestContext": {"http": {"method": "GET", "path": "/grande", "sourceIp": "1.2.3.4",
+                                    "protocol": "HTTP/1.1"}, "stage": "$default"},
+        "isBase64Encoded": False, "body": None,
+    }
+    # Mangum 0.17 usa asyncio.get_event_loop(); asyncio.run() de otras pruebas lo deja sin loop
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    respuesta = _cuerpo_comprimido_en_base64(Mangum(app_de_prueba(), lifespan="off")(evento, None))
+
+    assert respuesta["isBase64Encoded"] is True
+    assert respuesta["headers"]["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(base64.b64decode(respuesta["body"]))) == GRANDE
+
+
+def test_base64_tambien_si_mangum_lo_mando_como_texto():
+    from lambda_function import _cuerpo_comprimido_en_base64
+
+    # Un cuerpo comprimido que por casualidad es UTF-8 válido: Mangum lo deja como texto
+    respuesta = {"statusCode": 200, "headers": {"Content-Encoding": "br"}, "body": "abc", "isBase64Encoded": False}
+    respuesta = _cuerpo_comprimido_en_base64(respuesta)
+    assert respuesta["isBase64Encoded"] is True
+    assert base64.b64decode(respuesta["body"]) == b"abc"
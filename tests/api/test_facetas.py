@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del armado de la respuesta de /estadisticas a partir de la consulta de facetas."""
+from facetas import AMENIDADES_FACETA, CONSULTA_FACETAS, construir_estadisticas
+
+
+def fila(faceta, valor, cantidad, **extra):
+    base = {"faceta": faceta, "valor": valor, "cantidad": cantidad}
+    base.update(extra)
+    return base
+
+
+def test_consulta_recorre_la_tabla_una_sola_vez():
+    assert CONSULTA_FACETAS.count("FROM propiedades") == 1
+    assert "GROUPING SETS" in CONSULTA_FACETAS
+
+
+def test_respuesta_conserva_forma_y_orden():
+    conteos = {alias: 0 for _, alias, _ in AMENIDADES_FACETA}
+    conteos.update(a_alberca=7, a_jacuzzi=2, d_escrituras=3, c_un_nivel=1)
+    filas = [
+        fila("total", None, 20, con_precio=15, precio_promedio=100, precio_minimo=10, precio_maximo=500, **conteos),
+        fila("operaciones", "renta", 5),
+        fila("operaciones", "venta", 12),
+        fila("operaciones", None, 3),
+        fila("ciudades", "Temixco", 4),
+        fila("ciudades", "Cuernavaca", 9),
+        fila("tipos", "casa", 11),
+        fila("recamaras", "3", 6),
+        fila("recamaras", "1", 2),
+        fila("banos", "2", 5),
+        fila("estacionamientos", "1", 4),
+    ]
+
+    respuesta = construir_estadisticas(filas, 1.5)
+
+    assert respuesta["total"] == respuesta["total_propiedades"] == 20
+    assert respuesta["precio_promedio"] == 100.0
+    assert list(respuesta["tipos_operacion"]) == ["venta", "renta"]
+    assert list(respuesta["ciudades"]) == ["Cuernavaca", "Temixco"]
+    filtros = respuesta["filtros"]
+    assert list(filtros) == [
+        "operaciones", "ciudades", "tipos", "amenidades",
+        "caracteristicas", "documentacion", "caracteristicas_adicionales",
+    ]
+    assert list(filtros["caracteristicas"]) == ["1 Recámara", "3 Recámaras", "2 Baños", "1 Estacionamiento"]
+    assert filtros["amenidades"] == {"Alberca": 7, "Jacuzzi": 2}
+    assert filtros["documentacion"] == {"Escrituras": 3}
+    assert filtros["caracteristicas_adicionales"] == {"Casa de un nivel": 1}
+
+
+def test_snapshot_se_cachea_por_version(monkeypatch):
+    import asyncio
+
+    import api_postgresql as api
+
+    llamadas = []
+    snapshot = {"version": 3, "datos": {"total": 10}}
+
+    async def consulta_falsa(query, params=None, fetchall=True):
+        llamadas.append(params)
+        datos = snapshot["datos"] if params[0] != snapshot["version"] else None
+        return {"version": snapshot["version"], "datos": datos}, 0.1
+
+    monkeypatch.setattr(api, "ejecutar_consulta_async", consulta_falsa)
+    monkeypatch.setattr(api, "_cache_facetas", {"version": None, "datos": None, "verificado_en": 0.0})
+
+    assert asyncio.run(api.obtener_snapshot_facetas()) == {"total": 10}
+    assert asyncio.run(api.obtener_snapshot_facetas()) == {"total": 10}
+    assert len(llamadas) == 1
+
+    # Pasado el intervalo de verificación, una versión nueva reemplaza el cache
+    snapshot.update(version=4, datos={"total": 11})
+    api._cache_facetas["verificado_en"] = 0.0
+    assert asyncio.run(api.obtener_snapshot_facetas()) == {"total": 11}
+    assert llamadas[-1] == (3,)
+
+
+def test_mascara_amenidades_sigue_regla_del_cast_boolean():
+    from facetas import BITS_AMENIDADES, mascara_amenidades
+
+    assert mascara_amenidades(None) == 0
+    assert mascara_amenidades({"alberca": True, "jardin": False, "otra": True}) == BITS_AMENIDADES["alberca"]
+    assert mascara_amenidades({"terraza": "yes", "cisterna": 1, "jacuzzi": {"presente": True}}) == (
+        BITS_AMENIDADES["terraza"] | BITS_AMENIDADES["cisterna"]
+    )
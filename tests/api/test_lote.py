@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de /propiedades/lote: una consulta para N propiedades, en el orden pedido."""
+import asyncio
+
+import pytest
+
+import api_postgresql as api
+
+
+def fila(id_):
+    """Fila del detalle aún sin tarjeta precalculada: columnas crudas marcadas `_pendiente`."""
+    return {"tarjeta": {
+        "id": id_, "titulo": f"Casa {id_}", "descripcion": None, "precio": 1500000, "ciudad": "Cuernavaca",
+        "tipo_operacion": "venta", "tipo_propiedad": "casa", "imagen_url": f"resultados/2025-07-06/{id_}.jpg",
+        "images": [f"resultados/2025-07-06/{id_}.jpg"], "url_original": None, "direccion": None,
+        "estado": "Morelos", "link": None, "recamaras": 3, "banos": 2, "estacionamientos": 1, "superficie_m2": 120,
+        "autor": None, "amenidades": '{"alberca": true}', "caracteristicas": {}, "ubicacion": {"ciudad": "Cuernavaca"},
+        "_pendiente": True,
+    }, "id": id_, "created_at": None}
+
+
+def test_una_consulta_en_el_orden_pedido(monkeypatch):
+    consultas = []
+
+    async def consulta_falsa(query, params=None, fetchall=True, preparada=False):
+        consultas.append((query, params))
+        # La BD devuelve en cualquier orden y sin los inexistentes
+        return [fila("p3"), fila("p1")], 1.5
+
+    monkeypatch.setattr(api, "ejecutar_consulta_async", consulta_falsa)
+    lote = asyncio.run(api.obtener_lote(["p1", " p9", "p3", "p1", ""]))
+
+    assert len(consultas) == 1
+    assert "WHERE id = ANY(%s) AND activo = true" in consultas[0][0]
+    assert consultas[0][1] == (["p1", "p9", "p3"],)
+    assert [p.id for p in lote.propiedades] == ["p1", "p3"]
+    assert lote.faltantes == ["p9"]
+    assert lote.propiedades[0].amenidades == {"alberca": True}
+    assert lote.propiedades[0].imagen_url == "2025-07-06/p1.jpg"
+    assert lote.propiedades[0].imagenes == ["2025-07-06/p1.jpg"]
+
+
+
+def test_fila_sin_ciudad_no_tumba_el_lote(monkeypatch):
+    incompleta = fila("p2")
+    incompleta["tarjeta"].update(ciudad=None, tipo_propiedad=None, ubicacion=None)
+
+    async def consulta_falsa(query, params=None, fetchall=True, preparada=False):
+        return [fila("p1"), incompleta], 1.0
+
+    monkeypatch.setattr(api, "ejecutar_consulta_async", consulta_falsa)
+    lote = asyncio.run(api.obtener_lote(["p1", "p2"]))
+
+    assert [p.id for p in lote.propiedades] == ["p1", "p2"]
+    assert (lote.propiedades[1].ciudad, lote.propiedades[1].tipo_propiedad) == ("", "")
+    assert incompleta["tarjeta"]["ciudad"] is None  # la fila compartida no se modifica
+
+@pytest.mark.parametrize("ids", [[], [" ", ""], [f"p{i}" for i in range(api.LOTE_MAX + 1)]])
+def test_lote_vacio_o_demasiado_grande(ids):
+    with pytest.raises(api.HTTPException) as exc:
+        api.ids_lote(ids)
+    assert exc.value.status_code == 400
+
+
+def test_ruta_lote_antes_que_el_detalle():
+    rutas = [getattr(r, "path", None) for r in api.app.routes]
+    assert rutas.index("/propiedades/lote") < rutas.index("/propiedades/{propiedad_id}")
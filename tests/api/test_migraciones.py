@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Migraciones versionadas de usuarios/leads (migraciones.py)."""
+import inspect
+
+import pytest
+
+import api_postgresql as api
+from migraciones import MIGRACIONES, SinTransaccion, aplicar_migraciones
+
+
+class CursorFalso:
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.filas = []
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        if self.conexion.fallar_en and self.conexion.fallar_en in sql:
+            raise RuntimeError("falla simulada")
+        self.conexion.sentencias.append(sql)
+        if sql.startswith("INSERT INTO schema_migraciones"):
+            self.conexion.versiones.add(params[0])
+        elif sql.startswith("SELECT version FROM schema_migraciones"):
+            self.filas = [(v,) for v in sorted(self.conexion.versiones)]
+        elif sql.startswith("SELECT 1 FROM pg_index"):
+            self.filas = [(1,)] if params[0] in self.conexion.invalidos else []
+
+    def fetchall(self):
+        return self.filas
+
+    def close(self):
+        pass
+
+
+class ConexionFalsa:
+    def __init__(self, versiones=(), fallar_en=None, invalidos=()):
+        self.versiones = set(versiones)
+        self.sentencias = []
+        self.fallar_en = fallar_en
+        self.invalidos = set(invalidos)
+        self.autocommit = False
+
+    def cursor(self):
+        return CursorFalso(self)
+
+
+def migracion(version):
+    return next(sentencias for v, _, sentencias in MIGRACIONES if v == version)
+
+
+def test_aplica_solo_las_pendientes_cada_una_en_su_transaccion():
+    conn = ConexionFalsa(versiones={1, 2, 3, 4, 5, 7})
+    assert aplicar_migraciones(conn) == [6]
+    assert conn.autocommit is True
+    assert conn.sentencias[0].startswith("SELECT pg_advisory_lock")
+    assert conn.sentencias[-1].startswith("SELECT pg_advisory_unlock")
+    inicio = conn.sentencias.index("BEGIN")
+    assert conn.sentencias[inicio + 1] == "SET LOCAL lock_timeout = '10s'"
+    assert conn.sentencias[-2] == "COMMIT"
+    assert not any("CREATE TABLE IF NOT EXISTS usuarios" in s for s in conn.sentencias)
+
+    # Segunda corrida: nada que hacer
+    assert aplicar_migraciones(conn) == []
+
+
+def test_indices_concurrentes_fuera_de_transaccion():
+    conn = ConexionFalsa(versiones={1, 2, 3, 4, 5, 6}, invalidos={"idx_propiedades_orden_precio"})
+    assert aplicar_migraciones(conn) == [7]
+    assert "BEGIN" not in conn.sentencias
+    creados = [s for s in conn.sentencias if s.startswith("CREATE INDEX")]
+    assert len(creados) == len(migracion(7)) and all("CONCURRENTLY" in s for s in creados)
+    # El índice que quedó INVALID de un intento anterior se reconstruye
+    borrado = conn.sentencias.index("DROP INDEX CONCURRENTLY IF EXISTS idx_propiedades_orden_precio")
+    assert conn.sentencias[borrado + 1].startswith(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_propiedades_orden_precio ")
+    assert conn.sentencias[-2].startswith("INSERT INTO schema_migraciones")
+
+
+def test_error_revierte_la_migracion_y_libera_el_lock():
+    conn = ConexionFalsa(fallar_en="CREATE TABLE IF NOT EXISTS propiedades_leads")
+    with pytest.raises(RuntimeError):
+        aplicar_migraciones(conn)
+    assert conn.sentencias[-2] == "ROLLBACK"
+    assert conn.sentencias[-1].startswith("SELECT pg_advisory_unlock")
+    # La 1 quedó aplicada; la 2 no
+    assert conn.versiones == {1}
+
+
+def test_versiones_unicas_y_crecientes():
+    versiones = [v for v, _, _ in MIGRACIONES]
+    assert versiones == sorted(set(versiones))
+
+
+def test_cada_migracion_es_transaccional_o_toda_concurrente():
+    for _, _, sentencias in MIGRACIONES:
+        concurrentes = {isinstance(s, SinTransaccion) for s in sentencias}
+        assert len(concurrentes) == 1
+        # CONCURRENTLY dentro de una transacción falla en PostgreSQL
+        assert concurrentes == {True} or not any("CONCURRENTLY" in s for s in sentencias)
+
+
+def test_indices_de_orden_coinciden_con_orden_py():
+    from orden import sql_indices_orden
+
+    migrados = {" ".join(s.split()) for s in migracion(7)}
+    assert {" ".join(s.split()) for s in sql_indices_orden()} <= migrados
+
+
+@pytest.mark.parametrize("endpoint", ["registrar_usuario", "crear_lead"])
+def test_endpoints_sin_ddl(endpoint):
+    assert "CREATE TABLE" not in inspect.getsource(getattr(api, endpoint))
+
+
+def test_main_sin_variables_de_bd_explica_que_falta(monkeypatch):
+    import migraciones
+
+    monkeypatch.setenv("DB_HOST", "localhost")
+    monkeypatch.delenv("DB_USER", raising=False)
+    monkeypatch.setenv("DB_PASSWORD", "")
+    with pytest.raises(SystemExit) as exc:
+        migraciones.main()
+    assert "DB_USER, DB_PASSWORD" in str(exc.value.code)
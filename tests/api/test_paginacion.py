@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de la paginación por cursor de /propiedades."""
+import json
+from collections import OrderedDict
+
+import pytest
+
+import api_postgresql as api
+from orden import sql_indices_orden
+
+
+def test_cursor_ida_y_vuelta():
+    claves = api.llaves_orden("precio")
+    valores = [True, True, "1500000.00", "2025-06-01 10:00:00", "p42"]
+    cursor = api.codificar_cursor("precio", valores)
+    assert api.decodificar_cursor(cursor, "precio", len(claves)) == valores
+
+
+@pytest.mark.parametrize("cursor", ["no-es-base64!", api.codificar_cursor("titulo", ["a", "p1"])])
+def test_cursor_invalido_o_de_otro_orden(cursor):
+    with pytest.raises(api.HTTPException) as exc:
+        api.decodificar_cursor(cursor, "precio", len(api.llaves_orden("precio")))
+    assert exc.value.status_code == 400
+
+
+def test_condicion_keyset_respeta_nulos_y_direcciones():
+    claves = [("recamaras", True, True), ("id", False, True)]
+    condicion, params = api._condicion_keyset(claves, [3, "p7"])
+    assert params == [3, 3, "p7", "p7"]
+    assert "recamaras < %s OR recamaras IS NULL" in condicion
+
+    # Si la última fila tenía NULL (van al final) sólo quedan los NULL restantes
+    condicion, params = api._condicion_keyset(claves, [None, "p7"])
+    assert params == ["p7", "p7"]
+    assert condicion.startswith("((FALSE) OR (recamaras IS NULL AND")
+
+
+def test_conteo_aproximado_usa_snapshot_o_planner(monkeypatch):
+    import asyncio
+
+    consultas = []
+
+    async def snapshot_falso():
+        return {"total": 4321}
+
+    async def consulta_falsa(query, params=None, fetchall=True):
+        consultas.append(query)
+        return {"QUERY PLAN": [{"Plan": {"Plan Rows": 57}}]}, 0.2
+
+    monkeypatch.setattr(api, "obtener_snapshot_facetas", snapshot_falso)
+    monkeypatch.setattr(api, "ejecutar_consulta_async", consulta_falsa)
+    monkeypatch.setattr(api, "_cache_estimaciones", {})
+
+    assert asyncio.run(api.estimar_total("FROM propiedades WHERE activo = true", (), sin_filtros=True)) == 4321
+    assert consultas == []
+
+    from_where = "FROM propiedades WHERE activo = true AND ciudad = %s"
+    assert asyncio.run(api.estimar_total(from_where, ("Temixco",))) == 57
+    assert asyncio.run(api.estimar_total(from_where, ("Temixco",))) == 57
+    assert len(consultas) == 1 and consultas[0].startswith("EXPLAIN (FORMAT JSON)")
+
+
+def test_indices_declaran_el_mismo_orden_que_el_order_by():
+    indices = sql_indices_orden()
+    assert len(indices) == len(api.CAMPOS_ORDEN)
+    for orden, indice in zip(api.CAMPOS_ORDEN, indices):
+        assert f"({api.sql_orden(api.llaves_orden(orden))}) WHERE activo = true" in indice
+
+    # Sin expresiones por fila en las llaves: columnas que calcula la carga
+    assert [expr for expr, _, _ in api.llaves_orden("precio")][:3] == ["precio_valido", "tiene_imagen", "precio_num"]
+
+
+def test_plantilla_depende_de_la_forma_no_de_los_valores():
+    params_a, params_b = [], []
+    assert api._condicion_cantidad("recamaras", [2, 3, 6], 5, params_a) == "(recamaras = ANY(%s) OR recamaras >= 5)"
+    assert api._condicion_cantidad("recamaras", [1, 7, 2], 5, params_b) == "(recamaras = ANY(%s) OR recamaras >= 5)"
+    assert params_a == [[2, 3]] and params_b == [[1, 2]]
+
+    condiciones = ("activo = true", "ciudad_normalizada = ANY(%s)")
+    plantilla = api._plantilla_listado(condiciones, "precio", (False, False, False, True, False))
+    assert api._plantilla_listado(condiciones, "precio", (False, False, False, True, False)) is plantilla
+    assert "COUNT(*)" not in plantilla
+    assert "created_at IS NULL" in plantilla
+    # Parámetros: filtro, cursor y LIMIT/OFFSET
+    _, params_cursor = api._condicion_keyset(api.llaves_orden("precio"), [True, True, 10, None, "p1"])
+    assert plantilla.count("%s") == 1 + len(params_cursor) + 2
+
+
+def test_cache_listados_lru_por_bytes_y_version():
+    cache = api.CacheListados(max_bytes=100)
+    assert cache.obtener(("a",), 1) is None
+    cache.guardar(("a",), 1, "pagina a", 60)
+    cache.guardar(("b",), 1, "pagina b", 30)
+    assert cache.obtener(("a",), 1) == "pagina a"
+
+    # Pasado el tope sale la menos usada ("b"); una entrada mayor al tope no se guarda
+    cache.guardar(("c",), 1, "pagina c", 30)
+    cache.guardar(("d",), 1, "pagina d", 500)
+    assert cache.obtener(("b",), 1) is None
+    assert cache.obtener(("d",), 1) is None
+    assert cache.bytes == 90
+
+    # Una carga nueva del catálogo invalida todo
+    assert cache.obtener(("a",), 2) is None
+    assert cache.estadisticas()["entradas"] == 0
+    assert (cache.aciertos, cache.fallos) == (1, 4)
+
+
+def test_cache_listados_guarda_el_json_y_solo_cambia_el_tiempo():
+    # Un título con la misma llave no confunde el corte: sus comillas van escapadas
+    tarjeta = {"id": "p1", "titulo": 'Casa "tiempo_consulta_ms":1,'}
+    cuerpo = api.RespuestaJSON(api.respuesta_paginada([tarjeta], 1, 1, 12, 4.5, "abc", False)).body
+    cabeza, cola = api.partir_en_tiempo(cuerpo)
+    assert cabeza + b"4.5" + cola == cuerpo
+
+    servido = json.loads(api.RespuestaJSON(cabeza + b"0.25" + cola).body)
+    assert servido == {**json.loads(cuerpo), "tiempo_consulta_ms": 0.25}
+
+
+@pytest.mark.parametrize("argumentos, exacto", [
+    ({}, True),
+    ({"pagina": 3}, True),
+    ({"cursor": api.codificar_cursor("created_at", [True, "2025-06-01 10:00:00", "p9"])}, True),
+    ({"conteo": "aproximado"}, False),
+    ({"pagina": 3, "conteo": "aproximado"}, False),
+])
+def test_total_exacto_salvo_conteo_aproximado(monkeypatch, argumentos, exacto):
+    import asyncio
+
+    from starlette.requests import Request
+    from starlette.responses import Response
+
+    consultas = []
+
+    async def snapshot_falso():
+        return {"total": 500}
+
+    async def consulta_falsa(query, params=None, fetchall=True, preparada=False):
+        consultas.append(" ".join(query.split()))
+        if query.startswith("SELECT COUNT(*)"):
+            return {"count": 40}, 3.0
+        if query.startswith("EXPLAIN"):
+            return {"QUERY PLAN": [{"Plan": {"Plan Rows": 38}}]}, 0.2
+        return [{"tarjeta": '{"id": "p1"}'}], 1.0
+
+    monkeypatch.setattr(api, "obtener_snapshot_facetas", snapshot_falso)
+    monkeypatch.setattr(api, "_cache_facetas", {"version": 7, "datos": {"total": 500}, "generado_en": None,
+                                                "verificado_en": 0.0})
+    monkeypatch.setattr(api, "ejecutar_consulta_async", consulta_falsa)
+    monkeypatch.setattr(api, "_cache_estimaciones", {})
+    monkeypatch.setattr(api, "_cache_conteos", {"version": None, "totales": OrderedDict()})
+    monkeypatch.setattr(api, "cache_listados", api.CacheListados(0))
+
+    def pedir(**extra):
+        peticion = Request({"type": "http", "method": "GET", "path": "/propiedades", "headers": []})
+        valores = {**api._ARGUMENTOS_PRIMERA_PAGINA, "ciudad": ["Temixco"], **argumentos, **extra}
+        return json.loads(asyncio.run(api.listar_propiedades(peticion, Response(), **valores)).body)
+
+    cuerpo = pedir()
+    assert (cuerpo["total"], cuerpo["total_aproximado"]) == ((40, False) if exacto else (38, True))
+    # La página nunca lleva el total: conserva el recorrido del índice con LIMIT
+    assert not any("OVER ()" in c or "(SELECT COUNT(*)" in c for c in consultas)
+    assert sum(c.startswith("SELECT COUNT(*)") for c in consultas) == (1 if exacto else 0)
+
+    # Otra página del mismo filtro y catálogo: el total exacto ya está cacheado
+    pedir(por_pagina=24)
+    assert sum(c.startswith("SELECT COUNT(*)") for c in consultas) == (1 if exacto else 0)
+
+    # Una carga nueva (otra versión del catálogo) lo vuelve a contar
+    api._cache_facetas["version"] = 8
+    pedir()
+    assert sum(c.startswith("SELECT COUNT(*)") for c in consultas) == (2 if exacto else 0)
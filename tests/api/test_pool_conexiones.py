@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del pool de conexiones de la API (sin tocar la base real)."""
+import pg8000
+import pytest
+
+import api_postgresql as api
+
+
+class CursorFalso:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = [("valor",)]
+
+    def execute(self, query, params=()):
+        if self.conn.caida:
+            raise pg8000.exceptions.InterfaceError("network error")
+        self.conn.ejecutadas.append(query)
+
+    def fetchone(self):
+        return (1,)
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class ConexionFalsa:
+    def __init__(self):
+        self.caida = False
+        self.cerrada = False
+        self.ejecutadas = []
+
+    py_types = {}
+
+    def cursor(self):
+        return CursorFalso(self)
+
+    def prepare_statement(self, sentencia, oids):
+        self.ejecutadas.append(("PARSE", sentencia))
+        return b"s%d" % len(self.ejecutadas), [{"name": "valor"}], ()
+
+    def execute_named(self, nombre, params, columnas, input_funcs, sentencia):
+        self.ejecutadas.append(("EXECUTE", nombre, params))
+        return type("Contexto", (), {"rows": [[1]]})()
+
+    def close_prepared_statement(self, nombre):
+        self.ejecutadas.append(("CLOSE", nombre))
+
+    def close(self):
+        self.cerrada = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    creadas = []
+
+    def conectar():
+        conn = ConexionFalsa()
+        creadas.append(conn)
+        return conn
+
+    pool = api.PoolConexiones(maximo=2, timeout_s=0.05, ping_s=30, max_vida_s=1800)
+    monkeypatch.setattr(api, "get_db_connection", conectar)
+    monkeypatch.setattr(api, "db_pool", pool)
+    pool.conexiones_creadas = creadas
+    return pool
+
+
+def test_reutiliza_conexion_entre_consultas(pool):
+    api.ejecutar_consulta("SELECT 1 AS valor", fetchall=False)
+    api.ejecutar_consulta("SELECT 1 AS valor", fetchall=False)
+    assert len(pool.conexiones_creadas) == 1
+
+
+def test_reconecta_si_rds_cerro_la_conexion(pool):
+    api.ejecutar_consulta("SELECT 1 AS valor", fetchall=False)
+    pool.conexiones_creadas[0].caida = True
+
+    resultado, _ = api.ejecutar_consulta("SELECT 1 AS valor", fetchall=False)
+
+    assert resultado == {"valor": 1}
+    assert len(pool.conexiones_creadas) == 2
+    assert pool.conexiones_creadas[0].cerrada
+    assert pool.reconexiones == 1
+
+
+def test_sentencia_preparada_se_reutiliza_por_conexion(pool, monkeypatch):
+    monkeypatch.setattr(api, "DB_PREPARADAS_MAX", 2)
+    for precio in (100, 200):
+        resultado, _ = api.ejecutar_consulta("SELECT 1 AS valor WHERE precio_num >= %s", (precio,), preparada=True)
+        assert resultado == [{"valor": 1}]
+
+    ejecutadas = pool.conexiones_creadas[0].ejecutadas
+    assert ejecutadas[0] == ("PARSE", "SELECT 1 AS valor WHERE precio_num >= $1")
+    assert [paso[0] for paso in ejecutadas] == ["PARSE", "EXECUTE", "EXECUTE"]
+
+    # Pasado el tope, la sentencia menos usada se cierra en el servidor
+    api.ejecutar_consulta("SELECT 2", preparada=True)
+    api.ejecutar_consulta("SELECT 3", preparada=True)
+    assert ("CLOSE", b"s1") in ejecutadas
+
+
+def test_respeta_tope_del_pool(pool):
+    tomadas = [pool.tomar(), pool.tomar()]
+    with pytest.raises(api.HTTPException) as exc:
+        pool.tomar()
+    assert exc.value.status_code == 503
+    for conn, creada_en, _ in tomadas:
+        pool.devolver(conn, creada_en)
+    assert pool.tomar()[2] is True
+
+
+def test_consultas_async_no_bloquean_el_event_loop(pool, monkeypatch):
+    import asyncio
+    import time
+
+    def consulta_lenta(query, params=None, fetchall=True, preparada=False):
+        time.sleep(0.2)
+        return [], 200.0
+
+    monkeypatch.setattr(api, "ejecutar_consulta", consulta_lenta)
+
+    async def dos_consultas():
+        inicio = time.monotonic()
+        await asyncio.gather(api.ejecutar_consulta_async("SELECT 1"), api.ejecutar_consulta_async("SELECT 2"))
+        return time.monotonic() - inicio
+
+    assert asyncio.run(dos_consultas()) < 0.35
+
+
+def test_lecturas_identicas_en_vuelo_comparten_una_ejecucion(monkeypatch):
+    import asyncio
+    import time
+
+    ejecutadas = []
+
+    def consulta_lenta(query, params=None, fetchall=True, preparada=False):
+        ejecutadas.append(query)
+        time.sleep(0.1)
+        return [{"valor": 1}], 100.0
+
+    monkeypatch.setattr(api, "ejecutar_consulta", consulta_lenta)
+
+    async def rafaga():
+        lecturas = [api.ejecutar_consulta_async("SELECT %s", ([1, 2],)) for _ in range(5)]
+        escrituras = [api.ejecutar_consulta_async("DELETE FROM leads WHERE id = %s", (1,)) for _ in range(2)]
+        return await asyncio.gather(*lecturas, *escrituras)
+
+    resultados = asyncio.run(rafaga())
+
+    assert ejecutadas.count("SELECT %s") == 1
+    assert ejecutadas.count("DELETE FROM leads WHERE id = %s") == 2
+    assert all(resultado == ([{"valor": 1}], 100.0) for resultado in resultados)
+    # Cada petición recibe sus propias filas
+    assert resultados[0][0][0] is not resultados[1][0][0]
+    assert api._en_vuelo == {}
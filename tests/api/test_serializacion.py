@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Serialización directa de listados: mismos bytes que la ruta con Pydantic.
+
+Benchmark (por_pagina=500):
+$ pytest tests/api/test_serializacion.py -k benchmark -s
+"""
+import asyncio
+import json
+import time
+from decimal import Decimal
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+import api_postgresql as api
+
+
+def filas_de_prueba(n):
+    """Filas como las devuelve pg8000 para la consulta de /propiedades."""
+    filas = []
+    for i in range(n):
+        filas.append({
+            "id": f"p{i}",
+            "titulo": f"Casa en Tepoztlán con jardín #{i}",
+            "descripcion": None if i % 7 == 0 else "Recámara en planta baja, \"cochera\" techada\ny alberca",
+            "precio": None if i % 5 == 0 else Decimal("1500000.00") + i,
+            "ciudad": "Cuernavaca",
+            "tipo_operacion": "venta",
+            "tipo_propiedad": None if i % 3 == 0 else "casa",
+            "autor": "Inmobiliaria Ñandú",
+            "imagen_url": None if i % 4 == 0 else f"resultados/2025-07-06/{i}.jpg",
+            "images": [] if i % 4 == 0 else [f"resultados/2025-07-06/{i}.jpg", f"2025-07-06/{i}_b.jpg"],
+            "direccion": None if i % 2 else "Col. Centro",
+            "estado": "Morelos",
+            "url_original": f"https://facebook.com/marketplace/item/{i}",
+            "link": f"https://facebook.com/marketplace/item/{i}",
+            "recamaras": i % 6,
+            "banos": None if i % 9 == 0 else Decimal(2),
+            "estacionamientos": 1,
+            "superficie_m2": None if i % 8 == 0 else 120,
+            "amenidades": json.dumps({"alberca": i % 2 == 0, "jardin": True}) if i % 3 == 1 else {"seguridad": True},
+            "caracteristicas": "no es json" if i == 11 else {"niveles": 1},
+            "ubicacion": {"direccion_completa": "Col. Centro", "ciudad": "Cuernavaca",
+                          "estado": "Morelos", "texto_original": None},
+            "_total": 1234,
+            "_orden_0": True,
+            "_orden_1": "2025-07-06 10:00:00",
+            "_orden_2": f"p{i}",
+        })
+    return filas
+
+
+def respuesta_con_pydantic(filas, total, pagina, por_pagina, tiempo_ms, next_cursor):
+    """La ruta anterior: PropiedadResumen por fila, response_model y JSONResponse."""
+    propiedades = []
+    for prop in filas:
+        prop_dict = dict(prop)
+        if prop_dict.get('imagen_url'):
+            prop_dict['imagen_url'] = api.generar_url_imagen(prop_dict['imagen_url'])
+        if isinstance(prop_dict.get('images'), list):
+            prop_dict['images'] = [api.generar_url_imagen(img) for img in prop_dict['images']]
+        for auxiliar in ('_total', '_orden_0', '_orden_1', '_orden_2'):
+            prop_dict.pop(auxiliar, None)
+        for field in ['amenidades', 'caracteristicas', 'ubicacion']:
+            if prop_dict.get(field) and isinstance(prop_dict[field], str):
+                try:
+                    prop_dict[field] = json.loads(prop_dict[field])
+                except ValueError:
+                    prop_dict[field] = {}
+        propiedades.append(api.PropiedadResumen(**prop_dict))
+
+    modelo = api.RespuestaPaginada(
+        propiedades=propiedades, total=total, pagina=pagina, por_pagina=por_pagina,
+        total_paginas=(total + por_pagina - 1) // por_pagina, tiempo_consulta_ms=tiempo_ms,
+        next_cursor=next_cursor, total_aproximado=False,
+    )
+    ruta = next(r for r in api.app.routes if getattr(r, "path", None) == "/propiedades")
+    contenido = asyncio.run(serialize_response(field=ruta.response_field, response_content=modelo))
+    return JSONResponse(jsonable_encoder(contenido)).body
+
+
+def respuesta_directa(filas, total, pagina, por_pagina, tiempo_ms, next_cursor):
+    contenido = api.respuesta_paginada([api.fila_resumen(prop) for prop in filas], total, pagina,
+                                       por_pagina, tiempo_ms, next_cursor)
+    return api.RespuestaJSON(contenido).body
+
+
+def test_campos_en_el_orden_del_modelo():
+    assert [campo for campo, _ in api.CAMPOS_RESUMEN] == list(api.PropiedadResumen.__fields__)
+    assert list(api._SQL_CAMPOS_RESUMEN) == list(api.PropiedadResumen.__fields__)
+
+
+@pytest.mark.parametrize("con_orjson", [True, False])
+def test_mismos_bytes_que_pydantic(monkeypatch, con_orjson):
+    if con_orjson and api.orjson is None:
+        pytest.skip("orjson no instalado")
+    if not con_orjson:
+        monkeypatch.setattr(api, "orjson", None)
+
+    argumentos = (filas_de_prueba(60), 1234, 3, 60, 12.345678, "eyJvIjoicHJlY2lvIn0")
+    assert respuesta_directa(*argumentos) == respuesta_con_pydantic(*argumentos)
+
+
+def test_benchmark_por_pagina_500():
+    argumentos = (filas_de_prueba(500), 20000, 1, 500, 18.5, None)
+
+    tiempos = {}
+    for nombre, funcion in (("pydantic", respuesta_con_pydantic), ("directa", respuesta_directa)):
+        inicio = time.perf_counter()
+        for _ in range(5):
+            cuerpo = funcion(*argumentos)
+        tiempos[nombre] = (time.perf_counter() - inicio) / 5 * 1000
+        tiempos[nombre + "_bytes"] = cuerpo
+
+    assert tiempos["pydantic_bytes"] == tiempos["directa_bytes"]
+    print(f"\npor_pagina=500: pydantic {tiempos['pydantic']:.1f}ms, directa {tiempos['directa']:.1f}ms "
+          f"({len(tiempos['directa_bytes'])} bytes, orjson={'sí' if api.orjson else 'no'})")
+
+
+def test_proyeccion_tarjeta_limita_columnas_y_campos():
+    campos = api.campos_solicitados("tarjeta")
+    assert campos == api.PROYECCIONES["tarjeta"]
+
+    plantilla = api._plantilla_listado(("activo = true",), "created_at", None, campos)
+    assert "descripcion" not in plantilla and "json_build_object" not in plantilla
+    assert "imagenes as images" not in plantilla and "imagenes->>0" in plantilla
+
+    fila = api.fila_resumen(filas_de_prueba(2)[1], campos)
+    assert list(fila) == list(campos)
+    assert fila["imagen_url"] == "2025-07-06/1.jpg"
+
+
+def test_campos_en_lista_siempre_incluyen_id():
+    assert api.campos_solicitados(" precio,titulo ") == ("id", "titulo", "precio")
+    assert api.campos_solicitados(None) is None
+    with pytest.raises(api.HTTPException) as exc:
+        api.campos_solicitados("titulo,contrasena")
+    assert exc.value.status_code == 400
+
+
+def test_tarjeta_precalculada_igual_a_la_armada_en_vivo():
+    from tarjetas import construir_tarjeta
+
+    # Fila de `propiedades` como la lee la carga (nombres de columna de la tabla)
+    columnas = {
+        "id": "p1", "titulo": "Casa en Tepoztlán", "descripcion": None, "precio": Decimal("1500000.00"),
+        "ciudad": "Tepoztlán", "tipo_operacion": "venta", "tipo_propiedad": "casa",
+        "imagenes": ["resultados/2025-07-06/1.jpg", "foto_2025-07-06.jpg"], "url_original": "https://fb.com/1",
+        "direccion": None, "estado": "Morelos", "recamaras": 3, "banos": Decimal(2), "estacionamientos": None,
+        "superficie_construida": 120, "autor": None, "amenidades": {"alberca": True}, "caracteristicas": "no es json",
+    }
+    # La misma fila como la devuelve el json_build_object de respaldo de la API
+    pendiente = {"tarjeta": {
+        **{campo: columnas.get(campo) for campo, _ in api.CAMPOS_RESUMEN},
+        "imagen_url": "resultados/2025-07-06/1.jpg", "images": columnas["imagenes"], "link": "https://fb.com/1",
+        "superficie_m2": 120, "ubicacion": {"direccion_completa": "Tepoztlán, Morelos", "ciudad": "Tepoztlán",
+                                            "estado": "Morelos", "texto_original": None},
+        "_pendiente": True,
+    }}
+
+    tarjeta = json.loads(json.dumps(construir_tarjeta(columnas)))
+    assert api.tarjeta_de_fila({"tarjeta": tarjeta}) == api.tarjeta_de_fila(pendiente)
+    assert tarjeta["images"] == ["2025-07-06/1.jpg", "2025-07-06/foto_2025-07-06.jpg"]
+    assert "_pendiente" in pendiente["tarjeta"]  # la fila compartida no se modifica
+
+
+def test_listados_leen_la_tarjeta_salvo_con_proyeccion():
+    plantilla = api._plantilla_listado(("activo = true",), "created_at", None)
+    assert "COALESCE(tarjeta, json_build_object(" in plantilla
+    assert "jsonb_array_length" in plantilla  # sólo dentro del respaldo para filas sin tarjeta
+    assert "COALESCE(tarjeta" not in api._plantilla_listado(("activo = true",), "created_at", None, ("id",))
@@ -0,0 +1,20 @@
+from ubicaciones import limpiar_ciudad, llave_ciudad, normalizar_nombre
+
+
+def test_normalizar_nombre_ignora_acentos_mayusculas_y_espacios():
+    assert normalizar_nombre("  Tepoztlán ") == "tepoztlan"
+    assert normalizar_nombre("Puente  de IXTLA") == "puente de ixtla"
+    assert normalizar_nombre("") is None
+    assert normalizar_nombre(None) is None
+
+
+def test_limpiar_ciudad_encuentra_ciudad_canonica():
+    assert limpiar_ciudad("Tepoztlan, Morelos") == "Tepoztlán"
+    assert limpiar_ciudad("Col. Centro, EMILIANO ZAPATA") == "Emiliano Zapata"
+    assert limpiar_ciudad("Guadalajara") is None
+
+
+def test_llave_ciudad_igual_para_variantes():
+    assert llave_ciudad("Temixco") == llave_ciudad("temixco, Morelos") == "temixco"
+    # Ciudades fuera del catálogo conservan su nombre normalizado
+    assert llave_ciudad("Ciudad de México") == "ciudad de mexico"
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Columnas derivadas que calcula src/post_carga_catalogo.py tras la carga."""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("psycopg2")
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+import post_carga_catalogo as post_carga  # noqa: E402
+
+
+def test_derivar_columnas():
+    fila = {
+        "titulo": "Casa de un nivel con escrituras",
+        "descripcion": "Recámara en planta baja, cochera techada y área de servicio.",
+        "ciudad": "",
+        "direccion": "Colonia Delicias, Tepoztlan",
+        "amenidades": {"alberca": True, "jardin": False},
+    }
+    derivadas = post_carga.derivar_columnas(fila)
+
+    assert set(derivadas) == set(post_carga.COLUMNAS_DERIVADAS)
+    assert derivadas["ciudad_normalizada"] == "tepoztlan"
+    assert derivadas["colonia_normalizada"] == "delicias"
+    assert derivadas["amenidades_bits"] == 1
+    assert all(derivadas[columna] for columna in post_carga.COLUMNAS_INDICADORES if columna != "es_cesion")
+    assert derivadas["es_cesion"] is False
+
+
+def test_descripcion_no_define_ciudad():
+    fila = {"titulo": "", "descripcion": "A 10 minutos de Cuernavaca", "ciudad": "Temixco", "direccion": None}
+    assert post_carga.derivar_columnas(fila)["ciudad_normalizada"] == "temixco"
+
+
+@pytest.mark.parametrize("precio, esperado", [("1500000.00", 1500000), (2500, 2500), (None, 0), ("", 0), ("NaN", 0)])
+def test_precio_numerico(precio, esperado):
+    assert post_carga.precio_numerico(precio) == esperado
+
+
+def test_llaves_de_orden():
+    derivadas = post_carga.derivar_columnas({"precio": "0", "imagenes": '["2025-07-06/foto.jpg"]'})
+    assert derivadas["precio_num"] == 0
+    assert derivadas["precio_valido"] is False
+    assert derivadas["tiene_imagen"] is True
+    assert post_carga.derivar_columnas({"precio": 980000, "imagenes": []})["precio_valido"] is True
+
+
+def test_tarjeta_precalculada():
+    import json
+
+    fila = {"id": "p1", "titulo": "Casa", "ciudad": "Cuernavaca", "estado": "Morelos", "superficie_construida": 90,
+            "imagenes": '["resultados/2025-07-06/1.jpg"]', "amenidades": {"alberca": True}}
+    tarjeta = json.loads(post_carga.derivar_columnas(fila)["tarjeta"])
+
+    assert tarjeta["imagen_url"] == "2025-07-06/1.jpg" and tarjeta["images"] == ["2025-07-06/1.jpg"]
+    assert tarjeta["superficie_m2"] == 90
+    assert tarjeta["ubicacion"]["direccion_completa"] == "Cuernavaca, Morelos"
+    # Cambiar cualquier columna de la tarjeta la invalida
+    assert set(post_carga.COLUMNAS_TARJETA) <= set(post_carga.COLUMNAS_FUENTE)
+
+
+def test_trigger_de_invalidacion_en_migraciones():
+    import re
+
+    from migraciones import MIGRACIONES
+
+    # La última migración que lo crea cubre todas las columnas que lee derivar_columnas
+    ultima = [sentencia for _, _, sentencias in MIGRACIONES for sentencia in sentencias
+              if "CREATE TRIGGER trg_propiedades_invalidar_derivadas" in sentencia][-1]
+    columnas = re.search(r"BEFORE UPDATE OF (.*?)\s+ON propiedades", ultima, re.S).group(1)
+    assert [c.strip() for c in columnas.split(",")] == post_carga.COLUMNAS_FUENTE
+
+
+def test_refresco_del_snapshot_sin_ddl_sobre_la_tabla():
+    from migraciones import MIGRACIONES
+
+    class Cursor:
+        def __init__(self):
+            self.sentencias = []
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def execute(self, sql, params=None):
+            self.sentencias.append(" ".join(sql.split()))
+
+        def fetchall(self):
+            return []
+
+        def fetchone(self):
+            return (8,)
+
+    class Conexion:
+        def __init__(self):
+            self.cur = Cursor()
+
+        def cursor(self, cursor_factory=None):
+            return self.cur
+
+        def commit(self):
+            pass
+
+    conn = Conexion()
+    assert post_carga.refrescar_snapshot_facetas(conn) == 8
+    # El API lee facet_snapshot cada FACETAS_VERIFICAR_S: nada de DDL por refresco
+    assert not any(s.startswith(("ALTER TABLE", "CREATE")) for s in conn.cur.sentencias)
+    assert any("ALTER COLUMN datos TYPE JSON" in s for _, _, sentencias in MIGRACIONES for s in sentencias)
+
+
+def test_la_carga_no_ejecuta_ddl(monkeypatch):
+    from migraciones import MIGRACIONES
+
+    class Conexion:
+        autocommit = True
+
+        def cursor(self, cursor_factory=None):
+            raise AssertionError("con el esquema al día la carga no ejecuta sentencias de esquema")
+
+    aplicadas = []
+    monkeypatch.setattr(post_carga, "aplicar_migraciones", lambda conn: aplicadas.append(conn) or [])
+    conn = Conexion()
+    post_carga.asegurar_esquema(conn)
+    assert aplicadas == [conn] and conn.autocommit is False
+
+    # Todas las columnas que escribe derivar_columnas las crea alguna migración
+    ddl = " ".join(s for _, _, sentencias in MIGRACIONES for s in sentencias)
+    for columna in post_carga.COLUMNAS_DERIVADAS + ["derivadas_version", "search_vector"]:
+        assert f"ADD COLUMN IF NOT EXISTS {columna} " in ddl